@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Controle de admissão da Vivi IA
+- Limite por cliente: balde de tokens por IP (rajada + taxa por minuto) → 429;
+  com um armazenamento compartilhado (SQLite ou Redis) o balde vale para todos os workers
+- Vagas do worker (pipeline e gerações do Gemini): quem passa do limite espera
+  em uma fila limitada, por no máximo VIVI_FILA_ESPERA_MAX segundos → 503
+
+Sob sobrecarga as requisições são recusadas cedo, com Retry-After, em vez de
+se acumularem e estourarem as cotas de Pinecone e Gemini.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from metricas import FILA_PROFUNDIDADE, FILA_EM_USO, FILA_ESPERA, REJEICOES
+from resiliencia import FalhaEtapa
+
+logger = logging.getLogger("vivi.admissao")
+
+# Chaves dos baldes por cliente no armazenamento compartilhado
+PREFIXO_BALDE = "balde:"
+
+
+class Sobrecarga(FalhaEtapa):
+    """Sem vaga dentro da espera máxima (ou fila cheia); retry_after em segundos"""
+
+    resultado_requisicao = 'recusada'
+
+    def __init__(self, mensagem, retry_after):
+        super().__init__(mensagem)
+        self.retry_after = retry_after
+
+
+class LimitadorClientes:
+    """Balde de tokens por cliente: `rajada` requisições seguidas, repostas a `por_minuto`
+
+    Com `armazenamento` os baldes ficam nele e valem para todos os workers (consumir
+    passa a ser bloqueante: no event loop, chamar em uma thread); se ele falhar, vale
+    o balde local. Os baldes locais menos usados são descartados acima de `max_clientes`.
+    """
+
+    def __init__(self, por_minuto=None, rajada=None, max_clientes=None, armazenamento=None):
+        self.por_minuto = por_minuto if por_minuto is not None else float(os.getenv("VIVI_LIMITE_POR_MINUTO", "30"))
+        self.rajada = rajada if rajada is not None else float(os.getenv("VIVI_LIMITE_RAJADA", "10"))
+        self.max_clientes = max_clientes or int(os.getenv("VIVI_LIMITE_MAX_CLIENTES", "10000"))
+        self._taxa = self.por_minuto / 60.0
+        self.armazenamento = armazenamento
+        self._baldes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self):
+        return self.por_minuto > 0 and self.rajada > 0
+
+    def consumir(self, cliente, custo=1.0):
+        """Retorna 0 se a requisição pode seguir, ou os segundos até haver tokens"""
+        if not self.ativo:
+            return 0.0
+        espera = None
+        if self.armazenamento is not None:
+            try:
+                espera = self.armazenamento.consumir_balde(PREFIXO_BALDE + cliente, self.rajada, self._taxa, custo)
+            except Exception as e:
+                logger.warning(f"⚠️ Limite compartilhado indisponível, usando o balde do worker: {e}")
+        if espera is None:
+            espera = self._consumir_local(cliente, custo)
+        if espera:
+            REJEICOES.inc(fila='cliente', motivo='limite_cliente')
+        return espera
+
+    def _consumir_local(self, cliente, custo):
+        agora = time.monotonic()
+        with self._lock:
+            tokens, atualizado = self._baldes.pop(cliente, (self.rajada, agora))
+            tokens = min(self.rajada, tokens + (agora - atualizado) * self._taxa)
+            espera = 0.0
+            if tokens >= custo:
+                tokens -= custo
+            else:
+                espera = (custo - tokens) / self._taxa
+            self._baldes[cliente] = (tokens, agora)
+            while len(self._baldes) > self.max_clientes:
+                self._baldes.popitem(last=False)
+        return espera
+
+    def resumo(self):
+        with self._lock:
+            clientes = len(self._baldes)
+        return {
+            'por_minuto': self.por_minuto,
+            'rajada': self.rajada,
+            'clientes': clientes,
+            'compartilhado': self.armazenamento.descricao() if self.armazenamento is not None else None
+        }
+
+
+class ControleAdmissao:
+    """Até `max_simultaneas` vagas; excedentes esperam em fila de até `max_fila` por até `espera_max` s
+
+    As vagas são do event loop atual (como o semáforo de concorrência do agente) e,
+    portanto, de cada worker: elas protegem o pool de I/O do próprio processo.
+    """
+
+    def __init__(self, nome, max_simultaneas, max_fila=None, espera_max=None):
+        self.nome = nome
+        self.max_simultaneas = max_simultaneas
+        self.max_fila = max_fila if max_fila is not None else int(os.getenv("VIVI_FILA_MAX", "64"))
+        self.espera_max = espera_max if espera_max is not None else float(os.getenv("VIVI_FILA_ESPERA_MAX", "10"))
+        self.em_uso = 0
+        self.na_fila = 0
+        self.rejeicoes = 0
+        # Tempo médio de ocupação de uma vaga (média móvel), base do Retry-After
+        self._ocupacao_media = 1.0
+        self._espera_media = 0.0
+        self._semaforo = None
+        self._semaforo_loop = None
+
+    def _obter_semaforo(self):
+        loop = asyncio.get_running_loop()
+        if self._semaforo is None or self._semaforo_loop is not loop:
+            self._semaforo = asyncio.Semaphore(self.max_simultaneas)
+            self._semaforo_loop = loop
+            self.em_uso = self.na_fila = 0
+        return self._semaforo
+
+    def retry_after(self):
+        """Estimativa (segundos) de quando a fila atual terá sido atendida"""
+        rodadas = (self.na_fila + 1) / self.max_simultaneas
+        return max(1, min(60, math.ceil(self._ocupacao_media * rodadas)))
+
+    def _recusar(self, motivo, mensagem):
+        self.rejeicoes += 1
+        REJEICOES.inc(fila=self.nome, motivo=motivo)
+        logger.warning(f"🚦 {mensagem}")
+        raise Sobrecarga(mensagem, self.retry_after())
+
+    def verificar(self):
+        """Recusa na hora (Sobrecarga) se a fila já está cheia; não reserva vaga"""
+        if self.em_uso >= self.max_simultaneas and self.na_fila >= self.max_fila:
+            self._recusar('fila_cheia', f"Fila {self.nome} cheia ({self.na_fila} aguardando)")
+
+    def _publicar(self):
+        FILA_PROFUNDIDADE.definir(self.na_fila, fila=self.nome)
+        FILA_EM_USO.definir(self.em_uso, fila=self.nome)
+
+    @asynccontextmanager
+    async def vaga(self, prazo=None, estatisticas=None):
+        """Ocupa uma vaga; espera no máximo espera_max (ou o que resta do prazo da requisição)"""
+        semaforo = self._obter_semaforo()
+        if semaforo.locked():
+            self.verificar()
+            espera = self.espera_max if prazo is None else min(self.espera_max, prazo.restante())
+            if espera <= 0:
+                self._recusar('espera_esgotada', f"Sem vaga em {self.nome} dentro do prazo")
+
+            inicio = time.perf_counter()
+            self.na_fila += 1
+            self._publicar()
+            try:
+                await asyncio.wait_for(semaforo.acquire(), espera)
+            except asyncio.TimeoutError:
+                self._recusar('espera_esgotada', f"Sem vaga em {self.nome} após {espera:.1f}s de espera")
+            finally:
+                self.na_fila -= 1
+                aguardado = time.perf_counter() - inicio
+                FILA_ESPERA.observar(aguardado, fila=self.nome)
+                self._espera_media = 0.9 * self._espera_media + 0.1 * aguardado
+                if estatisticas is not None:
+                    estatisticas.setdefault('espera_ms', {})[self.nome] = round(aguardado * 1000, 1)
+        else:
+            await semaforo.acquire()
+            FILA_ESPERA.observar(0.0, fila=self.nome)
+
+        self.em_uso += 1
+        self._publicar()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.em_uso -= 1
+            semaforo.release()
+            self._ocupacao_media = 0.9 * self._ocupacao_media + 0.1 * (time.perf_counter() - inicio)
+            self._publicar()
+
+    def resumo(self):
+        return {
+            'max_simultaneas': self.max_simultaneas,
+            'em_uso': self.em_uso,
+            'na_fila': self.na_fila,
+            'max_fila': self.max_fila,
+            'espera_max_s': self.espera_max,
+            'espera_media_ms': round(self._espera_media * 1000, 1),
+            'rejeicoes': self.rejeicoes,
+            'retry_after_s': self.retry_after()
+        }
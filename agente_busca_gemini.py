@@ -6,22 +6,170 @@ Integrado com a persona da Vivi IA - Especialista em SIAPE e Gestão Pública
 """
 
 import os
-import google.generativeai as genai
-from pinecone import Pinecone
-import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
 import random
+import re
+
+# SDKs importados só no primeiro uso (inicialização do agente), não na importação do módulo
+from importacao_tardia import genai, pinecone
+
+from cache_embeddings import CacheEmbeddings
+from cache_semantico import CacheSemantico, normalizar_pergunta
+from cache_recuperacao import CacheRecuperacao
+from sessoes import GerenciadorSessoes
+from etapas import Recuperacao, PromptMontado, Geracao, RespostaFinal
+from construtor_contexto import ConstrutorContexto
+from prompt_vivi import GerenciadorPrompt
+from corretor_texto import MotorCorrecoes
+from faq_consultas import TabelaFAQ
+from cache_compartilhado import criar_armazenamento
+from resiliencia import Resiliencia, FalhaEtapa, PrazoEsgotado
+from admissao import ControleAdmissao
+from coalescencia import Coalescedor
+from metricas import medir, medir_requisicao, registrar_uso_gemini, CACHE, DOCUMENTOS
+from recuperadores import criar_recuperador
+from selecao_documentos import SeletorDocumentos
+
+logger = logging.getLogger("vivi.agente")
+
+# Modelo integrado do Pinecone (1024 dimensões) e limite de entradas por chamada
+MODELO_EMBEDDING = "llama-text-embed-v2"
+EMBED_LOTE_MAX = 96
+
+# Tipos de entrada do modelo: perguntas são consultas, documentos são passagens
+EMBED_CONSULTA = "query"
+EMBED_PASSAGEM = "passage"
+
+# Versão do esquema de metadados gravado por ingestao.py: texto já normalizado
+# em 'text' e título em 'document_title' (a busca não precisa limpar nada)
+ESQUEMA_METADADOS = 2
+
+# Prefixo das respostas de erro do Gemini (não devem ir para o cache)
+PREFIXO_ERRO_GEMINI = "Erro ao processar com IA:"
+
+# Resposta quando a recuperação não traz documentos
+RESPOSTA_SEM_DOCUMENTOS = "❌ Nenhum resultado encontrado no banco de dados."
+
+
+def _como_lista(vetor):
+    """Converte o vetor do cache para lista (formato aceito pelo Pinecone)"""
+    if vetor is None or isinstance(vetor, list):
+        return vetor
+    return vetor.tolist()
+
+
+class SeparadorReferencias:
+    """Separa o corpo da resposta da seção "Referências:" em um stream"""
+
+    MARCADOR = re.compile(r'^[\s#*_]*refer[êe]ncias[\s*_]*:?[\s*_]*$', re.IGNORECASE)
+
+    def __init__(self):
+        self._pendente = ''
+        self._meio_de_linha = False
+        self._referencias = None
+
+    def _pode_ser_marcador(self, parcial):
+        """Indica se uma linha incompleta ainda pode virar o marcador"""
+        normalizado = re.sub(r'[\s#*_:]', '', parcial).lower().replace('ê', 'e')
+        return 'referencias'.startswith(normalizado)
+
+    def alimentar(self, texto):
+        """Recebe texto corrigido e devolve a parte que pertence ao corpo"""
+        if self._referencias is not None:
+            self._referencias += texto
+            return ''
+
+        self._pendente += texto
+        saida = []
+        while True:
+            pos = self._pendente.find('\n')
+            if pos == -1:
+                break
+            linha = self._pendente[:pos]
+            if not self._meio_de_linha and self.MARCADOR.match(linha):
+                self._referencias = self._pendente[pos + 1:]
+                self._pendente = ''
+                return ''.join(saida)
+            saida.append(self._pendente[:pos + 1])
+            self._pendente = self._pendente[pos + 1:]
+            self._meio_de_linha = False
+
+        # Linha incompleta: só retém se puder ser o início do marcador
+        if self._pendente and (self._meio_de_linha or not self._pode_ser_marcador(self._pendente)):
+            saida.append(self._pendente)
+            self._pendente = ''
+            self._meio_de_linha = True
+
+        return ''.join(saida)
+
+    def finalizar(self):
+        """Retorna (restante do corpo, lista de referências)"""
+        restante = ''
+        if self._referencias is None:
+            if not self._meio_de_linha and self.MARCADOR.match(self._pendente):
+                self._referencias = ''
+            else:
+                restante = self._pendente
+        self._pendente = ''
+
+        referencias = []
+        for linha in (self._referencias or '').splitlines():
+            titulo = re.sub(r'^[\s\-*•·○\d.)]+', '', linha).strip(' *_')
+            if titulo:
+                referencias.append(titulo)
+        return restante, referencias
+
 
 class AgenteBuscaGemini:
     def __init__(self):
-        """Inicializa o agente"""
-        # Configurar Pinecone (versão 7.3.0)
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index = self.pc.Index(os.getenv("PINECONE_INDEX", "vivi-ia-base"))
-        
-        # Configurar Gemini
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        """Inicializa o agente (clientes e arquivos locais são preparados em paralelo)"""
+        # Concorrência limitada para o pipeline assíncrono
+        self.max_concorrencia = int(os.getenv("VIVI_MAX_CONCORRENCIA", "16"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concorrencia,
+            thread_name_prefix="vivi-io"
+        )
+        # Chamadas no pool ainda não terminadas (na fila ou rodando): uma chamada cancelada
+        # no event loop continua ocupando a thread até o SDK responder
+        self._ocupadas = 0
+        self._lock_ocupadas = threading.Lock()
+        # Vagas do pipeline assíncrono e das gerações do Gemini: excedentes esperam em
+        # fila limitada (VIVI_FILA_MAX, VIVI_FILA_ESPERA_MAX) e depois são recusados
+        self.admissao = ControleAdmissao('pipeline', self.max_concorrencia)
+        self.geracoes = ControleAdmissao('geracao', int(os.getenv("VIVI_MAX_GERACOES", "8")))
+
+        # Perguntas idênticas simultâneas compartilham uma única execução (VIVI_COALESCENCIA):
+        # 'pergunta' (pipeline inteiro), 'documentos' (só a geração, com os mesmos documentos) ou 'desligada'
+        self.modo_coalescencia = os.getenv("VIVI_COALESCENCIA", "pergunta").lower()
+        self.coalescencia = {tipo: Coalescedor(tipo) for tipo in ('completa', 'stream')}
+
+        # Pinecone + recuperador, Gemini + cache do prompt, FAQ e correções não dependem
+        # um do outro: cada um em uma thread, o tempo de inicialização é o do mais lento
+        pinecone = self._executor.submit(self._inicializar_pinecone)
+        gemini = self._executor.submit(self._inicializar_gemini)
+        faq = self._executor.submit(TabelaFAQ)
+        corretor = self._executor.submit(MotorCorrecoes)
+
+        try:
+            self.pc, self.index, self.recuperador = pinecone.result()
+            self.model, self.prompt = gemini.result()
+
+            # Perguntas frequentes com embedding e documentos pré-calculados
+            self.faq = faq.result()
+
+            # Correções de texto compiladas uma única vez
+            self.corretor = corretor.result()
+        except Exception:
+            # Falha na inicialização: não deixar o pool de threads para trás
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
         # Catchphrases da Vivi IA
         self.catchphrases = {
             "abertura": [
@@ -41,251 +189,1151 @@ class AgenteBuscaGemini:
                 "Estamos diante de um caso que precisa de ajustes."
             ]
         }
-        
-        print("🤖 Agente de Busca Vivi IA com Gemini 2.5 Flash inicializado!")
 
-    def gerar_embedding(self, texto):
-        """Gera embedding usando modelo integrado do Pinecone (llama-text-embed-v2)"""
-        try:
-            # Usar o modelo integrado do Pinecone que gera 1024 dimensões
+        # Prazo por requisição, tentativas por etapa, hedge (só com thread livre no pool) e disjuntores
+        self.resiliencia = Resiliencia(pode_duplicar=lambda: self.threads_livres() > 0)
+
+        # Backend compartilhado pelos workers (None: caches só neste processo)
+        self.armazenamento = criar_armazenamento()
+
+        # Cache semântico de respostas (exato + perguntas quase idênticas)
+        self.cache_respostas = CacheSemantico(armazenamento=self.armazenamento)
+
+        # Cache de embeddings por hash de conteúdo (memória + backend compartilhado)
+        self.cache_embeddings = CacheEmbeddings(armazenamento=self.armazenamento)
+
+        # Documentos recuperados por pergunta (TTL): nova geração sem repetir a busca
+        self.cache_recuperacao = CacheRecuperacao(armazenamento=self.armazenamento)
+
+        # Sessões de conversa (turnos recentes e documentos já enviados), vistas por todos os workers
+        # quando há backend compartilhado
+        self.sessoes = GerenciadorSessoes(armazenamento=self.armazenamento)
+
+        # Contexto compacto com orçamento de tokens
+        self.construtor_contexto = ConstrutorContexto()
+
+        # Seleção adaptativa dos documentos (piso, cotovelo e diversidade)
+        self.seletor = SeletorDocumentos()
+
+        logger.info("🤖 Agente de Busca Vivi IA com Gemini 2.5 Flash inicializado!")
+
+    def _inicializar_pinecone(self):
+        """Cliente Pinecone (versão 7.3.0), índice e backend de busca (Pinecone ou índice local)"""
+        pc = pinecone.Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        index = pc.Index(os.getenv("PINECONE_INDEX", "vivi-ia-base"))
+        return pc, index, criar_recuperador(index)
+
+    def _inicializar_gemini(self):
+        """Modelo Gemini e instruções fixas da persona (cache/system_instruction)"""
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        return model, GerenciadorPrompt(model)
+
+    def aquecer(self):
+        """Abre as conexões antes da primeira pergunta: índice, embeddings e Gemini
+
+        As chamadas correm em paralelo, limitadas a VIVI_AQUECIMENTO_TIMEOUT segundos;
+        falhas só são registradas (o monitor de conectividade e as novas tentativas
+        cuidam do resto).
+        """
+        limite = time.monotonic() + float(os.getenv("VIVI_AQUECIMENTO_TIMEOUT", "10"))
+        chamadas = {
+            'pinecone': self._executor.submit(self.index.describe_index_stats),
+            'embedding': self._executor.submit(
+                self.pc.inference.embed, model=MODELO_EMBEDDING, inputs=["aquecimento"],
+                parameters={"input_type": EMBED_CONSULTA}
+            ),
+            'gemini': self._executor.submit(genai.get_model, self.model.model_name),
+        }
+        resultado = {}
+        for nome, futuro in chamadas.items():
+            try:
+                futuro.result(timeout=max(0.0, limite - time.monotonic()))
+                resultado[nome] = True
+            except Exception as e:
+                logger.warning(f"⚠️ Aquecimento de {nome} falhou: {str(e) or e.__class__.__name__}")
+                resultado[nome] = False
+        return resultado
+
+    def _separar_do_cache(self, textos, input_type):
+        """Retorna (vetores já conhecidos, {chave: texto} que precisam ir à rede)"""
+        chaves = [CacheEmbeddings.chave(t, MODELO_EMBEDDING, input_type) for t in textos]
+        return self._classificar_embeddings(chaves, textos, self.cache_embeddings.obter_varios(chaves))
+
+    async def _aseparar_do_cache(self, textos, input_type):
+        """Versão assíncrona de _separar_do_cache: só a memória local é consultada no event loop"""
+        chaves = [CacheEmbeddings.chave(t, MODELO_EMBEDDING, input_type) for t in textos]
+        encontrados, ausentes = self.cache_embeddings.obter_memoria(chaves)
+        if ausentes and self.cache_embeddings.armazenamento is not None:
+            encontrados.update(await self._executar_em_thread(self.cache_embeddings.obter_compartilhados, ausentes))
+        else:
+            encontrados.update(self.cache_embeddings.obter_compartilhados(ausentes))
+        return self._classificar_embeddings(chaves, textos, encontrados)
+
+    def _classificar_embeddings(self, chaves, textos, encontrados):
+        faltantes = {}
+        for chave, texto in zip(chaves, textos):
+            if chave not in encontrados:
+                faltantes[chave] = texto
+        if encontrados:
+            CACHE.inc(len(encontrados), cache='embeddings', resultado='acerto')
+        if faltantes:
+            CACHE.inc(len(faltantes), cache='embeddings', resultado='falha')
+        return chaves, encontrados, faltantes
+
+    def _embed_remoto(self, faltantes, input_type):
+        """Gera na API, em lotes, os embeddings ausentes do cache"""
+        itens = list(faltantes.items())
+        novos = {}
+        for inicio in range(0, len(itens), EMBED_LOTE_MAX):
+            lote = itens[inicio:inicio + EMBED_LOTE_MAX]
             response = self.pc.inference.embed(
-                model="llama-text-embed-v2",
-                inputs=[texto],
-                parameters={"input_type": "passage"}
+                model=MODELO_EMBEDDING,
+                inputs=[texto for _, texto in lote],
+                parameters={"input_type": input_type}
             )
-            return response.data[0]['values']
+            for (chave, _), item in zip(lote, response.data):
+                novos[chave] = item['values']
+        self.cache_embeddings.guardar_varios(novos)
+        return novos
+
+    def gerar_embeddings(self, textos, input_type=EMBED_PASSAGEM):
+        """Gera embeddings em lote usando o cache; retorna None para os que falharem"""
+        chaves, encontrados, faltantes = self._separar_do_cache(textos, input_type)
+        if faltantes:
+            try:
+                encontrados.update(self._embed_remoto(faltantes, input_type))
+            except Exception as e:
+                logger.error("❌ Erro ao gerar embeddings: %s", e)
+        return [_como_lista(encontrados.get(chave)) for chave in chaves]
+
+    def gerar_embedding(self, texto, input_type=EMBED_PASSAGEM):
+        """Gera embedding usando modelo integrado do Pinecone (llama-text-embed-v2)"""
+        # Usar o modelo integrado do Pinecone que gera 1024 dimensões
+        return self.gerar_embeddings([texto], input_type)[0]
+
+    def gerar_embeddings_consulta(self, perguntas):
+        """Embeddings de perguntas (input_type 'query')"""
+        return self.gerar_embeddings(perguntas, EMBED_CONSULTA)
+
+    def gerar_embedding_consulta(self, pergunta):
+        """Embedding de uma pergunta (input_type 'query')"""
+        return self.gerar_embedding(pergunta, EMBED_CONSULTA)
+
+    def _documentos_da_faq(self, entrada, estatisticas=None):
+        """Documentos pré-selecionados de uma pergunta da FAQ; None se algum não existir mais"""
+        try:
+            documentos = self.recuperador.buscar_por_ids([doc_id for doc_id, _ in entrada.documentos])
         except Exception as e:
-            print(f"❌ Erro ao gerar embedding: {e}")
+            logger.error("❌ Erro ao buscar documentos da FAQ: %s", e)
             return None
+        return self._aplicar_faq(entrada, documentos, estatisticas)
+
+    def _aplicar_faq(self, entrada, documentos, estatisticas=None):
+        """Restaura os scores pré-calculados; None se algum documento não existir mais"""
+        if len(documentos) < len(entrada.documentos):
+            logger.warning("⚠️ Documentos da FAQ ausentes no índice, refazendo a busca")
+            return None
+        scores = dict(entrada.documentos)
+        for doc in documentos:
+            doc.score = scores[doc.id]
+        if estatisticas is not None:
+            estatisticas['faq'] = True
+        logger.debug("📋 Pergunta da FAQ: %d documentos pré-selecionados", len(documentos))
+        return documentos
+
+    def _selecionar(self, matches, estatisticas=None):
+        """Seleção adaptativa dos candidatos; registra as estatísticas da requisição"""
+        selecionados, selecao = self.seletor.selecionar(matches, self.recuperador.escala)
+        logger.debug("🎚️ Seleção: %d/%d documentos (%d abaixo do piso, %d após o cotovelo, %d por diversidade)",
+                     selecao.selecionados, selecao.candidatos, selecao.abaixo_do_piso,
+                     selecao.cortados_no_cotovelo, selecao.removidos_diversidade)
+        if estatisticas is not None:
+            estatisticas['selecao'] = selecao.como_dict()
+        return selecionados
+
+    def buscar_no_pinecone(self, pergunta, top_k=None, embedding=None, estatisticas=None):
+        """Busca semântica no recuperador configurado (reaproveita o embedding se já calculado)
 
-    def buscar_no_pinecone(self, pergunta, top_k=10):
-        """Busca semântica no Pinecone"""
-        print(f"🔍 Buscando no Pinecone: '{pergunta}'")
+        Sem top_k, busca os candidatos e aplica a seleção adaptativa (SeletorDocumentos);
+        com top_k, retorna exatamente os top_k primeiros matches.
+        """
+        logger.debug("🔍 Buscando no %s: '%s'", self.recuperador.nome, pergunta)
 
         try:
             # Gerar embedding usando modelo integrado do Pinecone
-            embedding = self.gerar_embedding(pergunta)
             if embedding is None:
-                print("❌ Erro ao gerar embedding")
+                embedding = self.gerar_embedding_consulta(pergunta)
+            if embedding is None:
+                logger.error("❌ Erro ao gerar embedding")
                 return []
 
-            # Buscar usando query no namespace vazio (onde estão os dados)
-            results = self.index.query(
-                namespace="",
-                vector=embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
+            matches = self.recuperador.buscar(embedding, top_k or self.seletor.candidatos, pergunta=pergunta)
+            if matches and top_k is None:
+                matches = self._selecionar(matches, estatisticas)
 
-            if hasattr(results, 'matches') and results.matches:
-                matches = results.matches
-                print(f"✅ {len(matches)} documentos encontrados")
+            if matches:
+                logger.debug("✅ %d documentos encontrados", len(matches))
                 return matches
             else:
-                print("⚠️ Nenhum resultado encontrado")
+                logger.warning("⚠️ Nenhum resultado encontrado")
                 return []
 
         except Exception as e:
-            print(f"❌ Erro na busca Pinecone: {e}")
+            logger.exception("❌ Erro na busca vetorial: %s", e)
             return []
     
     def limpar_e_corrigir_texto(self, texto):
         """Limpa e corrige automaticamente erros de texto"""
-        # Correções obrigatórias
-        correcoes = {
-            'escontado': 'descontado',
-            'ESCONTADO': 'DESCONTADO',
-            'chunk': 'documento',
-            'chunks': 'documentos',
-            'Chunk': 'Documento',
-            'Chunks': 'Documentos',
-            'Abate do Teto Constitucional': 'Abate Teto Constitucional',
-            'ABATE DO TETO CONSTITUCIONAL': 'ABATE TETO CONSTITUCIONAL',
-            'Ministério da Economia': 'Ministério da Gestão e Inovação em Serviços Públicos (MGI)',
-            'MINISTÉRIO DA ECONOMIA': 'MINISTÉRIO DA GESTÃO E INOVAÇÃO EM SERVIÇOS PÚBLICOS (MGI)',
-            'Ministério da Infraestrutura': 'Ministério do Trabalho (MT)',
-            'MINISTÉRIO DA INFRAESTRUTURA': 'MINISTÉRIO DO TRABALHO (MT)'
-        }
-
-        texto_limpo = texto
-        for erro, correcao in correcoes.items():
-            texto_limpo = texto_limpo.replace(erro, correcao)
+        return self.corretor.corrigir(texto)
 
-        return texto_limpo
-
-    def preparar_contexto_para_gemini(self, documentos):
-        """Prepara o contexto dos documentos para o Gemini"""
+    def preparar_contexto_para_gemini(self, documentos, pergunta=None):
+        """Prepara o contexto compacto dos documentos para o Gemini (ContextoGemini)"""
         contexto = []
 
         for i, doc in enumerate(documentos):
             if hasattr(doc, 'metadata') and doc.metadata:
                 metadata = doc.metadata
-                # Na versão 7.3.0, o conteúdo pode estar em diferentes campos
-                conteudo = metadata.get('text', '') or metadata.get('content', '') or metadata.get('chunk_text', '')
-                document_title = metadata.get('document_title', metadata.get('source', f'Documento {i+1}'))
-
-                if conteudo:
-                    # Limpar texto (remover caracteres especiais)
-                    chunk_clean = conteudo.replace('\uf0c9', '').replace('\uf002', '').replace('\uf142', '')
-                    chunk_clean = ' '.join(chunk_clean.split())  # Normalizar espaços
 
-                    # Aplicar correções automáticas
-                    chunk_clean = self.limpar_e_corrigir_texto(chunk_clean)
+                if metadata.get('esquema') == ESQUEMA_METADADOS:
+                    # Documento ingerido por ingestao.py: já normalizado
+                    conteudo = metadata['text']
+                    document_title = metadata['document_title']
+                    chunk_clean = conteudo
+                else:
+                    # Na versão 7.3.0, o conteúdo pode estar em diferentes campos
+                    conteudo = metadata.get('text', '') or metadata.get('content', '') or metadata.get('chunk_text', '')
+                    document_title = metadata.get('document_title', metadata.get('source', f'Documento {i+1}'))
+                    # Remover caracteres especiais, normalizar espaços e corrigir termos
+                    chunk_clean = self.corretor.limpar(conteudo) if conteudo else ''
 
+                if chunk_clean:
                     contexto.append({
                         "documento_id": doc.id if hasattr(doc, 'id') else f'doc_{i}',
                         "document_title": document_title,
                         "relevancia": f"{doc.score:.2%}" if hasattr(doc, 'score') else "N/A",
-                        "conteudo": chunk_clean[:5000] + "..." if len(chunk_clean) > 5000 else chunk_clean
+                        "conteudo": chunk_clean
                     })
 
+        # Deduplicar, recortar os trechos relevantes e respeitar o orçamento de tokens
+        contexto = self.construtor_contexto.construir(contexto, pergunta)
+        logger.debug("📏 Contexto: %d tokens em %d documentos (%d descartados)",
+                     contexto.tokens, len(contexto.documentos), len(contexto.descartados))
         return contexto
 
-    def processar_com_gemini(self, pergunta, documentos):
+    def mostrar_documentos(self, contexto):
+        """Registra os documentos usados no contexto (só com VIVI_LOG_NIVEL=DEBUG)"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        for i, ctx in enumerate(contexto.documentos):
+            logger.debug("📚 Documento %d", i + 1, extra={'dados': {
+                'documento_id': ctx['documento_id'],
+                'document_title': ctx['document_title'],
+                'relevancia': ctx['relevancia'],
+                'conteudo': ctx['conteudo'][:150]
+            }})
+
+    def _montar_prompt(self, pergunta, documentos, estatisticas=None, resumo=None):
+        """Etapa de contexto: contexto compacto + prompt; retorna (contexto, prompt)"""
+        with medir('contexto', estatisticas):
+            contexto = self.preparar_contexto_para_gemini(documentos, pergunta)
+            # Selecionar catchphrase aleatória
+            catchphrase = random.choice(self.catchphrases["abertura"])
+            prompt = self.prompt.montar(pergunta, contexto, catchphrase, resumo)
+        DOCUMENTOS.observar(len(contexto.documentos))
+        if estatisticas is not None:
+            estatisticas['documentos'] = len(contexto.documentos)
+            estatisticas['tokens_contexto'] = contexto.tokens
+        return contexto, prompt
+
+    def processar_com_gemini(self, pergunta, documentos, estatisticas=None):
         """Processa a pergunta e documentos com Gemini usando persona da Vivi IA"""
-        print("🤖 Gerando resposta com Gemini 2.5 Flash (Vivi IA)...")
+        logger.debug("🤖 Gerando resposta com Gemini 2.5 Flash (Vivi IA)...")
 
         if not documentos:
-            return "❌ Nenhum resultado encontrado no banco de dados."
-
-        # Preparar contexto
-        contexto = self.preparar_contexto_para_gemini(documentos)
-
-        # Selecionar catchphrase aleatória
-        catchphrase = random.choice(self.catchphrases["abertura"])
-
-        # Prompt da Vivi IA - VERSÃO REFORÇADA
-        prompt = f"""
-VOCÊ É VIVI IA. A PARTIR DE AGORA, VOCÊ É ELA COMPLETAMENTE.
-
-INSTRUÇÕES DE PERSONALIDADE (OBRIGATÓRIAS):
-- VOCÊ SEMPRE fala na primeira pessoa como "eu" (Vivi)
-- SUA primeira frase DEVE SER EXATAMENTE a catchphrase fornecida: "{catchphrase}"
-- VOCÊ é DIRETA, EFICIENTE, COMPETENTE e PROFISSIONAL
-- VOCÊ é INTOLERANTE com preguiça e falta de esforço
-- VOCÊ é CORDIAL mas FIRME quando necessário
-- VOCÊ é especialista em gestão pública e SIAPE
-
-EXEMPLO DE ABERTURA:
-"{catchphrase}"
-
-Agora responda à pergunta mantendo esta personalidade.
-
-PERGUNTA DO USUÁRIO:
-{pergunta}
-
-CONTEXTO DISPONÍVEL (documentos do documento):
-{json.dumps(contexto, indent=2, ensure_ascii=False)}
-
-INSTRUÇÕES DE RESPOSTA:
-1. COMECE SUA RESPOSTA com EXATAMENTE esta frase: "{catchphrase}"
-2. RESPONDA NA PRIMEIRA PESSOA como Vivi IA
-3. Seja DIRETA e OBJETIVA, mas PROFISSIONAL
-4. Use linguagem FORMAL e TÉCNICA quando necessário
-5. NÃO cite referências inline (documento_id) ao longo do texto
-6. Se não houver informação suficiente, diga claramente
-7. NÃO invente informações que não estejam no contexto
-8. Estruture a resposta para facilitar a compreensão
-9. Use CAPSLOCK para ÊNFASE em normativas relevantes
-10. Seja ASSERTIVA e OBJETIVA
-
-PERSONALIDADE VIVI IA:
-- Competente, Direta, Eficiente, Cordial, Justa, Inteligente
-- Impaciente com a falta de esforço
-- Tom profissional e objetivo, sem ser rude
-- Respeito sempre, mas sem tolerar desorganização
-
-IMPORTANTE SOBRE CONCLUSÃO:
-- ANTES das referências, SEMPRE faça uma conclusão sucinta
-- A conclusão deve ser na primeira pessoa como Vivi IA
-- Deve reforçar a importância da informação ou orientar sobre próximos passos
-- Deve ser breve (2-3 frases) e manter o tom profissional mas pessoal da Vivi IA
-- Exemplos: "Espero que estas informações sejam úteis para sua gestão.", "Fique atento às normativas específicas do seu caso.", "Esta é uma questão que merece atenção especial."
-
-IMPORTANTE SOBRE REFERÊNCIAS:
-- NÃO use referências inline como "documento_id: abate_teto#5"
-- Após a conclusão, adicione uma seção "Referências:"
-- Use APENAS os metadados document_title dos documentos que você realmente utilizou para construir a resposta
-- NÃO invente títulos de documentos - use APENAMENTE os títulos reais dos metadados
-- IMPORTANTE: Sempre cite TODAS as referências consultadas, tanto o documento principal quanto todos os documentos complementares que foram utilizados para enriquecer a resposta
-- SEMPRE liste TODOS os documentos complementares que foram utilizados para enriquecer a resposta, mesmo que não sejam o documento principal consultado
-
-IMPORTANTE SOBRE LISTAS E INFORMAÇÕES COMPLETAS:
-- Quando a pergunta solicitar uma lista (bancos, órgãos, processos, etc.), forneça TODOS os itens disponíveis no contexto
-- NÃO use expressões como "alguns dos", "entre outros", "dentre os quais" - seja COMPLETO
-- Liste TODOS os itens encontrados, organizando-os de forma clara e legível
-- Se houver muitos itens, use formatação adequada (tópicos, tabelas, etc.)
-- EXEMPLO: ❌ "Alguns bancos: Banco A, Banco B, entre outros" | ✅ "Bancos credenciados: Banco A, Banco B, Banco C, Banco D"
-
-INSTRUÇÕES ESPECÍFICAS PARA LISTAS ESTRUTURADAS:
-- Para listas com metadados estruturados (bancos, órgãos, processos, etc.), SEMPRE inclua TODAS as informações disponíveis
-- NÃO omita nenhuma informação - se estiver no contexto, deve aparecer na resposta
-- Se uma informação não estiver disponível, indique claramente "Não especificado" ou "Não disponível"
-- Organize a lista de forma sistemática e consistente para todos os itens
-- Use formatação padronizada (símbolos, espaçamento, estrutura)
-- EXEMPLOS CORRETOS:
-  • Bancos: "001 - BANCO DO BRASIL S.A. ○ Ponto Focal: Nome Completo ○ E-mail: email@banco.com ○ Telefone: (XX) XXXX-XXXX"
-  • Órgãos: "ÓRGÃO A - Nome do Órgão ○ Responsável: Nome ○ Departamento: Setor ○ Contato: email@orgao.gov.br"
-  • Processos: "PROCESSO 001 - Descrição ○ Prazo: X dias ○ Responsável: Nome ○ Status: Em andamento"
-
-CORREÇÕES OBRIGATÓRIAS DE PALAVRAS:
-- SEMPRE substitua "chunks" por "documentos"
-- SEMPRE substitua "escontado" por "descontado"
-- SEMPRE substitua "chunk_id" por "documento_id"
-- SEMPRE substitua "chunk" por "documento"
-- SEMPRE substitua "chunks" por "documentos"
-- SEMPRE substitua "chunk_text" por "conteúdo do documento"
-- SEMPRE substitua "chunk_index" por "índice do documento"
-- SEMPRE substitua "chunk_size" por "tamanho do documento"
-- SEMPRE substitua "Abate do Teto Constitucional" por "Abate Teto Constitucional"
-- SEMPRE substitua "Ministério da Economia" por "Ministério da Gestão e Inovação em Serviços Públicos (MGI)"
-- SEMPRE substitua "Ministério da Infraestrutura" por "Ministério do Trabalho (MT)"
-
-EXEMPLOS DE CORREÇÃO:
-❌ INCORRETO: "os chunks encontrados", "escontado no contracheque", "Abate do Teto Constitucional", "Ministério da Economia"
-✅ CORRETO: "os documentos encontrados", "descontado no contracheque", "Abate Teto Constitucional", "Ministério da Gestão e Inovação em Serviços Públicos (MGI)"
-
-IMPORTANTE: SUA RESPOSTA DEVE começar EXATAMENTE com: "{catchphrase}"
-
-AGORA RESPONDA COMO VIVI IA:
-"""
+            return RESPOSTA_SEM_DOCUMENTOS
+
+        # Preparar contexto (o formato do prompt depende do cache de instruções renovado)
+        self.prompt.renovar()
+        contexto, prompt = self._montar_prompt(pergunta, documentos, estatisticas)
 
         try:
-            response = self.model.generate_content(prompt)
+            with medir('geracao', estatisticas):
+                response = self.prompt.modelo().generate_content(prompt)
+            registrar_uso_gemini(getattr(response, 'usage_metadata', None), estatisticas)
             resposta = response.text
 
-            # Mostrar documentos encontrados (debug)
-            print(f"\n📚 DOCUMENTOS ENCONTRADOS:")
-            for i, ctx in enumerate(contexto):
-                print(f"\n--- Documento {i+1} ---")
-                print(f"ID: {ctx['documento_id']}")
-                print(f"Título: {ctx['document_title']}")
-                print(f"Relevância: {ctx['relevancia']}")
-                print(f"Conteúdo (CORRIGIDO): {ctx['conteudo'][:150]}...")
+            self.mostrar_documentos(contexto)
 
             return resposta
 
         except Exception as e:
-            print(f"❌ Erro no Gemini: {e}")
-            return f"Erro ao processar com IA: {str(e)}"
+            logger.error("❌ Erro no Gemini: %s", e)
+            return f"{PREFIXO_ERRO_GEMINI} {str(e)}"
     
-    def executar_busca_completa(self, pergunta):
-        """Executa a busca completa"""
-        print(f"\n🎯 EXECUTANDO BUSCA COMPLETA - VIVI IA")
-        print(f"📝 Pergunta: {pergunta}")
-        print("=" * 60)
-        
-        # 1. Buscar no Pinecone
-        documentos = self.buscar_no_pinecone(pergunta)
-        
-        # 2. Processar com Gemini
-        resposta = self.processar_com_gemini(pergunta, documentos)
-        
-        print("✅ Busca completa finalizada!")
+    def executar_busca_completa(self, pergunta, estatisticas=None):
+        """Executa a busca completa (estatisticas: dict opcional preenchido com dados da requisição)"""
+        estatisticas = {} if estatisticas is None else estatisticas
+        with medir_requisicao('completa', estatisticas):
+            logger.debug("🎯 Executando busca completa: %s", pergunta)
+
+            # 0. Cache de respostas: pergunta idêntica
+            resposta = self._do_cache_exato(pergunta, estatisticas)
+            if resposta is not None:
+                return resposta
+
+            # 0.1 Cache de respostas: pergunta quase idêntica (pergunta da FAQ já tem embedding)
+            faq = self._consultar_faq(pergunta)
+            if faq:
+                embedding = faq.embedding
+            else:
+                with medir('embedding', estatisticas):
+                    embedding = self.gerar_embedding_consulta(pergunta)
+            resposta = self._do_cache_semelhante(embedding, estatisticas)
+            if resposta is not None:
+                return resposta
+
+            # 1. Buscar no Pinecone (pergunta da FAQ: documentos pré-selecionados)
+            with medir('busca', estatisticas):
+                documentos = self._documentos_da_faq(faq, estatisticas) if faq else None
+                if documentos is None:
+                    documentos = self.buscar_no_pinecone(pergunta, embedding=embedding, estatisticas=estatisticas)
+
+            # 2. Processar com Gemini
+            resposta = self.processar_com_gemini(pergunta, documentos, estatisticas)
+
+            with medir('pos_processamento', estatisticas):
+                self._guardar_resposta(pergunta, embedding, documentos, resposta, estatisticas)
+
+            logger.debug("✅ Busca completa finalizada!")
+            return resposta
+
+    def _do_cache_exato(self, pergunta, estatisticas):
+        """Resposta em cache para a mesma pergunta (normalizada), ou None"""
+        return self._registrar_cache_exato(self.cache_respostas.obter(pergunta), estatisticas)
+
+    async def _ado_cache_exato(self, pergunta, estatisticas):
+        """Versão assíncrona de _do_cache_exato: o armazenamento compartilhado é consultado em uma thread"""
+        return (await self._ado_cache_exato_varios([pergunta], [estatisticas]))[0]
+
+    async def _ado_cache_exato_varios(self, perguntas, estatisticas):
+        """Cache exato de várias perguntas: memória local no event loop, uma única ida à thread
+        para a versão global e as ausentes no armazenamento compartilhado"""
+        cache = self.cache_respostas
+        if cache.sincronizacao_pendente():
+            await self._executar_em_thread(cache.sincronizar_versao)
+        respostas = [cache.obter_local(pergunta) for pergunta in perguntas]
+        ausentes = [i for i, resposta in enumerate(respostas) if resposta is None]
+        if ausentes and cache.armazenamento is not None:
+            compartilhadas = await self._executar_em_thread(
+                lambda: [cache.obter_compartilhada(perguntas[i]) for i in ausentes]
+            )
+            for i, resposta in zip(ausentes, compartilhadas):
+                respostas[i] = resposta
+        return [self._registrar_cache_exato(resposta, est) for resposta, est in zip(respostas, estatisticas)]
+
+    def _registrar_cache_exato(self, resposta, estatisticas):
+        if resposta is not None:
+            logger.debug("⚡ Resposta servida do cache (pergunta idêntica)")
+            CACHE.inc(cache='respostas', resultado='acerto_exato')
+            estatisticas['resultado'] = 'cache_exato'
+        return resposta
+
+    def _do_cache_semelhante(self, embedding, estatisticas):
+        """Resposta em cache de uma pergunta quase idêntica, ou None"""
+        resposta = self.cache_respostas.obter_semelhante(embedding)
+        if resposta is not None:
+            logger.debug("⚡ Resposta servida do cache (pergunta semelhante)")
+            CACHE.inc(cache='respostas', resultado='acerto_semelhante')
+            estatisticas['resultado'] = 'cache_semelhante'
+        else:
+            CACHE.inc(cache='respostas', resultado='falha')
         return resposta
 
+    def _consultar_faq(self, pergunta):
+        """Entrada da tabela FAQ para a pergunta, ou None"""
+        faq = self.faq.obter(pergunta)
+        if len(self.faq):
+            CACHE.inc(cache='faq', resultado='acerto' if faq else 'falha')
+        return faq
+
+    def _guardar_resposta(self, pergunta, embedding, documentos, resposta, estatisticas):
+        """Guarda a resposta no cache quando cabível e registra o resultado da requisição"""
+        if self._resposta_cacheavel(documentos, resposta):
+            entrada = self.cache_respostas.guardar_local(pergunta, embedding, resposta)
+            if entrada is not None and self.cache_respostas.armazenamento is not None:
+                # Gravação no backend compartilhado em segundo plano, no pool de I/O
+                self._submeter(self.cache_respostas.guardar_compartilhada, entrada)
+        if not documentos:
+            estatisticas['resultado'] = 'sem_documentos'
+        elif resposta and resposta.startswith(PREFIXO_ERRO_GEMINI):
+            estatisticas['resultado'] = 'erro'
+
+    def versao_do_indice(self):
+        """Versão do índice gravada pela última ingestão concluída (None: índice sem marcador)
+
+        Não é derivada da contagem de vetores, que muda a cada lote durante uma ingestão.
+        """
+        return self.recuperador.versao()
+
+    def _resposta_cacheavel(self, documentos, resposta):
+        """Só respostas geradas a partir de documentos e sem erro vão para o cache"""
+        return bool(documentos) and bool(resposta) and not resposta.startswith(PREFIXO_ERRO_GEMINI)
+
+    def invalidar_cache(self):
+        """Invalida os caches de respostas e de recuperações (chamar após reingestão do índice)"""
+        self.cache_respostas.invalidar()
+        self.cache_recuperacao.limpar()
+
+    async def ainvalidar_cache(self):
+        """Versão assíncrona de invalidar_cache (o incremento da versão global vai para uma thread)"""
+        await self._executar_em_thread(self.invalidar_cache)
+
+    # ------------------------------------------------------------------
+    # Pipeline assíncrono: não bloqueia o event loop do servidor
+    # ------------------------------------------------------------------
+
+    def _submeter(self, funcao, *args, **kwargs):
+        """Envia a chamada ao pool de I/O, contando-a como ocupada até terminar (ou sair da fila)
+
+        O contexto (ID da requisição nos logs) é copiado para a thread.
+        """
+        contexto = contextvars.copy_context()
+        with self._lock_ocupadas:
+            self._ocupadas += 1
+        try:
+            futuro = self._executor.submit(contexto.run, funcao, *args, **kwargs)
+        except BaseException:
+            self._liberar_thread(None)
+            raise
+        futuro.add_done_callback(self._liberar_thread)
+        return futuro
+
+    def _liberar_thread(self, _futuro):
+        with self._lock_ocupadas:
+            self._ocupadas -= 1
+
+    def threads_livres(self):
+        """Threads do pool de I/O sem chamada em andamento nem na fila"""
+        with self._lock_ocupadas:
+            return self.max_concorrencia - self._ocupadas
+
+    async def _executar_em_thread(self, funcao, *args, **kwargs):
+        """Executa uma chamada bloqueante do SDK no pool de I/O do agente"""
+        return await asyncio.wrap_future(self._submeter(funcao, *args, **kwargs))
+
+    async def _arenovar_prompt(self):
+        """Renova o cache de instruções fora do event loop, só quando necessário"""
+        if self.prompt.precisa_renovar():
+            await self._executar_em_thread(self.prompt.renovar)
+
+    async def averificar_pinecone(self):
+        """Verificação barata do Pinecone: estatísticas do índice, sem embedding nem query"""
+        return await self._executar_em_thread(self.index.describe_index_stats)
+
+    async def aversao_do_indice(self):
+        """Versão assíncrona de versao_do_indice"""
+        return await self._executar_em_thread(self.versao_do_indice)
+
+    async def averificar_gemini(self):
+        """Verificação barata do Gemini: metadados do modelo, sem geração"""
+        return await self._executar_em_thread(genai.get_model, self.model.model_name)
+
+    async def agerar_embeddings(self, textos, input_type=EMBED_PASSAGEM, prazo=None):
+        """Versão assíncrona de gerar_embeddings (só vai à thread se faltar algo no cache)
+
+        Falhas esgotadas da etapa (FalhaEtapa) são propagadas em vez de virar None.
+        """
+        chaves, encontrados, faltantes = await self._aseparar_do_cache(textos, input_type)
+        if faltantes:
+            try:
+                encontrados.update(await self.resiliencia.executar(
+                    'embed', lambda: self._executar_em_thread(self._embed_remoto, faltantes, input_type), prazo
+                ))
+            except FalhaEtapa:
+                raise
+            except Exception as e:
+                logger.error("❌ Erro ao gerar embeddings: %s", e)
+        return [_como_lista(encontrados.get(chave)) for chave in chaves]
+
+    async def agerar_embedding(self, texto, input_type=EMBED_PASSAGEM, prazo=None):
+        """Versão assíncrona de gerar_embedding"""
+        return (await self.agerar_embeddings([texto], input_type, prazo))[0]
+
+    async def agerar_embedding_consulta(self, pergunta, prazo=None):
+        """Versão assíncrona de gerar_embedding_consulta"""
+        return await self.agerar_embedding(pergunta, EMBED_CONSULTA, prazo)
+
+    async def _adocumentos_da_faq(self, entrada, estatisticas=None, prazo=None):
+        """Versão assíncrona de _documentos_da_faq (só vai à thread para perguntas da FAQ)"""
+        if entrada is None:
+            return None
+        ids = [doc_id for doc_id, _ in entrada.documentos]
+        documentos = await self.resiliencia.executar(
+            'busca', lambda: self._executar_em_thread(self.recuperador.buscar_por_ids, ids), prazo
+        )
+        return self._aplicar_faq(entrada, documentos, estatisticas)
+
+    async def abuscar_no_pinecone(self, pergunta, top_k=None, embedding=None, estatisticas=None, prazo=None):
+        """Versão assíncrona de buscar_no_pinecone"""
+        logger.debug("🔍 Buscando no %s: '%s'", self.recuperador.nome, pergunta)
+
+        try:
+            if embedding is None:
+                embedding = await self.agerar_embedding_consulta(pergunta, prazo)
+            if embedding is None:
+                logger.error("❌ Erro ao gerar embedding")
+                return []
+
+            matches = await self.resiliencia.executar('busca', lambda: self._executar_em_thread(
+                self.recuperador.buscar, embedding, top_k or self.seletor.candidatos, pergunta=pergunta
+            ), prazo)
+            if matches and top_k is None:
+                matches = self._selecionar(matches, estatisticas)
+
+            if matches:
+                logger.debug("✅ %d documentos encontrados", len(matches))
+                return matches
+            else:
+                logger.warning("⚠️ Nenhum resultado encontrado")
+                return []
+
+        except FalhaEtapa:
+            raise
+        except Exception as e:
+            logger.exception("❌ Erro na busca vetorial: %s", e)
+            return []
+
+    async def aprocessar_com_gemini(self, pergunta, documentos, prazo=None, estatisticas=None):
+        """Versão assíncrona de processar_com_gemini (etapas de contexto e geração sobre os documentos)"""
+        if not documentos:
+            return RESPOSTA_SEM_DOCUMENTOS
+        recuperacao = Recuperacao(pergunta=pergunta, embedding=None, documentos=documentos)
+        montado = await self.amontar_contexto(recuperacao, pergunta, estatisticas)
+        return (await self.agerar(montado, prazo, estatisticas)).texto
+
+    # ------------------------------------------------------------------
+    # Etapas: recuperar → montar contexto → gerar → pós-processar
+    # Cada uma recebe o resultado da anterior e pode ser chamada isoladamente
+    # (/api/etapas); uma nova geração repete só a etapa do Gemini
+    # ------------------------------------------------------------------
+
+    async def arecuperar(self, pergunta, estatisticas=None, prazo=None, faq=None, embedding=None):
+        """Etapa 1: documentos da pergunta (cache de recuperações, FAQ ou busca vetorial)
+
+        faq/embedding: já obtidos pelo chamador (ex.: para consultar antes o cache semântico).
+        """
+        estatisticas = {} if estatisticas is None else estatisticas
+        recuperacao = self.cache_recuperacao.obter(pergunta)
+        if recuperacao is not None:
+            logger.debug("⚡ Documentos servidos do cache de recuperações")
+            CACHE.inc(cache='recuperacao', resultado='acerto')
+        else:
+            CACHE.inc(cache='recuperacao', resultado='falha')
+            if embedding is None:
+                faq = faq or self._consultar_faq(pergunta)
+                if faq:
+                    embedding = faq.embedding
+                else:
+                    with medir('embedding', estatisticas):
+                        embedding = await self.agerar_embedding_consulta(pergunta, prazo)
+
+            # Pergunta da FAQ: documentos pré-selecionados
+            with medir('busca', estatisticas):
+                documentos = await self._adocumentos_da_faq(faq, estatisticas, prazo)
+                if documentos is None:
+                    documentos = await self.abuscar_no_pinecone(
+                        pergunta, embedding=embedding, estatisticas=estatisticas, prazo=prazo
+                    )
+            recuperacao = Recuperacao(
+                pergunta=pergunta, embedding=embedding, documentos=documentos,
+                faq=estatisticas.get('faq', False), selecao=estatisticas.get('selecao')
+            )
+            # Busca vazia (ou que falhou) não fica guardada; no backend compartilhado, antes de
+            # devolver o ID, para a próxima etapa funcionar em qualquer worker
+            if documentos:
+                self.cache_recuperacao.guardar(recuperacao)
+                if self.cache_recuperacao.armazenamento is not None:
+                    await self._executar_em_thread(self.cache_recuperacao.guardar_compartilhada, recuperacao)
+
+        estatisticas['recuperacao_id'] = recuperacao.id
+        if recuperacao.faq:
+            estatisticas['faq'] = True
+        if recuperacao.selecao is not None:
+            estatisticas['selecao'] = recuperacao.selecao
+        return recuperacao
+
+    async def aobter_recuperacao(self, id_recuperacao, prazo=None):
+        """Recuperação pelo ID (deste worker ou, com backend compartilhado, de qualquer um), ou None
+
+        Vinda de outro worker, os documentos são buscados de novo pelos IDs; se algum não
+        existir mais (reingestão), a recuperação é tratada como expirada.
+        """
+        recuperacao = self.cache_recuperacao.obter_por_id(id_recuperacao)
+        if recuperacao is not None or self.cache_recuperacao.armazenamento is None:
+            return recuperacao
+        registro = await self._executar_em_thread(self.cache_recuperacao.carregar_compartilhada, id_recuperacao)
+        if registro is None:
+            return None
+        ids = [doc_id for doc_id, _ in registro['documentos']]
+        documentos = await self.resiliencia.executar(
+            'busca', lambda: self._executar_em_thread(self.recuperador.buscar_por_ids, ids),
+            prazo or self.resiliencia.novo_prazo()
+        )
+        if len(documentos) < len(ids):
+            logger.warning("⚠️ Documentos da recuperação ausentes no índice")
+            return None
+        recuperacao = Recuperacao.de_registro(id_recuperacao, registro, documentos)
+        self.cache_recuperacao.guardar(recuperacao)
+        return recuperacao
+
+    async def amontar_contexto(self, recuperacao, pergunta=None, estatisticas=None, resumo=None):
+        """Etapa 2: contexto compacto e prompt (pergunta: a da recuperação, ou outra sobre os mesmos documentos;
+        resumo: da conversa, nas continuações de uma sessão)"""
+        await self._arenovar_prompt()
+        pergunta = pergunta or recuperacao.pergunta
+        contexto, prompt = self._montar_prompt(pergunta, recuperacao.documentos, estatisticas, resumo)
+        return PromptMontado(pergunta=pergunta, recuperacao=recuperacao, contexto=contexto, prompt=prompt)
+
+    async def agerar(self, montado, prazo=None, estatisticas=None):
+        """Etapa 3: resposta do Gemini para o prompt montado
+
+        Falhas esgotadas (FalhaEtapa) são propagadas; outros erros viram Geracao(erro=True).
+        """
+        logger.debug("🤖 Gerando resposta com Gemini 2.5 Flash (Vivi IA)...")
+        uso = {}
+        try:
+            async with self.geracoes.vaga(prazo, estatisticas):
+                with medir('geracao', estatisticas):
+                    response = await self.resiliencia.executar(
+                        'geracao', lambda: self.prompt.modelo().generate_content_async(montado.prompt), prazo
+                    )
+            registrar_uso_gemini(getattr(response, 'usage_metadata', None), uso)
+            if estatisticas is not None and uso:
+                estatisticas.update(uso)
+            # Mesmas correções que o stream aplica parte a parte
+            texto = self.corretor.corrigir(response.text)
+
+            self.mostrar_documentos(montado.contexto)
+
+            return Geracao(texto=texto, tokens=uso.get('tokens'))
+
+        except FalhaEtapa:
+            raise
+        except Exception as e:
+            logger.error("❌ Erro no Gemini: %s", e)
+            return Geracao(texto=f"{PREFIXO_ERRO_GEMINI} {str(e)}", erro=True)
+
+    def pos_processar(self, recuperacao, pergunta, geracao, estatisticas=None):
+        """Etapa 4: guarda a resposta no cache e registra o resultado da requisição
+
+        Só a resposta à pergunta da própria recuperação vai para o cache (o cache
+        semântico é indexado pelo embedding dela).
+        """
+        estatisticas = {} if estatisticas is None else estatisticas
+        with medir('pos_processamento', estatisticas):
+            em_cache = False
+            if normalizar_pergunta(pergunta) == normalizar_pergunta(recuperacao.pergunta):
+                em_cache = self._resposta_cacheavel(recuperacao.documentos, geracao.texto)
+                self._guardar_resposta(pergunta, recuperacao.embedding, recuperacao.documentos,
+                                       geracao.texto, estatisticas)
+            elif geracao.erro:
+                estatisticas['resultado'] = 'erro'
+        return RespostaFinal(pergunta=pergunta, resposta=geracao.texto, recuperacao_id=recuperacao.id,
+                             em_cache=em_cache)
+
+    async def agerar_resposta(self, recuperacao, pergunta=None, prazo=None, estatisticas=None):
+        """Etapas 2 a 4 sobre uma recuperação já feita"""
+        pergunta = pergunta or recuperacao.pergunta
+        if recuperacao.documentos:
+            montado = await self.amontar_contexto(recuperacao, pergunta, estatisticas)
+            geracao = await self.agerar(montado, prazo, estatisticas)
+        else:
+            geracao = Geracao(texto=RESPOSTA_SEM_DOCUMENTOS)
+        return self.pos_processar(recuperacao, pergunta, geracao, estatisticas)
+
+    async def aexecutar_recuperacao(self, pergunta, estatisticas=None, prazo=None):
+        """Só a etapa de recuperação, com prazo, vaga no pipeline e métricas de requisição"""
+        prazo = prazo or self.resiliencia.novo_prazo()
+        estatisticas = {} if estatisticas is None else estatisticas
+        with medir_requisicao('recuperacao', estatisticas):
+            async with self.admissao.vaga(prazo, estatisticas):
+                return await self.arecuperar(pergunta, estatisticas, prazo)
+
+    async def aexecutar_geracao(self, recuperacao, pergunta=None, estatisticas=None, prazo=None):
+        """Nova geração sobre uma recuperação guardada ("gerar de novo" ou outra pergunta sobre os
+        mesmos documentos): repete só contexto, Gemini e pós-processamento"""
+        prazo = prazo or self.resiliencia.novo_prazo()
+        estatisticas = {} if estatisticas is None else estatisticas
+        estatisticas['recuperacao_id'] = recuperacao.id
+        with medir_requisicao('geracao', estatisticas):
+            async with self.admissao.vaga(prazo, estatisticas):
+                return await self.agerar_resposta(recuperacao, pergunta, prazo, estatisticas)
+
+    async def aexecutar_busca_completa(self, pergunta, estatisticas=None, prazo=None, sessao=None):
+        """Executa a busca completa sem bloquear o event loop
+
+        Todas as etapas respeitam o prazo da requisição (padrão: VIVI_PRAZO_REQUISICAO);
+        falhas de Pinecone ou Gemini após as novas tentativas levantam FalhaEtapa.
+        sessao: a pergunta é um turno da conversa (ver _abusca_em_sessao).
+        """
+        if sessao is not None:
+            return await self._abusca_em_sessao(pergunta, sessao, estatisticas, prazo)
+        prazo = prazo or self.resiliencia.novo_prazo()
+        estatisticas = {} if estatisticas is None else estatisticas
+        with medir_requisicao('completa', estatisticas):
+            logger.debug("🎯 Executando busca completa: %s", pergunta)
+
+            # Respostas em cache não ocupam vaga: continuam saindo mesmo sob sobrecarga
+            resposta = await self._ado_cache_exato(pergunta, estatisticas)
+            if resposta is not None:
+                return resposta
+
+            if self.modo_coalescencia != 'pergunta':
+                return await self._apipeline_completo(pergunta, estatisticas, prazo)
+
+            async def liderar():
+                return await self._apipeline_completo(pergunta, estatisticas, prazo), estatisticas
+
+            resposta, do_lider = await self.coalescencia['completa'].executar(
+                normalizar_pergunta(pergunta), liderar, estatisticas
+            )
+            if do_lider is not estatisticas:
+                estatisticas.update({campo: do_lider[campo] for campo in ('selecao', 'faq', 'recuperacao_id')
+                                     if campo in do_lider})
+            return resposta
+
+    async def _apipeline_completo(self, pergunta, estatisticas, prazo):
+        """Embedding, busca, geração e cache de uma pergunta fora do cache exato"""
+        async with self.admissao.vaga(prazo, estatisticas):
+            faq = self._consultar_faq(pergunta)
+            if faq:
+                embedding = faq.embedding
+            else:
+                with medir('embedding', estatisticas):
+                    embedding = await self.agerar_embedding_consulta(pergunta, prazo)
+            resposta = self._do_cache_semelhante(embedding, estatisticas)
+            if resposta is not None:
+                return resposta
+
+            # 1. Documentos (cache de recuperações, FAQ ou Pinecone)
+            recuperacao = await self.arecuperar(pergunta, estatisticas, prazo, faq=faq, embedding=embedding)
+
+            # 2-4. Contexto, Gemini e cache (modo 'documentos': gerações idênticas em andamento são compartilhadas)
+            chave = self._chave_geracao(pergunta, recuperacao.documentos)
+            if chave is None:
+                final = await self.agerar_resposta(recuperacao, pergunta, prazo, estatisticas)
+            else:
+                final = await self.coalescencia['completa'].executar(
+                    chave, lambda: self.agerar_resposta(recuperacao, pergunta, prazo, estatisticas), estatisticas
+                )
+
+            logger.debug("✅ Busca completa finalizada!")
+            return final.resposta
+
+    def _chave_geracao(self, pergunta, documentos):
+        """Chave de coalescência da geração no modo 'documentos' (pergunta + IDs recuperados), ou None"""
+        if self.modo_coalescencia != 'documentos' or not documentos:
+            return None
+        ids = tuple(sorted(str(getattr(doc, 'id', i)) for i, doc in enumerate(documentos)))
+        return normalizar_pergunta(pergunta), ids
+
+    async def aexecutar_lote(self, perguntas, max_geracoes=None, max_buscas=None):
+        """Executa várias perguntas e produz cada resultado assim que fica pronto
+
+        Cache exato e FAQ são consultados primeiro; as demais perguntas recebem os
+        embeddings em uma única chamada em lote; no máximo `max_buscas` (padrão:
+        VIVI_LOTE_BUSCAS) buscas vetoriais e `max_geracoes` (padrão: VIVI_LOTE_GERACOES)
+        gerações simultâneas, para o lote não ocupar o pool de I/O do tráfego normal.
+        Cada etapa tem o próprio prazo, contado a partir da vaga, e a falha de uma
+        pergunta não interrompe as outras.
+        """
+        max_geracoes = max_geracoes or int(os.getenv("VIVI_LOTE_GERACOES", "4"))
+        max_buscas = max_buscas or int(os.getenv("VIVI_LOTE_BUSCAS", "4"))
+        geracoes = asyncio.Semaphore(max_geracoes)
+        buscas = asyncio.Semaphore(max_buscas)
+        estatisticas = [{} for _ in perguntas]
+        respostas = await self._ado_cache_exato_varios(perguntas, estatisticas)
+        faqs = [None if resposta is not None else self._consultar_faq(pergunta)
+                for pergunta, resposta in zip(perguntas, respostas)]
+        embeddings = [faq.embedding if faq else None for faq in faqs]
+
+        # Um único embedding em lote (a API aceita até EMBED_LOTE_MAX entradas por chamada)
+        pendentes = [i for i, (resposta, faq) in enumerate(zip(respostas, faqs)) if resposta is None and faq is None]
+        erro_embedding = None
+        if pendentes:
+            lote = {}
+            try:
+                with medir('embedding', lote):
+                    vetores = await self.agerar_embeddings(
+                        [perguntas[i] for i in pendentes], EMBED_CONSULTA, self.resiliencia.novo_prazo()
+                    )
+            except FalhaEtapa as e:
+                erro_embedding = e
+                vetores = [None] * len(pendentes)
+            for i, vetor in zip(pendentes, vetores):
+                embeddings[i] = vetor
+                estatisticas[i]['etapas_ms'] = dict(lote.get('etapas_ms', {}))
+            logger.debug("🧮 Lote: %d embeddings em uma chamada", len(pendentes))
+
+        tarefas = [
+            asyncio.ensure_future(self._responder_do_lote(
+                indice, pergunta, respostas[indice], faqs[indice], embeddings[indice],
+                erro_embedding, estatisticas[indice], buscas, geracoes
+            ))
+            for indice, pergunta in enumerate(perguntas)
+        ]
+        try:
+            for proxima in asyncio.as_completed(tarefas):
+                yield await proxima
+        finally:
+            # Cliente desconectou ou o consumidor parou: cancelar o que falta
+            for tarefa in tarefas:
+                tarefa.cancel()
+
+    async def _responder_do_lote(self, indice, pergunta, resposta, faq, embedding, erro_embedding,
+                                 estatisticas, buscas, geracoes):
+        """Uma pergunta do lote: cache semântico, busca e geração limitadas pelos semáforos do lote"""
+        try:
+            with medir_requisicao('lote', estatisticas):
+                if resposta is None:
+                    if embedding is None:
+                        raise FalhaEtapa(f"Embedding indisponível: {erro_embedding or 'falha na geração'}")
+                    resposta = self._do_cache_semelhante(embedding, estatisticas)
+                if resposta is None:
+                    # Os prazos da busca e da geração começam quando a vaga do lote é obtida
+                    async with buscas:
+                        prazo = self.resiliencia.novo_prazo()
+                        with medir('busca', estatisticas):
+                            documentos = await self._adocumentos_da_faq(faq, estatisticas, prazo)
+                            if documentos is None:
+                                documentos = await self.abuscar_no_pinecone(
+                                    pergunta, embedding=embedding, estatisticas=estatisticas, prazo=prazo
+                                )
+
+                    async with geracoes:
+                        resposta = await self.aprocessar_com_gemini(
+                            pergunta, documentos, self.resiliencia.novo_prazo(), estatisticas
+                        )
+
+                    with medir('pos_processamento', estatisticas):
+                        self._guardar_resposta(pergunta, embedding, documentos, resposta, estatisticas)
+        except Exception as e:
+            return {
+                'indice': indice,
+                'pergunta': pergunta,
+                'success': False,
+                'error': str(e) or e.__class__.__name__,
+                'resultado': estatisticas.get('resultado'),
+                'duracao_ms': estatisticas.get('duracao_ms')
+            }
+        return {
+            'indice': indice,
+            'pergunta': pergunta,
+            'success': True,
+            'resposta': resposta,
+            'resultado': estatisticas.get('resultado'),
+            'faq': estatisticas.get('faq', False),
+            'selecao': estatisticas.get('selecao'),
+            'etapas_ms': estatisticas.get('etapas_ms', {}),
+            'duracao_ms': estatisticas.get('duracao_ms')
+        }
+
+    def executar_lote(self, perguntas, max_geracoes=None, max_buscas=None):
+        """Versão síncrona de aexecutar_lote para scripts (fora de um event loop)
+
+        Retorna os resultados na ordem das perguntas.
+        """
+        async def coletar():
+            return [resultado async for resultado in self.aexecutar_lote(perguntas, max_geracoes, max_buscas)]
+        return sorted(asyncio.run(coletar()), key=lambda resultado: resultado['indice'])
+
+    async def aprocessar_com_gemini_stream(self, pergunta, documentos, prazo=None, estatisticas=None, resumo=None):
+        """Gera a resposta em partes; produz eventos (tipo, dados)"""
+        logger.debug("🤖 Gerando resposta em streaming com Gemini 2.5 Flash (Vivi IA)...")
+
+        if not documentos:
+            yield "texto", {"texto": RESPOSTA_SEM_DOCUMENTOS}
+            yield "referencias", {"referencias": [], "documentos": []}
+            return
+
+        montado = await self.amontar_contexto(
+            Recuperacao(pergunta=pergunta, embedding=None, documentos=documentos), pergunta, estatisticas, resumo
+        )
+        contexto, prompt = montado.contexto, montado.prompt
+
+        corretor = self.corretor.incremental()
+        separador = SeparadorReferencias()
+
+        # Só a abertura do stream pode ser repetida; depois, cada parte respeita o prazo
+        uso = None
+        async with self.geracoes.vaga(prazo, estatisticas):
+            with medir('geracao', estatisticas):
+                response = await self.resiliencia.executar(
+                    'geracao', lambda: self.prompt.modelo().generate_content_async(prompt, stream=True), prazo
+                )
+                partes = response.__aiter__()
+                while True:
+                    try:
+                        parte = await asyncio.wait_for(partes.__anext__(), prazo.restante() if prazo else None)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise PrazoEsgotado("Prazo da requisição esgotado durante a geração")
+                    uso = getattr(parte, 'usage_metadata', None) or uso
+                    try:
+                        texto = parte.text
+                    except Exception:
+                        # Partes sem texto (ex.: apenas metadados de finalização)
+                        continue
+                    corpo = separador.alimentar(corretor.alimentar(texto))
+                    if corpo:
+                        yield "texto", {"texto": corpo}
+        registrar_uso_gemini(uso, estatisticas)
+
+        corpo = separador.alimentar(corretor.finalizar())
+        restante, referencias = separador.finalizar()
+        if corpo + restante:
+            yield "texto", {"texto": corpo + restante}
+
+        self.mostrar_documentos(contexto)
+
+        yield "referencias", {
+            "referencias": referencias,
+            "documentos": [
+                {
+                    "documento_id": ctx["documento_id"],
+                    "document_title": ctx["document_title"],
+                    "relevancia": ctx["relevancia"]
+                }
+                for ctx in contexto.documentos
+            ]
+        }
+
+    async def aexecutar_busca_stream(self, pergunta, prazo=None, estatisticas=None, sessao=None):
+        """Executa a busca completa produzindo a resposta em partes"""
+        if sessao is not None:
+            async with aclosing(self._abusca_stream_em_sessao(pergunta, sessao, prazo, estatisticas)) as eventos:
+                async for evento in eventos:
+                    yield evento
+            return
+
+        prazo = prazo or self.resiliencia.novo_prazo()
+        estatisticas = {} if estatisticas is None else estatisticas
+        with medir_requisicao('stream', estatisticas):
+            logger.debug("🎯 Executando busca em streaming: %s", pergunta)
+
+            # Respostas em cache não ocupam vaga: continuam saindo mesmo sob sobrecarga
+            resposta = await self._ado_cache_exato(pergunta, estatisticas)
+            if resposta is not None:
+                for evento in self._eventos_da_resposta(resposta):
+                    yield evento
+                return
+
+            if self.modo_coalescencia == 'pergunta':
+                eventos = self.coalescencia['stream'].transmitir(
+                    normalizar_pergunta(pergunta),
+                    lambda: self._apipeline_stream(pergunta, estatisticas, prazo),
+                    estatisticas
+                )
+            else:
+                eventos = self._apipeline_stream(pergunta, estatisticas, prazo)
+            # aclosing: cliente que desconecta encerra (ou deixa de seguir) o stream na hora
+            async with aclosing(eventos):
+                async for evento, dados in eventos:
+                    if evento == "referencias":
+                        # Seguidoras não passam pelo pipeline: herdam o que a líder anotou
+                        for campo in ('selecao', 'faq', 'recuperacao_id'):
+                            if campo in dados:
+                                estatisticas.setdefault(campo, dados[campo])
+                    yield evento, dados
+
+    async def _apipeline_stream(self, pergunta, estatisticas, prazo):
+        """Embedding, busca e geração em partes de uma pergunta fora do cache exato"""
+        async with self.admissao.vaga(prazo, estatisticas):
+            faq = self._consultar_faq(pergunta)
+            if faq:
+                embedding = faq.embedding
+            else:
+                with medir('embedding', estatisticas):
+                    embedding = await self.agerar_embedding_consulta(pergunta, prazo)
+            resposta = self._do_cache_semelhante(embedding, estatisticas)
+            if resposta is not None:
+                for evento in self._eventos_da_resposta(resposta):
+                    yield evento
+                return
+
+            recuperacao = await self.arecuperar(pergunta, estatisticas, prazo, faq=faq, embedding=embedding)
+            documentos = recuperacao.documentos
+
+            # Modo 'documentos': streams de gerações idênticas em andamento são compartilhados
+            chave = self._chave_geracao(pergunta, documentos)
+            if chave is None:
+                geracao = self.aprocessar_com_gemini_stream(pergunta, documentos, prazo, estatisticas)
+            else:
+                geracao = self.coalescencia['stream'].transmitir(
+                    chave, lambda: self.aprocessar_com_gemini_stream(pergunta, documentos, prazo, estatisticas),
+                    estatisticas
+                )
+
+            corpo = []
+            referencias = []
+            async with aclosing(geracao):
+                async for evento, dados in geracao:
+                    if evento == "texto":
+                        corpo.append(dados["texto"])
+                    elif evento == "referencias":
+                        referencias = dados["referencias"]
+                        dados["selecao"] = estatisticas.get("selecao")
+                        dados["faq"] = estatisticas.get("faq", False)
+                        dados["recuperacao_id"] = recuperacao.id
+                    yield evento, dados
+
+            # Guardar no cache a resposta remontada com a seção de referências
+            with medir('pos_processamento', estatisticas):
+                resposta = ''.join(corpo).rstrip()
+                if referencias:
+                    resposta += "\n\nReferências:\n" + "\n".join(f"- {ref}" for ref in referencias)
+                self._guardar_resposta(pergunta, embedding, documentos, resposta, estatisticas)
+
+            logger.debug("✅ Busca em streaming finalizada!")
+
+    # ------------------------------------------------------------------
+    # Sessões de conversa: perguntas independentes seguem o pipeline normal
+    # (caches e coalescência); continuações usam a consulta reescrita, só os
+    # documentos novos e o resumo da conversa no lugar do histórico
+    # ------------------------------------------------------------------
+
+    def registrar_turno(self, sessao, pergunta, consulta, resposta, documentos):
+        """Guarda o turno na sessão (respostas de erro ou sem documentos não entram)"""
+        if not resposta or resposta.startswith((PREFIXO_ERRO_GEMINI, RESPOSTA_SEM_DOCUMENTOS)):
+            return
+        # A frase de abertura não diz nada sobre o assunto
+        for abertura in self.catchphrases["abertura"]:
+            if resposta.startswith(abertura):
+                resposta = resposta[len(abertura):].lstrip()
+                break
+        sessao.registrar(pergunta, consulta, resposta, documentos)
+        self.sessoes.atualizar(sessao)
+        registro = self.sessoes.registro(sessao)
+        if registro is not None:
+            # Gravação no backend compartilhado em segundo plano, no pool de I/O
+            self._submeter(self.sessoes.guardar_compartilhada, sessao.id, registro)
+
+    async def aobter_sessao(self, id_sessao=None):
+        """Sessão do ID ou, sem ID, uma nova; None se o ID é desconhecido ou expirou
+
+        Com backend compartilhado a sessão é lida dele (a conversa pode ter seguido em
+        outro worker) e a nova sessão já é gravada nele antes de responder.
+        """
+        if not id_sessao:
+            sessao = self.sessoes.criar()
+            registro = self.sessoes.registro(sessao)
+            if registro is not None:
+                await self._executar_em_thread(self.sessoes.guardar_compartilhada, sessao.id, registro)
+            return sessao
+        if self.sessoes.armazenamento is None:
+            return self.sessoes.obter(id_sessao)
+        return await self._executar_em_thread(self.sessoes.carregar_compartilhada, id_sessao)
+
+    async def aencerrar_sessao(self, id_sessao):
+        """Encerra a sessão em todos os workers; True se ela existia"""
+        if self.sessoes.armazenamento is None:
+            return self.sessoes.encerrar(id_sessao)
+        return await self._executar_em_thread(self.sessoes.encerrar, id_sessao)
+
+    def _documentos_do_turno(self, estatisticas):
+        """Documentos da recuperação usada no turno (vazio em acertos do cache de respostas)"""
+        recuperacao = self.cache_recuperacao.obter_por_id(estatisticas.get('recuperacao_id'))
+        return recuperacao.documentos if recuperacao else []
+
+    async def _arecuperar_continuacao(self, pergunta, sessao, estatisticas, prazo):
+        """Recuperação de uma continuação; retorna (Recuperacao com os documentos do prompt, resumo)
+
+        Os documentos novos têm prioridade; os já enviados só completam as vagas que sobram
+        (VIVI_SESSAO_DOCUMENTOS_CONTINUACAO), já que o resumo cobre o que foi respondido com eles.
+        """
+        consulta = sessao.reescrever(pergunta)
+        recuperacao = await self.arecuperar(consulta, estatisticas, prazo)
+        novos, vistos = sessao.separar(recuperacao.documentos)
+        documentos = (novos + vistos)[:self.sessoes.documentos_continuacao]
+        estatisticas['sessao'] = {
+            'continuacao': True,
+            'documentos_novos': min(len(novos), len(documentos)),
+            'documentos_repetidos': max(0, len(documentos) - len(novos))
+        }
+        resumo = sessao.resumo(self.sessoes.resumo_max_caracteres)
+        return Recuperacao(pergunta=consulta, embedding=None, documentos=documentos), resumo
+
+    async def _abusca_em_sessao(self, pergunta, sessao, estatisticas, prazo):
+        """Um turno da conversa pela busca completa"""
+        estatisticas = {} if estatisticas is None else estatisticas
+        if not sessao.continuacao(pergunta):
+            resposta = await self.aexecutar_busca_completa(pergunta, estatisticas, prazo)
+            self.registrar_turno(sessao, pergunta, pergunta, resposta, self._documentos_do_turno(estatisticas))
+            return resposta
+
+        prazo = prazo or self.resiliencia.novo_prazo()
+        with medir_requisicao('completa', estatisticas):
+            async with self.admissao.vaga(prazo, estatisticas):
+                recuperacao, resumo = await self._arecuperar_continuacao(pergunta, sessao, estatisticas, prazo)
+                if recuperacao.documentos:
+                    montado = await self.amontar_contexto(recuperacao, pergunta, estatisticas, resumo)
+                    geracao = await self.agerar(montado, prazo, estatisticas)
+                else:
+                    geracao = Geracao(texto=RESPOSTA_SEM_DOCUMENTOS)
+                    estatisticas['resultado'] = 'sem_documentos'
+            # Resposta da continuação depende da conversa: não vai para o cache de respostas
+            final = self.pos_processar(recuperacao, pergunta, geracao, estatisticas)
+            self.registrar_turno(sessao, pergunta, recuperacao.pergunta, final.resposta, recuperacao.documentos)
+            return final.resposta
+
+    async def _abusca_stream_em_sessao(self, pergunta, sessao, prazo, estatisticas):
+        """Um turno da conversa pela busca em streaming"""
+        estatisticas = {} if estatisticas is None else estatisticas
+        corpo = []
+        if not sessao.continuacao(pergunta):
+            async with aclosing(self.aexecutar_busca_stream(pergunta, prazo, estatisticas)) as eventos:
+                async for evento, dados in eventos:
+                    if evento == "texto":
+                        corpo.append(dados["texto"])
+                    yield evento, dados
+            self.registrar_turno(sessao, pergunta, pergunta, ''.join(corpo), self._documentos_do_turno(estatisticas))
+            return
+
+        prazo = prazo or self.resiliencia.novo_prazo()
+        with medir_requisicao('stream', estatisticas):
+            async with self.admissao.vaga(prazo, estatisticas):
+                recuperacao, resumo = await self._arecuperar_continuacao(pergunta, sessao, estatisticas, prazo)
+                if not recuperacao.documentos:
+                    estatisticas['resultado'] = 'sem_documentos'
+                geracao = self.aprocessar_com_gemini_stream(
+                    pergunta, recuperacao.documentos, prazo, estatisticas, resumo
+                )
+                async with aclosing(geracao):
+                    async for evento, dados in geracao:
+                        if evento == "texto":
+                            corpo.append(dados["texto"])
+                        elif evento == "referencias":
+                            dados["selecao"] = estatisticas.get("selecao")
+                            dados["faq"] = estatisticas.get("faq", False)
+                            dados["recuperacao_id"] = estatisticas.get("recuperacao_id")
+                        yield evento, dados
+            with medir('pos_processamento', estatisticas):
+                self.registrar_turno(sessao, pergunta, recuperacao.pergunta, ''.join(corpo), recuperacao.documentos)
+
+    def _eventos_da_resposta(self, resposta):
+        """Converte uma resposta completa (ex.: do cache) nos eventos do stream"""
+        separador = SeparadorReferencias()
+        corpo = separador.alimentar(resposta)
+        restante, referencias = separador.finalizar()
+        yield "texto", {"texto": corpo + restante}
+        yield "referencias", {"referencias": referencias, "documentos": []}
+
 if __name__ == "__main__":
     # Teste simples
+    from log_estruturado import configurar_logging
+    configurar_logging(formato="texto")
     agente = AgenteBuscaGemini()
     resposta = agente.executar_busca_completa("Como funciona o SIAPE?")
     print(resposta)
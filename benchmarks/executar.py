@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline do pipeline da Vivi IA
+Pinecone e Gemini são trocados pelos falsos de benchmarks/falsos.py (latência
+e jitter configuráveis), então nenhuma chamada sai para a rede. Mede
+latência p50/p95/p99, requisições/s e memória (pico de RSS) de:
+
+- agente: executar_busca_completa em N threads
+- api: POST /api/buscar via ASGI, N requisições simultâneas
+- stream: POST /api/buscar/stream via ASGI (corpo completo do SSE)
+
+Os resultados de referência ficam em benchmarks/base/<cenario>.json; com
+--comparar, o cenário roda com a configuração salva e falha (código de saída 1)
+se o p95 ou a vazão piorarem além da tolerância.
+
+Uso:
+    python benchmarks/executar.py --alvo api --concorrencia 16 --requisicoes 200
+    python benchmarks/executar.py --alvo api --salvar-base
+    python benchmarks/executar.py --alvo api --comparar --tolerancia 0.25
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+from concurrent.futures import ThreadPoolExecutor
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_RAIZ = os.path.dirname(DIRETORIO_BENCHMARKS)
+DIRETORIO_BASE = os.path.join(DIRETORIO_BENCHMARKS, "base")
+sys.path[:0] = [DIRETORIO_RAIZ, os.path.join(DIRETORIO_RAIZ, "frontend"), DIRETORIO_BENCHMARKS]
+
+ALVOS = ("agente", "api", "stream")
+CONFIGURACAO_PADRAO = {
+    'alvo': 'api',
+    'requisicoes': 200,
+    'concorrencia': 16,
+    'repetidas': 0.3,
+    'latencia_embed_ms': 30.0,
+    'latencia_busca_ms': 40.0,
+    'latencia_geracao_ms': 600.0,
+    'latencia_parte_ms': 15.0,
+    'jitter': 0.25,
+    'documentos': 500,
+}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def pico_rss_mb():
+    # ru_maxrss: KB no Linux, bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def gerar_perguntas(quantidade, repetidas):
+    """Perguntas distintas, com uma fração repetida (exercita os caches como em produção)"""
+    distintas = max(1, int(round(quantidade * (1 - repetidas))))
+    return [
+        f"Como atualizar o cadastro do servidor no procedimento {i % distintas} do SIAPE?"
+        for i in range(quantidade)
+    ]
+
+
+def preparar_ambiente():
+    """Configuração isolada: sem FAQ nem respostas prontas, sem cache de contexto do Gemini, caches só em memória e
+    sem limite por cliente (todas as requisições saem do mesmo IP)"""
+    os.environ['VIVI_PROMPT_MODO'] = 'sistema'
+    os.environ['VIVI_FAQ_ARQUIVO'] = ''
+    os.environ['VIVI_RESPOSTAS_PRONTAS_ARQUIVO'] = ''
+    os.environ['VIVI_CACHE_BACKEND'] = 'memoria'
+    os.environ['VIVI_EMBEDDINGS_DB'] = ''
+    os.environ['VIVI_RECUPERADOR'] = 'pinecone'
+    os.environ['VIVI_LIMITE_POR_MINUTO'] = '0'
+    os.environ.setdefault('VIVI_LOG_NIVEL', 'WARNING')
+
+
+def rodar_agente(perguntas, concorrencia):
+    from agente_busca_gemini import AgenteBuscaGemini
+
+    agente = AgenteBuscaGemini()
+
+    def uma(pergunta):
+        inicio = time.perf_counter()
+        resposta = agente.executar_busca_completa(pergunta)
+        return (time.perf_counter() - inicio) * 1000, not resposta.startswith("❌")
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(uma, perguntas))
+    return resultados, time.perf_counter() - inicio
+
+
+async def _rodar_http(perguntas, concorrencia, stream):
+    import httpx
+    import app_fastapi
+
+    if not await asyncio.to_thread(app_fastapi.inicializar_agente):
+        raise RuntimeError("agente não inicializou com os SDKs falsos")
+
+    caminho = "/api/buscar/stream" if stream else "/api/buscar"
+    limite = asyncio.Semaphore(concorrencia)
+
+    async def uma(cliente, pergunta):
+        async with limite:
+            inicio = time.perf_counter()
+            resposta = await cliente.post(caminho, json={'pergunta': pergunta})
+            ok = resposta.status_code == 200 and (not stream or "event: fim" in resposta.text)
+            return (time.perf_counter() - inicio) * 1000, ok
+
+    transporte = httpx.ASGITransport(app=app_fastapi.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60.0) as cliente:
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(uma(cliente, pergunta) for pergunta in perguntas))
+        return list(resultados), time.perf_counter() - inicio
+
+
+def executar(configuracao):
+    import falsos
+
+    preparar_ambiente()
+    falsos.instalar(
+        latencia_embed_ms=configuracao['latencia_embed_ms'],
+        latencia_busca_ms=configuracao['latencia_busca_ms'],
+        latencia_geracao_ms=configuracao['latencia_geracao_ms'],
+        latencia_parte_ms=configuracao['latencia_parte_ms'],
+        jitter=configuracao['jitter'],
+        documentos=configuracao['documentos'],
+    )
+
+    perguntas = gerar_perguntas(configuracao['requisicoes'], configuracao['repetidas'])
+    rss_inicial = pico_rss_mb()
+    if configuracao['alvo'] == 'agente':
+        resultados, duracao = rodar_agente(perguntas, configuracao['concorrencia'])
+    else:
+        resultados, duracao = asyncio.run(
+            _rodar_http(perguntas, configuracao['concorrencia'], configuracao['alvo'] == 'stream')
+        )
+
+    latencias = [ms for ms, ok in resultados if ok]
+    return {
+        'requisicoes': len(resultados),
+        'erros': sum(1 for _, ok in resultados if not ok),
+        'duracao_s': round(duracao, 3),
+        'requisicoes_por_s': round(len(resultados) / duracao, 2) if duracao else 0.0,
+        'p50_ms': round(percentil(latencias, 50), 1),
+        'p95_ms': round(percentil(latencias, 95), 1),
+        'p99_ms': round(percentil(latencias, 99), 1),
+        'rss_inicial_mb': round(rss_inicial, 1),
+        'rss_pico_mb': round(pico_rss_mb(), 1),
+    }
+
+
+def comparar(base, atual, tolerancia):
+    """Lista de regressões do resultado atual em relação à referência"""
+    regressoes = []
+    for metrica in ('p50_ms', 'p95_ms', 'p99_ms'):
+        limite = base[metrica] * (1 + tolerancia)
+        if atual[metrica] > limite:
+            regressoes.append(f"{metrica}: {atual[metrica]:.1f} > {limite:.1f} (base {base[metrica]:.1f})")
+    limite = base['requisicoes_por_s'] * (1 - tolerancia)
+    if atual['requisicoes_por_s'] < limite:
+        regressoes.append(
+            f"requisicoes_por_s: {atual['requisicoes_por_s']:.2f} < {limite:.2f} (base {base['requisicoes_por_s']:.2f})"
+        )
+    limite = base['rss_pico_mb'] * (1 + tolerancia)
+    if atual['rss_pico_mb'] > limite:
+        regressoes.append(f"rss_pico_mb: {atual['rss_pico_mb']:.1f} > {limite:.1f} (base {base['rss_pico_mb']:.1f})")
+    if atual['erros'] > base['erros']:
+        regressoes.append(f"erros: {atual['erros']} (base {base['erros']})")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline da Vivi IA (SDKs falsos)")
+    parser.add_argument('--alvo', choices=ALVOS, default=CONFIGURACAO_PADRAO['alvo'])
+    parser.add_argument('--cenario', help="Nome do arquivo de referência em benchmarks/base (padrão: o alvo)")
+    parser.add_argument('--requisicoes', type=int, default=CONFIGURACAO_PADRAO['requisicoes'])
+    parser.add_argument('--concorrencia', type=int, default=CONFIGURACAO_PADRAO['concorrencia'])
+    parser.add_argument('--repetidas', type=float, default=CONFIGURACAO_PADRAO['repetidas'],
+                        help="Fração de perguntas repetidas (acertos de cache)")
+    parser.add_argument('--latencia-embed-ms', type=float, default=CONFIGURACAO_PADRAO['latencia_embed_ms'])
+    parser.add_argument('--latencia-busca-ms', type=float, default=CONFIGURACAO_PADRAO['latencia_busca_ms'])
+    parser.add_argument('--latencia-geracao-ms', type=float, default=CONFIGURACAO_PADRAO['latencia_geracao_ms'])
+    parser.add_argument('--latencia-parte-ms', type=float, default=CONFIGURACAO_PADRAO['latencia_parte_ms'],
+                        help="Intervalo entre as partes do stream do Gemini falso")
+    parser.add_argument('--jitter', type=float, default=CONFIGURACAO_PADRAO['jitter'],
+                        help="Variação máxima, como fração da latência média")
+    parser.add_argument('--documentos', type=int, default=CONFIGURACAO_PADRAO['documentos'])
+    parser.add_argument('--salvar-base', action='store_true', help="Grava o resultado como referência do cenário")
+    parser.add_argument('--comparar', action='store_true',
+                        help="Roda com a configuração da referência e falha se houver regressão")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Piora relativa aceita na comparação (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    cenario = args.cenario or args.alvo
+    caminho_base = os.path.join(DIRETORIO_BASE, f"{cenario}.json")
+    base = None
+    if args.comparar:
+        if not os.path.exists(caminho_base):
+            print(f"❌ Referência {caminho_base} não encontrada (gere com --salvar-base)")
+            return 1
+        with open(caminho_base, encoding='utf-8') as f:
+            base = json.load(f)
+        configuracao = base['configuracao']
+    else:
+        configuracao = {chave: getattr(args, chave) for chave in CONFIGURACAO_PADRAO}
+
+    print(f"🏁 Cenário {cenario}: {json.dumps(configuracao, ensure_ascii=False)}")
+    resultado = executar(configuracao)
+    print(
+        f"⏱️ p50 {resultado['p50_ms']:.1f} ms | p95 {resultado['p95_ms']:.1f} ms | p99 {resultado['p99_ms']:.1f} ms"
+    )
+    print(
+        f"🚀 {resultado['requisicoes_por_s']:.2f} req/s ({resultado['requisicoes']} em {resultado['duracao_s']:.2f} s, "
+        f"{resultado['erros']} erros) | 💾 pico RSS {resultado['rss_pico_mb']:.1f} MB"
+    )
+
+    if args.salvar_base:
+        os.makedirs(DIRETORIO_BASE, exist_ok=True)
+        with open(caminho_base, 'w', encoding='utf-8') as f:
+            json.dump({
+                'configuracao': configuracao,
+                'resultado': resultado,
+                'ambiente': {'python': platform.python_version(), 'plataforma': platform.platform()},
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"💾 Referência salva em {caminho_base}")
+
+    if base is not None:
+        regressoes = comparar(base['resultado'], resultado, args.tolerancia)
+        for regressao in regressoes:
+            print(f"❌ Regressão em {regressao}")
+        if regressoes:
+            return 1
+        print(f"✅ Sem regressões em relação a {caminho_base} (tolerância {args.tolerancia:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Substitutos locais do Pinecone e do Gemini para os benchmarks da Vivi IA
+Mesma interface usada pelo agente (inference.embed, Index.query/fetch/
+describe_index_stats, GenerativeModel.generate_content[_async]), com latência
+e jitter configuráveis e sem nenhuma chamada de rede.
+"""
+
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+
+DIMENSAO = 1024
+
+
+class Latencia:
+    """Atraso de uma chamada falsa: media_ms ± jitter_ms (uniforme)"""
+
+    def __init__(self, media_ms=0.0, jitter_ms=0.0, semente=None):
+        self.media_ms = media_ms
+        self.jitter_ms = jitter_ms
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+
+    def segundos(self):
+        with self._lock:
+            variacao = self._aleatorio.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.media_ms + variacao) / 1000
+
+    def esperar(self):
+        atraso = self.segundos()
+        if atraso:
+            time.sleep(atraso)
+
+    async def aesperar(self):
+        atraso = self.segundos()
+        if atraso:
+            await asyncio.sleep(atraso)
+
+
+def _vetor(texto):
+    """Vetor determinístico (mesmo texto → mesmo vetor)"""
+    semente = int.from_bytes(hashlib.sha256(texto.encode('utf-8')).digest()[:8], 'big')
+    aleatorio = random.Random(semente)
+    return [aleatorio.uniform(-1.0, 1.0) for _ in range(DIMENSAO)]
+
+
+def criar_corpus(quantidade=500, titulos=40):
+    """Documentos sintéticos com o esquema de metadados da ingestão"""
+    return [
+        SimpleNamespace(
+            id=f"doc-{i:05d}",
+            score=0.0,
+            metadata={
+                'text': (
+                    f"Trecho {i} do manual do SIAPE sobre o procedimento {i % 37} de gestão de pessoas. "
+                    f"O cadastro do servidor deve ser atualizado no módulo {i % 11} antes da folha de pagamento."
+                ),
+                'document_title': f"Manual SIAPE {i % titulos:02d}",
+            }
+        )
+        for i in range(quantidade)
+    ]
+
+
+class IndiceFalso:
+    def __init__(self, corpus, latencia):
+        self.corpus = corpus
+        self._por_id = {doc.id: doc for doc in corpus}
+        self.latencia = latencia
+
+    def query(self, vector, top_k=10, include_metadata=True, namespace="", **kwargs):
+        self.latencia.esperar()
+        # Documentos "mais próximos" escolhidos a partir do próprio vetor
+        aleatorio = random.Random(int(abs(vector[0]) * 1e9) ^ int(abs(vector[1]) * 1e9))
+        escolhidos = aleatorio.sample(self.corpus, min(top_k, len(self.corpus)))
+        matches = [
+            SimpleNamespace(id=doc.id, score=round(0.92 - 0.03 * posicao, 4), metadata=doc.metadata)
+            for posicao, doc in enumerate(escolhidos)
+        ]
+        return SimpleNamespace(matches=matches)
+
+    def fetch(self, ids, namespace=""):
+        self.latencia.esperar()
+        return SimpleNamespace(vectors={i: self._por_id[i] for i in ids if i in self._por_id})
+
+    def describe_index_stats(self):
+        return {'total_vector_count': len(self.corpus), 'namespaces': {'': {'vector_count': len(self.corpus)}}}
+
+
+class InferenciaFalsa:
+    def __init__(self, latencia):
+        self.latencia = latencia
+
+    def embed(self, model, inputs, parameters=None):
+        self.latencia.esperar()
+        return SimpleNamespace(data=[{'values': _vetor(texto)} for texto in inputs])
+
+
+class PineconeFalso:
+    """Substituto de pinecone.Pinecone"""
+
+    def __init__(self, corpus, latencia_embed, latencia_busca):
+        self._indice = IndiceFalso(corpus, latencia_busca)
+        self.inference = InferenciaFalsa(latencia_embed)
+
+    def Index(self, nome=None, **kwargs):
+        return self._indice
+
+
+RESPOSTA_PADRAO = (
+    "Vamos ao que interessa... O cadastro do servidor deve ser atualizado no SIAPE "
+    "antes do fechamento da folha, conforme o procedimento descrito nos manuais.\n\n"
+    "Referências:\n- Manual SIAPE 01\n- Manual SIAPE 02"
+)
+
+
+class _RespostaFalsa:
+    def __init__(self, texto):
+        self.text = texto
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=1200, candidates_token_count=len(texto) // 4, cached_content_token_count=0
+        )
+
+
+class ModeloFalso:
+    """Substituto de genai.GenerativeModel; a latência é a do primeiro token + por parte do stream"""
+
+    def __init__(self, latencia, latencia_parte, model_name='gemini-falso', **kwargs):
+        self.model_name = model_name
+        self.latencia = latencia
+        self.latencia_parte = latencia_parte
+
+    def generate_content(self, prompt, **kwargs):
+        self.latencia.esperar()
+        return _RespostaFalsa(RESPOSTA_PADRAO)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        await self.latencia.aesperar()
+        if not stream:
+            return _RespostaFalsa(RESPOSTA_PADRAO)
+
+        partes = [RESPOSTA_PADRAO[i:i + 40] for i in range(0, len(RESPOSTA_PADRAO), 40)]
+        latencia_parte = self.latencia_parte
+
+        class _Stream:
+            def __aiter__(self):
+                return self._gerar()
+
+            async def _gerar(self):
+                for parte in partes:
+                    await latencia_parte.aesperar()
+                    yield _RespostaFalsa(parte)
+
+        return _Stream()
+
+
+def instalar(latencia_embed_ms=30, latencia_busca_ms=40, latencia_geracao_ms=600, latencia_parte_ms=15,
+             jitter=0.25, documentos=500, semente=42):
+    """Troca os SDKs do agente pelos falsos (antes de criar o AgenteBuscaGemini)
+
+    jitter é a fração da latência média usada como variação máxima.
+    """
+    from importacao_tardia import genai, pinecone
+
+    def latencia(media_ms, deslocamento):
+        return Latencia(media_ms, media_ms * jitter, semente + deslocamento)
+
+    corpus = criar_corpus(documentos)
+    embed, busca = latencia(latencia_embed_ms, 1), latencia(latencia_busca_ms, 2)
+    geracao, parte = latencia(latencia_geracao_ms, 3), latencia(latencia_parte_ms, 4)
+
+    def criar_modelo(model_name='gemini-falso', **kwargs):
+        return ModeloFalso(geracao, parte, model_name=model_name)
+
+    def cache_indisponivel(**kwargs):
+        raise RuntimeError("cache de contexto indisponível no Gemini falso")
+
+    pinecone.substituir(SimpleNamespace(Pinecone=lambda api_key=None, **kwargs: PineconeFalso(corpus, embed, busca)))
+    genai.substituir(SimpleNamespace(
+        configure=lambda **kwargs: None,
+        GenerativeModel=criar_modelo,
+        get_model=lambda nome: SimpleNamespace(name=nome),
+        caching=SimpleNamespace(CachedContent=SimpleNamespace(create=cache_indisponivel)),
+    ))
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Armazenamento compartilhado dos caches da Vivi IA entre workers
+Chave → bytes, com TTL opcional, e contadores (versão do cache de respostas).
+Guarda também as sessões de conversa, para qualquer worker continuar a mesma conversa,
+e os baldes de tokens do limite por cliente, para o limite valer para o conjunto dos workers.
+
+- memoria: só o processo atual (padrão; também serve de substituto do Redis em testes)
+- sqlite: arquivo local compartilhado pelos workers da mesma máquina
+- redis: servidor Redis (requer o pacote 'redis')
+
+Configuração: VIVI_CACHE_BACKEND (memoria | sqlite | redis), VIVI_CACHE_SQLITE, VIVI_REDIS_URL
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("vivi.cache_compartilhado")
+
+BACKENDS = ("memoria", "sqlite", "redis")
+
+
+# Balde de tokens atômico no Redis (relógio do próprio servidor); retorna a espera em segundos
+SCRIPT_BALDE = """
+local capacidade = tonumber(ARGV[1])
+local taxa = tonumber(ARGV[2])
+local custo = tonumber(ARGV[3])
+local relogio = redis.call('TIME')
+local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+local dados = redis.call('HMGET', KEYS[1], 'tokens', 'atualizado')
+local tokens = tonumber(dados[1]) or capacidade
+local atualizado = tonumber(dados[2]) or agora
+tokens = math.min(capacidade, tokens + math.max(0, agora - atualizado) * taxa)
+local espera = 0
+if tokens >= custo then
+    tokens = tokens - custo
+else
+    espera = (custo - tokens) / taxa
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'atualizado', tostring(agora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidade / taxa) + 1)
+return tostring(espera)
+"""
+
+
+def _consumir(tokens, atualizado, agora, capacidade, taxa, custo):
+    """Balde de tokens: (tokens restantes, segundos até haver `custo` tokens; 0 se pode seguir)"""
+    tokens = min(capacidade, tokens + max(0.0, agora - atualizado) * taxa)
+    if tokens >= custo:
+        return tokens - custo, 0.0
+    return tokens, (custo - tokens) / taxa
+
+
+class ArmazenamentoMemoria:
+    """Dicionário em memória com a mesma interface dos backends compartilhados"""
+
+    nome = "memoria"
+
+    def __init__(self):
+        self._valores = {}
+        self._contadores = {}
+        self._baldes = {}
+        self._lock = threading.Lock()
+
+    def obter_varios(self, chaves):
+        agora = time.time()
+        encontrados = {}
+        with self._lock:
+            for chave in chaves:
+                registro = self._valores.get(chave)
+                if registro is None:
+                    continue
+                valor, expira_em = registro
+                if expira_em is not None and expira_em <= agora:
+                    del self._valores[chave]
+                    continue
+                encontrados[chave] = valor
+        return encontrados
+
+    def guardar_varios(self, valores, ttl=None):
+        expira_em = time.time() + ttl if ttl else None
+        with self._lock:
+            for chave, valor in valores.items():
+                self._valores[chave] = (bytes(valor), expira_em)
+
+    def remover(self, chaves):
+        with self._lock:
+            for chave in chaves:
+                self._valores.pop(chave, None)
+
+    def incrementar(self, chave):
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + 1
+            return self._contadores[chave]
+
+    def contador(self, chave):
+        with self._lock:
+            return self._contadores.get(chave, 0)
+
+    def consumir_balde(self, chave, capacidade, taxa, custo=1.0):
+        agora = time.time()
+        with self._lock:
+            tokens, atualizado = self._baldes.get(chave, (capacidade, agora))
+            tokens, espera = _consumir(tokens, atualizado, agora, capacidade, taxa, custo)
+            self._baldes[chave] = (tokens, agora)
+        return espera
+
+    def descricao(self):
+        return self.nome
+
+
+class ArmazenamentoSQLite:
+    """Arquivo SQLite em modo WAL; vários processos leem e gravam ao mesmo tempo"""
+
+    nome = "sqlite"
+    # A cada N gravações, apaga as entradas expiradas
+    GRAVACOES_ENTRE_LIMPEZAS = 500
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._gravacoes = 0
+        self._db = sqlite3.connect(caminho, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS valores (chave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira_em REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS contadores (chave TEXT PRIMARY KEY, valor INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS baldes (chave TEXT PRIMARY KEY, tokens REAL NOT NULL, atualizado REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._consumos = 0
+
+    def obter_varios(self, chaves):
+        if not chaves:
+            return {}
+        marcadores = ','.join('?' * len(chaves))
+        with self._lock:
+            linhas = self._db.execute(
+                f"SELECT chave, valor FROM valores WHERE chave IN ({marcadores}) "
+                "AND (expira_em IS NULL OR expira_em > ?)",
+                [*chaves, time.time()]
+            ).fetchall()
+        return {chave: bytes(valor) for chave, valor in linhas}
+
+    def guardar_varios(self, valores, ttl=None):
+        if not valores:
+            return
+        expira_em = time.time() + ttl if ttl else None
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO valores (chave, valor, expira_em) VALUES (?, ?, ?)",
+                [(chave, bytes(valor), expira_em) for chave, valor in valores.items()]
+            )
+            self._gravacoes += 1
+            if self._gravacoes % self.GRAVACOES_ENTRE_LIMPEZAS == 0:
+                self._db.execute("DELETE FROM valores WHERE expira_em IS NOT NULL AND expira_em <= ?", (time.time(),))
+            self._db.commit()
+
+    def remover(self, chaves):
+        if not chaves:
+            return
+        with self._lock:
+            self._db.executemany("DELETE FROM valores WHERE chave = ?", [(chave,) for chave in chaves])
+            self._db.commit()
+
+    def incrementar(self, chave):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO contadores (chave, valor) VALUES (?, 1) "
+                "ON CONFLICT(chave) DO UPDATE SET valor = valor + 1",
+                (chave,)
+            )
+            valor = self._db.execute("SELECT valor FROM contadores WHERE chave = ?", (chave,)).fetchone()[0]
+            self._db.commit()
+        return valor
+
+    def contador(self, chave):
+        with self._lock:
+            linha = self._db.execute("SELECT valor FROM contadores WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else 0
+
+    def consumir_balde(self, chave, capacidade, taxa, custo=1.0):
+        with self._lock:
+            # BEGIN IMMEDIATE: leitura e gravação do balde sem outro processo no meio
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                agora = time.time()
+                linha = self._db.execute("SELECT tokens, atualizado FROM baldes WHERE chave = ?", (chave,)).fetchone()
+                tokens, atualizado = linha if linha else (capacidade, agora)
+                tokens, espera = _consumir(tokens, atualizado, agora, capacidade, taxa, custo)
+                self._db.execute("INSERT OR REPLACE INTO baldes (chave, tokens, atualizado) VALUES (?, ?, ?)",
+                                 (chave, tokens, agora))
+                self._consumos += 1
+                if self._consumos % self.GRAVACOES_ENTRE_LIMPEZAS == 0:
+                    # Balde parado por mais que o tempo de encher equivale a um balde novo
+                    self._db.execute("DELETE FROM baldes WHERE atualizado <= ?", (agora - capacidade / taxa,))
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return espera
+
+    def descricao(self):
+        return f"sqlite:{self.caminho}"
+
+
+class ArmazenamentoRedis:
+    """Servidor Redis compartilhado por todos os workers (e máquinas)"""
+
+    nome = "redis"
+
+    def __init__(self, url, prefixo="vivi:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("VIVI_CACHE_BACKEND=redis requer o pacote 'redis' (pip install redis)") from e
+        self.url = url
+        self.prefixo = prefixo
+        self._cliente = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self._script_balde = self._cliente.register_script(SCRIPT_BALDE)
+
+    def obter_varios(self, chaves):
+        if not chaves:
+            return {}
+        valores = self._cliente.mget([self.prefixo + chave for chave in chaves])
+        return {chave: valor for chave, valor in zip(chaves, valores) if valor is not None}
+
+    def guardar_varios(self, valores, ttl=None):
+        if not valores:
+            return
+        pipeline = self._cliente.pipeline(transaction=False)
+        for chave, valor in valores.items():
+            pipeline.set(self.prefixo + chave, bytes(valor), ex=int(ttl) if ttl else None)
+        pipeline.execute()
+
+    def remover(self, chaves):
+        if chaves:
+            self._cliente.delete(*[self.prefixo + chave for chave in chaves])
+
+    def incrementar(self, chave):
+        return int(self._cliente.incr(self.prefixo + chave))
+
+    def contador(self, chave):
+        valor = self._cliente.get(self.prefixo + chave)
+        return int(valor) if valor is not None else 0
+
+    def consumir_balde(self, chave, capacidade, taxa, custo=1.0):
+        espera = self._script_balde(keys=[self.prefixo + chave], args=[capacidade, taxa, custo])
+        return float(espera)
+
+    def descricao(self):
+        return f"redis:{self.url.split('@')[-1]}"
+
+
+def criar_armazenamento(backend=None):
+    """Backend configurado em VIVI_CACHE_BACKEND, ou None (caches só em memória no processo)"""
+    backend = (backend or os.getenv("VIVI_CACHE_BACKEND", "memoria")).lower()
+    if backend == "sqlite":
+        caminho = os.getenv("VIVI_CACHE_SQLITE", "vivi_cache.db")
+        logger.info(f"🗄️ Caches compartilhados em SQLite: {caminho}")
+        return ArmazenamentoSQLite(caminho)
+    if backend == "redis":
+        url = os.getenv("VIVI_REDIS_URL", "redis://localhost:6379/0")
+        armazenamento = ArmazenamentoRedis(url)
+        logger.info(f"🗄️ Caches compartilhados em {armazenamento.descricao()}")
+        return armazenamento
+    if backend != "memoria":
+        logger.warning(f"⚠️ VIVI_CACHE_BACKEND desconhecido ({backend}), usando memória")
+    return None
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cache de embeddings da Vivi IA
+Chave: hash do conteúdo (modelo + tipo de entrada + texto)
+Memória (LRU limitado) + armazenamento compartilhado opcional (SQLite ou Redis),
+visto por todos os workers
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_compartilhado import ArmazenamentoSQLite
+
+logger = logging.getLogger("vivi.cache_embeddings")
+
+PREFIXO_CHAVE = "emb:"
+
+
+class CacheEmbeddings:
+    """Cache de vetores por hash de conteúdo, com armazenamento compartilhado opcional"""
+
+    def __init__(self, caminho_sqlite=None, max_entradas=None, armazenamento=None):
+        self.max_entradas = max_entradas or int(os.getenv("VIVI_EMBEDDINGS_CACHE_MAX", "10000"))
+        self.caminho_sqlite = caminho_sqlite if caminho_sqlite is not None else os.getenv("VIVI_EMBEDDINGS_DB", "")
+
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        # VIVI_EMBEDDINGS_DB continua valendo quando não há backend compartilhado configurado
+        if armazenamento is None and self.caminho_sqlite:
+            armazenamento = ArmazenamentoSQLite(self.caminho_sqlite)
+        self.armazenamento = armazenamento
+
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+
+    @staticmethod
+    def chave(texto, modelo, input_type):
+        """Hash do conteúdo que identifica um embedding"""
+        conteudo = f"{modelo}\x00{input_type}\x00{texto}".encode('utf-8')
+        return hashlib.sha256(conteudo).hexdigest()
+
+    def _guardar_memoria(self, chave, vetor):
+        self._memoria[chave] = vetor
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_entradas:
+            self._memoria.popitem(last=False)
+
+    def obter_varios(self, chaves):
+        """Retorna {chave: vetor} para as chaves encontradas (memória e depois compartilhado)"""
+        encontrados, ausentes = self.obter_memoria(chaves)
+        encontrados.update(self.obter_compartilhados(ausentes))
+        return encontrados
+
+    def obter_memoria(self, chaves):
+        """Retorna ({chave: vetor} encontrados na memória deste processo, chaves ausentes); não bloqueia"""
+        encontrados = {}
+        ausentes = []
+        with self._lock:
+            for chave in chaves:
+                vetor = self._memoria.get(chave)
+                if vetor is not None:
+                    self._memoria.move_to_end(chave)
+                    encontrados[chave] = vetor
+                    self.acertos_memoria += 1
+                else:
+                    ausentes.append(chave)
+        return encontrados, ausentes
+
+    def obter_compartilhados(self, chaves):
+        """Retorna {chave: vetor} das chaves ausentes da memória encontradas no armazenamento compartilhado
+
+        Bloqueante quando há backend: no event loop, chamar em uma thread.
+        """
+        # Consulta ao backend fora do lock: outras threads seguem usando a memória
+        blobs = {}
+        if chaves and self.armazenamento is not None:
+            try:
+                blobs = self.armazenamento.obter_varios([PREFIXO_CHAVE + chave for chave in chaves])
+            except Exception as e:
+                logger.warning(f"⚠️ Cache compartilhado de embeddings indisponível: {e}")
+
+        encontrados = {}
+        with self._lock:
+            for chave in chaves:
+                blob = blobs.get(PREFIXO_CHAVE + chave)
+                if blob is None:
+                    continue
+                vetor = np.frombuffer(blob, dtype=np.float32)
+                self._guardar_memoria(chave, vetor)
+                encontrados[chave] = vetor
+                self.acertos_disco += 1
+            self.falhas += len(set(chaves) - encontrados.keys())
+        return encontrados
+
+    def guardar_varios(self, vetores):
+        """Guarda {chave: vetor} na memória e, se configurado, no armazenamento compartilhado"""
+        convertidos = {chave: np.asarray(vetor, dtype=np.float32) for chave, vetor in vetores.items()}
+        with self._lock:
+            for chave, vetor in convertidos.items():
+                self._guardar_memoria(chave, vetor)
+        if self.armazenamento is not None and convertidos:
+            try:
+                self.armazenamento.guardar_varios(
+                    {PREFIXO_CHAVE + chave: vetor.tobytes() for chave, vetor in convertidos.items()}
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao gravar no cache compartilhado de embeddings: {e}")
+
+    def estatisticas(self):
+        """Contadores e ocupação do cache"""
+        with self._lock:
+            return {
+                'entradas_memoria': len(self._memoria),
+                'max_entradas': self.max_entradas,
+                'persistencia': self.armazenamento.descricao() if self.armazenamento is not None else None,
+                'acertos_memoria': self.acertos_memoria,
+                'acertos_disco': self.acertos_disco,
+                'falhas': self.falhas
+            }
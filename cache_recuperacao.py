@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cache de recuperações da Vivi IA
+Pergunta normalizada → Recuperacao (embedding + documentos selecionados), com
+TTL e LRU limitado. Também localiza uma recuperação pelo ID, para as etapas
+chamadas pela API (gerar de novo, pergunta de continuação).
+Em memória ficam os objetos do recuperador; com um armazenamento compartilhado
+(SQLite ou Redis), o ID também vale nos outros workers: lá ficam os IDs e scores
+dos documentos e o embedding, e o conteúdo é buscado de novo pelos IDs.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from cache_semantico import normalizar_pergunta
+
+logger = logging.getLogger("vivi.cache_recuperacao")
+
+# Chaves das recuperações no armazenamento compartilhado
+PREFIXO_RECUPERACAO = "recup:"
+
+
+class CacheRecuperacao:
+    def __init__(self, max_entradas=None, ttl_segundos=None, armazenamento=None):
+        self.max_entradas = max_entradas or int(os.getenv("VIVI_RECUPERACAO_MAX", "1000"))
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else float(os.getenv("VIVI_RECUPERACAO_TTL", "600"))
+        # Backend compartilhado pelos workers (None: IDs válidos só neste processo)
+        self.armazenamento = armazenamento
+        # id → Recuperacao (ordem de uso) e pergunta normalizada → id
+        self._por_id = OrderedDict()
+        self._por_pergunta = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def _expirada(self, recuperacao, agora):
+        return self.ttl_segundos > 0 and agora - recuperacao.criada_em > self.ttl_segundos
+
+    def _remover(self, id_recuperacao):
+        recuperacao = self._por_id.pop(id_recuperacao, None)
+        if recuperacao is not None:
+            chave = normalizar_pergunta(recuperacao.pergunta)
+            if self._por_pergunta.get(chave) == id_recuperacao:
+                del self._por_pergunta[chave]
+
+    def _valida(self, id_recuperacao):
+        recuperacao = self._por_id.get(id_recuperacao)
+        if recuperacao is None:
+            return None
+        if self._expirada(recuperacao, time.time()):
+            self._remover(id_recuperacao)
+            return None
+        self._por_id.move_to_end(id_recuperacao)
+        return recuperacao
+
+    def obter(self, pergunta):
+        """Recuperação ainda válida da mesma pergunta (normalizada), ou None"""
+        with self._lock:
+            id_recuperacao = self._por_pergunta.get(normalizar_pergunta(pergunta))
+            recuperacao = self._valida(id_recuperacao) if id_recuperacao else None
+            if recuperacao is None:
+                self.falhas += 1
+            else:
+                self.acertos += 1
+            return recuperacao
+
+    def obter_por_id(self, id_recuperacao):
+        with self._lock:
+            return self._valida(id_recuperacao)
+
+    def guardar(self, recuperacao):
+        chave = normalizar_pergunta(recuperacao.pergunta)
+        with self._lock:
+            anterior = self._por_pergunta.get(chave)
+            if anterior is not None:
+                self._remover(anterior)
+            self._por_id[recuperacao.id] = recuperacao
+            self._por_pergunta[chave] = recuperacao.id
+            while len(self._por_id) > self.max_entradas:
+                self._remover(next(iter(self._por_id)))
+
+    def guardar_compartilhada(self, recuperacao):
+        """Grava a recuperação no armazenamento compartilhado (expira junto com o TTL)
+
+        Bloqueante: no event loop, chamar em uma thread.
+        """
+        if self.armazenamento is None:
+            return
+        try:
+            self.armazenamento.guardar_varios({PREFIXO_RECUPERACAO + recuperacao.id: recuperacao.como_registro()},
+                                              ttl=self.ttl_segundos or None)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar a recuperação no armazenamento compartilhado: {e}")
+
+    def carregar_compartilhada(self, id_recuperacao):
+        """Registro (dict de Recuperacao.como_registro) gravado por qualquer worker, ou None
+
+        Bloqueante: no event loop, chamar em uma thread.
+        """
+        if self.armazenamento is None or not id_recuperacao:
+            return None
+        chave = PREFIXO_RECUPERACAO + id_recuperacao
+        try:
+            blob = self.armazenamento.obter_varios([chave]).get(chave)
+        except Exception as e:
+            logger.warning(f"⚠️ Recuperações compartilhadas indisponíveis: {e}")
+            return None
+        if blob is None:
+            return None
+        registro = json.loads(blob)
+        if self.ttl_segundos > 0 and time.time() - registro['criada_em'] > self.ttl_segundos:
+            return None
+        return registro
+
+    def limpar(self):
+        with self._lock:
+            self._por_id.clear()
+            self._por_pergunta.clear()
+        logger.info("🧹 Cache de recuperações limpo")
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._por_id),
+                'max_entradas': self.max_entradas,
+                'ttl_segundos': self.ttl_segundos,
+                'compartilhadas': self.armazenamento.descricao() if self.armazenamento is not None else None,
+                'acertos': self.acertos,
+                'falhas': self.falhas
+            }
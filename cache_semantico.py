@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Cache semântico de respostas da Vivi IA
+Pergunta normalizada → resposta (acerto exato)
+Embedding da pergunta → resposta de uma pergunta quase idêntica (acerto semântico)
+Eviction por LRU + TTL, com limite de entradas e de memória
+Com um armazenamento compartilhado (SQLite ou Redis), respostas geradas em um
+worker servem acertos exatos nos demais, e a invalidação vale para todos.
+"""
+
+import os
+import json
+import base64
+import logging
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("vivi.cache_semantico")
+
+# Chaves no armazenamento compartilhado
+CHAVE_VERSAO = "resp:versao"
+PREFIXO_RESPOSTA = "resp:"
+
+
+def normalizar_pergunta(pergunta):
+    """Normaliza a pergunta para comparação exata (caixa, acentos, pontuação, espaços)"""
+    texto = unicodedata.normalize('NFKD', pergunta.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    return ' '.join(texto.split())
+
+
+class _Entrada:
+    __slots__ = ('pergunta', 'vetor', 'resposta', 'criada_em', 'tamanho')
+
+    def __init__(self, pergunta, vetor, resposta):
+        self.pergunta = pergunta
+        self.vetor = vetor
+        self.resposta = resposta
+        self.criada_em = time.monotonic()
+        # Estimativa do espaço ocupado pela entrada
+        self.tamanho = (
+            len(pergunta.encode('utf-8'))
+            + len(resposta.encode('utf-8'))
+            + (vetor.nbytes if vetor is not None else 0)
+            + 200
+        )
+
+
+class CacheSemantico:
+    """Cache de respostas com busca exata e por similaridade de embedding"""
+
+    def __init__(self, max_entradas=None, ttl_segundos=None, max_bytes=None, distancia_maxima=None,
+                 armazenamento=None, intervalo_versao=None):
+        self.max_entradas = max_entradas or int(os.getenv("VIVI_CACHE_MAX_ENTRADAS", "1000"))
+        self.ttl_segundos = ttl_segundos or float(os.getenv("VIVI_CACHE_TTL", "86400"))
+        self.max_bytes = max_bytes or int(float(os.getenv("VIVI_CACHE_MAX_MB", "64")) * 1024 * 1024)
+        self.distancia_maxima = (
+            distancia_maxima if distancia_maxima is not None
+            else float(os.getenv("VIVI_CACHE_DISTANCIA_MAX", "0.03"))
+        )
+
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Matriz de embeddings normalizados, reconstruída sob demanda
+        self._matriz = None
+        self._chaves_matriz = []
+
+        # Backend compartilhado entre workers e de quanto em quanto tempo conferir a versão global
+        self.armazenamento = armazenamento
+        self.intervalo_versao = intervalo_versao if intervalo_versao is not None else float(
+            os.getenv("VIVI_CACHE_INTERVALO_VERSAO", "5")
+        )
+        self._versao_conferida_em = 0.0
+
+        self.versao = 0
+        self.acertos_compartilhados = 0
+        self.acertos_exatos = 0
+        self.acertos_semelhantes = 0
+        self.falhas = 0
+        self.expiradas = 0
+        self.removidas = 0
+
+    def _expirada(self, entrada, agora):
+        return agora - entrada.criada_em > self.ttl_segundos
+
+    def _remover(self, chave):
+        entrada = self._entradas.pop(chave)
+        self._bytes -= entrada.tamanho
+        if entrada.vetor is not None:
+            self._matriz = None
+
+    def _chave_compartilhada(self, chave):
+        return f"{PREFIXO_RESPOSTA}{self.versao}:{chave}"
+
+    def sincronizacao_pendente(self):
+        """True quando está na hora de conferir a versão global no armazenamento compartilhado"""
+        return (self.armazenamento is not None
+                and time.monotonic() - self._versao_conferida_em >= self.intervalo_versao)
+
+    def sincronizar_versao(self):
+        """Adota a versão global (invalidação feita por outro worker) no máximo a cada intervalo
+
+        Bloqueante (consulta o backend): no event loop, chamar em uma thread.
+        """
+        if not self.sincronizacao_pendente():
+            return
+        self._versao_conferida_em = time.monotonic()
+        try:
+            versao = self.armazenamento.contador(CHAVE_VERSAO)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache compartilhado de respostas indisponível: {e}")
+            return
+        with self._lock:
+            if versao != self.versao:
+                self._limpar()
+                self.versao = versao
+
+    def obter_compartilhada(self, pergunta):
+        """Resposta gravada por outro worker, copiada para a memória local, ou None
+
+        Bloqueante (consulta o backend): no event loop, chamar em uma thread.
+        """
+        if self.armazenamento is None:
+            return None
+        chave = normalizar_pergunta(pergunta)
+        chave_compartilhada = self._chave_compartilhada(chave)
+        try:
+            blob = self.armazenamento.obter_varios([chave_compartilhada]).get(chave_compartilhada)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache compartilhado de respostas indisponível: {e}")
+            return None
+        if blob is None:
+            return None
+        registro = json.loads(blob)
+        vetor = None
+        if registro.get('vetor'):
+            vetor = np.frombuffer(base64.b64decode(registro['vetor']), dtype=np.float32)
+        entrada = _Entrada(chave, vetor, registro['resposta'])
+        with self._lock:
+            self._inserir(chave, entrada)
+            self.acertos_exatos += 1
+            self.acertos_compartilhados += 1
+        return entrada.resposta
+
+    def obter(self, pergunta):
+        """Busca exata pela pergunta normalizada (memória local e depois compartilhada)"""
+        self.sincronizar_versao()
+        resposta = self.obter_local(pergunta)
+        if resposta is None:
+            resposta = self.obter_compartilhada(pergunta)
+        return resposta
+
+    def obter_local(self, pergunta):
+        """Busca exata só na memória deste processo (não bloqueia)"""
+        chave = normalizar_pergunta(pergunta)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and self._expirada(entrada, time.monotonic()):
+                self._remover(chave)
+                self.expiradas += 1
+                entrada = None
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+                self.acertos_exatos += 1
+                return entrada.resposta
+        return None
+
+    def obter_semelhante(self, embedding):
+        """Busca a resposta de uma pergunta com embedding dentro da distância máxima"""
+        vetor = self._normalizar_vetor(embedding)
+        with self._lock:
+            if vetor is None or not self._entradas:
+                self.falhas += 1
+                return None
+
+            if self._matriz is None:
+                self._chaves_matriz = [c for c, e in self._entradas.items() if e.vetor is not None]
+                self._matriz = (
+                    np.stack([self._entradas[c].vetor for c in self._chaves_matriz])
+                    if self._chaves_matriz else None
+                )
+            if self._matriz is None:
+                self.falhas += 1
+                return None
+
+            similaridades = self._matriz @ vetor
+            melhor = int(np.argmax(similaridades))
+            chave = self._chaves_matriz[melhor]
+            entrada = self._entradas.get(chave)
+
+            if entrada is None or 1.0 - float(similaridades[melhor]) > self.distancia_maxima:
+                self.falhas += 1
+                return None
+            if self._expirada(entrada, time.monotonic()):
+                self._remover(chave)
+                self.expiradas += 1
+                self.falhas += 1
+                return None
+
+            self._entradas.move_to_end(chave)
+            self.acertos_semelhantes += 1
+            return entrada.resposta
+
+    def guardar(self, pergunta, embedding, resposta):
+        """Guarda uma resposta (memória local e compartilhada) e aplica as políticas de eviction"""
+        entrada = self.guardar_local(pergunta, embedding, resposta)
+        if entrada is not None:
+            self.guardar_compartilhada(entrada)
+
+    def guardar_local(self, pergunta, embedding, resposta):
+        """Guarda só na memória deste processo (não bloqueia)
+
+        Retorna a entrada a repassar para guardar_compartilhada, ou None se não coube no cache.
+        """
+        chave = normalizar_pergunta(pergunta)
+        entrada = _Entrada(chave, self._normalizar_vetor(embedding), resposta)
+        if entrada.tamanho > self.max_bytes:
+            return None
+        with self._lock:
+            self._inserir(chave, entrada)
+        return entrada
+
+    def guardar_compartilhada(self, entrada):
+        """Replica uma entrada de guardar_local no armazenamento compartilhado
+
+        Bloqueante (grava no backend): no event loop, chamar em uma thread.
+        """
+        if self.armazenamento is None:
+            return
+        registro = {'resposta': entrada.resposta}
+        if entrada.vetor is not None:
+            registro['vetor'] = base64.b64encode(entrada.vetor.tobytes()).decode('ascii')
+        try:
+            self.armazenamento.guardar_varios(
+                {self._chave_compartilhada(entrada.pergunta): json.dumps(registro, ensure_ascii=False).encode('utf-8')},
+                ttl=self.ttl_segundos
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar no cache compartilhado de respostas: {e}")
+
+    def _inserir(self, chave, entrada):
+        """Insere na memória local e aplica as políticas de eviction (com o lock)"""
+        if chave in self._entradas:
+            self._remover(chave)
+
+        self._entradas[chave] = entrada
+        self._bytes += entrada.tamanho
+        if entrada.vetor is not None:
+            self._matriz = None
+
+        # Primeiro as expiradas, depois as menos usadas recentemente
+        agora = time.monotonic()
+        for antiga in [c for c, e in self._entradas.items() if self._expirada(e, agora)]:
+            self._remover(antiga)
+            self.expiradas += 1
+        while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+            self._remover(next(iter(self._entradas)))
+            self.removidas += 1
+
+    def _limpar(self):
+        self._entradas.clear()
+        self._bytes = 0
+        self._matriz = None
+        self._chaves_matriz = []
+
+    def invalidar(self):
+        """Descarta todas as respostas (ex.: após reingestão do índice), em todos os workers"""
+        versao = None
+        if self.armazenamento is not None:
+            try:
+                versao = self.armazenamento.incrementar(CHAVE_VERSAO)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao invalidar o cache compartilhado de respostas: {e}")
+        with self._lock:
+            self._limpar()
+            self.versao = versao if versao is not None else self.versao + 1
+        logger.info(f"🧹 Cache de respostas invalidado (versão {self.versao})")
+
+    def estatisticas(self):
+        """Contadores e ocupação do cache"""
+        with self._lock:
+            consultas = self.acertos_exatos + self.acertos_semelhantes + self.falhas
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_entradas': self.max_entradas,
+                'max_bytes': self.max_bytes,
+                'ttl_segundos': self.ttl_segundos,
+                'distancia_maxima': self.distancia_maxima,
+                'versao': self.versao,
+                'compartilhado': self.armazenamento.descricao() if self.armazenamento is not None else None,
+                'acertos_compartilhados': self.acertos_compartilhados,
+                'acertos_exatos': self.acertos_exatos,
+                'acertos_semelhantes': self.acertos_semelhantes,
+                'falhas': self.falhas,
+                'expiradas': self.expiradas,
+                'removidas': self.removidas,
+                'taxa_acerto': (self.acertos_exatos + self.acertos_semelhantes) / consultas if consultas else 0.0
+            }
+
+    @staticmethod
+    def _normalizar_vetor(embedding):
+        if embedding is None:
+            return None
+        vetor = np.asarray(embedding, dtype=np.float32)
+        norma = float(np.linalg.norm(vetor))
+        if norma == 0.0:
+            return None
+        return vetor / norma
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Coalescência de requisições idênticas em andamento (single-flight)
+A primeira requisição de uma chave (líder) executa o trabalho em uma tarefa
+própria; as que chegam enquanto ela está em voo (seguidoras) recebem o mesmo
+resultado, ou o mesmo stream desde o primeiro evento, sem repetir embedding,
+busca e geração. A tarefa só é cancelada quando todos desistem.
+"""
+
+import asyncio
+import logging
+from contextlib import aclosing
+
+from metricas import COALESCENCIA
+
+logger = logging.getLogger("vivi.coalescencia")
+
+
+class _Voo:
+    """Trabalho em andamento de uma chave: tarefa, eventos já produzidos e consumidores"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.tarefa = None
+        self.consumidores = 0
+        self.eventos = []
+        self.concluido = False
+        self.erro = None
+        self.novidade = asyncio.Event()
+
+    def avisar(self):
+        self.novidade.set()
+        self.novidade = asyncio.Event()
+
+
+class Coalescedor:
+    def __init__(self, nome):
+        self.nome = nome
+        self._voos = {}
+        self.lideres = 0
+        self.seguidores = 0
+
+    def _embarcar(self, chave, iniciar, estatisticas):
+        """Junta-se ao voo da chave ou inicia um novo; retorna o voo"""
+        loop = asyncio.get_running_loop()
+        voo = self._voos.get(chave)
+        if voo is None or voo.loop is not loop or voo.tarefa.done():
+            voo = _Voo(loop)
+            voo.tarefa = asyncio.ensure_future(iniciar(voo))
+            self._voos[chave] = voo
+            voo.tarefa.add_done_callback(lambda _: self._pousar(chave, voo))
+            self.lideres += 1
+            COALESCENCIA.inc(tipo=self.nome, papel='lider')
+        else:
+            self.seguidores += 1
+            COALESCENCIA.inc(tipo=self.nome, papel='seguidor')
+            if estatisticas is not None:
+                estatisticas['resultado'] = 'coalescida'
+            logger.debug("🛬 Requisição idêntica em andamento: aguardando o mesmo resultado")
+        voo.consumidores += 1
+        return voo
+
+    def _pousar(self, chave, voo):
+        if self._voos.get(chave) is voo:
+            del self._voos[chave]
+
+    def _desembarcar(self, voo):
+        voo.consumidores -= 1
+        if voo.consumidores == 0 and not voo.tarefa.done():
+            voo.tarefa.cancel()
+
+    async def executar(self, chave, fabrica, estatisticas=None):
+        """Resultado de `await fabrica()`, compartilhado entre as chamadas simultâneas da chave"""
+        voo = self._embarcar(chave, lambda _: fabrica(), estatisticas)
+        try:
+            # shield: quem desiste não cancela o trabalho dos demais
+            return await asyncio.shield(voo.tarefa)
+        finally:
+            self._desembarcar(voo)
+
+    async def transmitir(self, chave, fabrica, estatisticas=None):
+        """Eventos de `fabrica()` (gerador assíncrono); seguidoras recebem também os já produzidos"""
+        async def produzir(voo):
+            try:
+                async with aclosing(fabrica()) as eventos:
+                    async for evento in eventos:
+                        voo.eventos.append(evento)
+                        voo.avisar()
+            except Exception as e:
+                voo.erro = e
+            finally:
+                voo.concluido = True
+                voo.avisar()
+
+        voo = self._embarcar(chave, produzir, estatisticas)
+        try:
+            posicao = 0
+            while True:
+                if posicao < len(voo.eventos):
+                    posicao += 1
+                    yield voo.eventos[posicao - 1]
+                elif voo.concluido:
+                    if voo.erro is not None:
+                        raise voo.erro
+                    return
+                else:
+                    await voo.novidade.wait()
+        finally:
+            self._desembarcar(voo)
+
+    def resumo(self):
+        total = self.lideres + self.seguidores
+        return {
+            'em_voo': len(self._voos),
+            'lideres': self.lideres,
+            'seguidores': self.seguidores,
+            'razao': round(self.seguidores / total, 4) if total else 0.0
+        }
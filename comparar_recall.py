@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Comparação de recall entre o índice Pinecone e o índice local
+Para cada pergunta, busca o mesmo vetor nos dois backends e mede
+recall@k (documentos do Pinecone também retornados pelo índice local)
+e a latência de cada busca.
+
+Uso:
+    python comparar_recall.py perguntas.txt --indice-local indice_local/ --top-k 10
+    python comparar_recall.py perguntas.txt --indice-local indice_local/ --referencia exata
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+
+from agente_busca_gemini import MODELO_EMBEDDING, EMBED_LOTE_MAX, EMBED_CONSULTA
+from indice_local import IndiceLocal
+from recuperadores import RecuperadorPinecone
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall do índice local contra o Pinecone")
+    parser.add_argument('perguntas', help="Arquivo com uma pergunta por linha")
+    parser.add_argument('--indice-local', default=os.getenv("VIVI_INDICE_LOCAL", "indice_local"))
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=None, help="Listas IVF visitadas no índice local")
+    parser.add_argument('--referencia', choices=('pinecone', 'exata'), default='pinecone',
+                        help="Resultado de referência: Pinecone ou busca local exata (avalia só o IVF)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    from log_estruturado import configurar_logging
+    configurar_logging(formato="texto")
+    with open(args.perguntas, encoding='utf-8') as arquivo:
+        perguntas = [linha.strip() for linha in arquivo if linha.strip()]
+
+    from pinecone import Pinecone
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    local = IndiceLocal(args.indice_local, nprobe=args.nprobe)
+    pinecone = RecuperadorPinecone(pc.Index(os.getenv("PINECONE_INDEX", "vivi-ia-base")))
+
+    vetores = []
+    for inicio in range(0, len(perguntas), EMBED_LOTE_MAX):
+        resposta = pc.inference.embed(
+            model=MODELO_EMBEDDING,
+            inputs=perguntas[inicio:inicio + EMBED_LOTE_MAX],
+            parameters={"input_type": EMBED_CONSULTA}
+        )
+        vetores.extend(item['values'] for item in resposta.data)
+
+    recalls, latencias_ref, latencias_local = [], [], []
+    for pergunta, vetor in zip(perguntas, vetores):
+        if args.referencia == 'exata':
+            referencia, ms_ref = medir(lambda: local.buscar(vetor, args.top_k, exata=True))
+        else:
+            referencia, ms_ref = medir(pinecone.buscar, vetor, args.top_k)
+        obtidos, ms_local = medir(local.buscar, vetor, args.top_k)
+
+        esperados = {doc.id for doc in referencia}
+        recall = len(esperados & {doc.id for doc in obtidos}) / len(esperados) if esperados else 1.0
+        recalls.append(recall)
+        latencias_ref.append(ms_ref)
+        latencias_local.append(ms_local)
+        print(f"{recall:6.1%}  {ms_ref:8.1f} ms  {ms_local:7.2f} ms  {pergunta[:70]}")
+
+    print("=" * 60)
+    print(f"📊 {len(perguntas)} perguntas | recall@{args.top_k} médio: {statistics.mean(recalls):.1%} "
+          f"(mínimo {min(recalls):.1%})")
+    print(f"⏱️ {args.referencia}: p50 {percentil(latencias_ref, 50):.1f} ms, p95 {percentil(latencias_ref, 95):.1f} ms")
+    print(f"⏱️ local: p50 {percentil(latencias_local, 50):.2f} ms, p95 {percentil(latencias_local, 95):.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
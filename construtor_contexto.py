@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Construtor de contexto compacto para o Gemini
+Documentos já limpos → deduplicação → trechos mais relevantes → texto compacto
+dentro de um orçamento de tokens configurável
+"""
+
+import os
+import re
+import math
+import unicodedata
+from dataclasses import dataclass, field
+
+# Palavras que não ajudam a medir relevância de um trecho
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'uns', 'umas', 'de', 'do', 'da', 'dos', 'das',
+    'em', 'no', 'na', 'nos', 'nas', 'por', 'pelo', 'pela', 'para', 'com', 'sem', 'e',
+    'ou', 'que', 'se', 'como', 'qual', 'quais', 'quando', 'onde', 'ao', 'aos', 'sobre',
+    'ser', 'sao', 'foi', 'ha', 'tem', 'mais', 'menos', 'isso', 'esse', 'essa', 'este',
+    'esta', 'meu', 'minha', 'seu', 'sua'
+}
+
+
+def estimar_tokens(texto):
+    """Estimativa local de tokens (≈ 4 caracteres por token em português)"""
+    return math.ceil(len(texto) / 4)
+
+
+def termos_relevantes(texto):
+    """Termos normalizados (sem acentos, caixa e stopwords) usados para pontuar trechos"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return {t for t in re.findall(r'\w+', texto) if t not in STOPWORDS and (len(t) > 2 or t.isdigit())}
+
+
+@dataclass
+class ContextoGemini:
+    """Contexto pronto para o prompt e o que foi usado para montá-lo"""
+    documentos: list
+    texto: str
+    tokens: int
+    descartados: list = field(default_factory=list)
+
+
+class ConstrutorContexto:
+    """Monta o contexto compacto respeitando o orçamento de tokens"""
+
+    def __init__(self, max_tokens=None, max_tokens_por_documento=None, limiar_duplicado=None):
+        self.max_tokens = max_tokens or int(os.getenv("VIVI_CONTEXTO_MAX_TOKENS", "6000"))
+        self.max_tokens_por_documento = max_tokens_por_documento or int(
+            os.getenv("VIVI_CONTEXTO_MAX_TOKENS_DOCUMENTO", "1250")
+        )
+        self.limiar_duplicado = limiar_duplicado or float(os.getenv("VIVI_CONTEXTO_LIMIAR_DUPLICADO", "0.8"))
+
+    @staticmethod
+    def _shingles(texto, tamanho=5):
+        palavras = texto.lower().split()
+        if len(palavras) < tamanho:
+            return {' '.join(palavras)} if palavras else set()
+        return {' '.join(palavras[i:i + tamanho]) for i in range(len(palavras) - tamanho + 1)}
+
+    def _deduplicar(self, documentos):
+        """Descarta documentos cujo conteúdo já está quase todo contido em outro mais relevante"""
+        mantidos, descartados, vistos = [], [], []
+        for doc in documentos:
+            shingles = self._shingles(doc['conteudo'])
+            duplicado = False
+            for anteriores in vistos:
+                if shingles and len(shingles & anteriores) / len(shingles) >= self.limiar_duplicado:
+                    duplicado = True
+                    break
+            if duplicado:
+                descartados.append(doc['documento_id'])
+            else:
+                mantidos.append(doc)
+                vistos.append(shingles)
+        return mantidos, descartados
+
+    @staticmethod
+    def _dividir_em_trechos(texto, tamanho_alvo=400):
+        """Divide o texto em trechos de algumas frases, preservando a ordem"""
+        frases = re.split(r'(?<=[.!?;:])\s+|\n+', texto)
+        trechos, atual = [], ''
+        for frase in frases:
+            if not frase:
+                continue
+            if atual and len(atual) + len(frase) + 1 > tamanho_alvo:
+                trechos.append(atual)
+                atual = frase
+            else:
+                atual = f"{atual} {frase}" if atual else frase
+        if atual:
+            trechos.append(atual)
+        return trechos
+
+    def _trechos_relevantes(self, conteudo, termos_pergunta, orcamento):
+        """Seleciona os trechos mais relevantes dentro do orçamento, na ordem original"""
+        if estimar_tokens(conteudo) <= orcamento:
+            return conteudo
+
+        # Trechos de no máximo metade do orçamento, para caber mais de um
+        trechos = self._dividir_em_trechos(conteudo, tamanho_alvo=max(120, min(400, orcamento * 2)))
+        pontuados = []
+        for posicao, trecho in enumerate(trechos):
+            termos = termos_relevantes(trecho)
+            pontuacao = len(termos & termos_pergunta) if termos_pergunta else 0
+            # Em caso de empate, trechos do início do documento vêm primeiro
+            pontuados.append((-pontuacao, posicao, trecho))
+        pontuados.sort()
+
+        escolhidos, usados = [], 0
+        for _, posicao, trecho in pontuados:
+            custo = estimar_tokens(trecho) + 1
+            if usados + custo > orcamento:
+                continue
+            escolhidos.append((posicao, trecho))
+            usados += custo
+
+        if not escolhidos:
+            # Nenhum trecho cabe inteiro: corta o mais relevante no limite
+            return pontuados[0][2][:orcamento * 4]
+
+        escolhidos.sort()
+        partes, anterior = [], None
+        for posicao, trecho in escolhidos:
+            if anterior is not None and posicao != anterior + 1:
+                partes.append('…')
+            partes.append(trecho)
+            anterior = posicao
+        return ' '.join(partes)
+
+    def construir(self, documentos, pergunta=None):
+        """documentos: dicts com documento_id, document_title, relevancia e conteudo (já limpos)"""
+        mantidos, descartados = self._deduplicar(documentos)
+        termos_pergunta = termos_relevantes(pergunta) if pergunta else set()
+
+        usados, blocos, incluidos = 0, [], []
+        for doc in mantidos:
+            cabecalho = f"[{len(incluidos) + 1}] {doc['document_title']} | relevância {doc['relevancia']}"
+            restante = self.max_tokens - usados - estimar_tokens(cabecalho) - 1
+            if restante <= 0:
+                descartados.append(doc['documento_id'])
+                continue
+
+            orcamento = min(self.max_tokens_por_documento, restante)
+            conteudo = self._trechos_relevantes(doc['conteudo'], termos_pergunta, orcamento)
+            bloco = f"{cabecalho}\n{conteudo}"
+            usados += estimar_tokens(bloco) + 1
+            blocos.append(bloco)
+            incluidos.append({**doc, 'conteudo': conteudo})
+
+        texto = '\n\n'.join(blocos)
+        return ContextoGemini(
+            documentos=incluidos,
+            texto=texto,
+            tokens=estimar_tokens(texto),
+            descartados=descartados
+        )
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Motor de correções de texto da Vivi IA
+Todas as regras compiladas em uma única expressão regular (termo mais longo
+primeiro, respeitando limites de palavra), aplicada em uma só passada.
+Também remove os glifos especiais dos documentos e normaliza espaços.
+A tabela pode ser estendida por um arquivo JSON (VIVI_CORRECOES_ARQUIVO).
+"""
+
+import os
+import logging
+import re
+import json
+
+logger = logging.getLogger("vivi.corretor")
+
+# Correções obrigatórias aplicadas ao contexto e às respostas
+CORRECOES_PADRAO = {
+    'escontado': 'descontado',
+    'ESCONTADO': 'DESCONTADO',
+    'chunk': 'documento',
+    'chunks': 'documentos',
+    'Chunk': 'Documento',
+    'Chunks': 'Documentos',
+    'chunk_id': 'documento_id',
+    'chunk_text': 'conteúdo do documento',
+    'chunk_index': 'índice do documento',
+    'chunk_size': 'tamanho do documento',
+    'Abate do Teto Constitucional': 'Abate Teto Constitucional',
+    'ABATE DO TETO CONSTITUCIONAL': 'ABATE TETO CONSTITUCIONAL',
+    'Ministério da Economia': 'Ministério da Gestão e Inovação em Serviços Públicos (MGI)',
+    'MINISTÉRIO DA ECONOMIA': 'MINISTÉRIO DA GESTÃO E INOVAÇÃO EM SERVIÇOS PÚBLICOS (MGI)',
+    'Ministério da Infraestrutura': 'Ministério do Trabalho (MT)',
+    'MINISTÉRIO DA INFRAESTRUTURA': 'MINISTÉRIO DO TRABALHO (MT)'
+}
+
+# Glifos de fontes de ícones que aparecem nos documentos extraídos
+CARACTERES_REMOVIDOS = '\uf0c9\uf002\uf142'
+
+
+def carregar_correcoes(caminho=None):
+    """Tabela padrão + regras do arquivo JSON ({"erro": "correção"}; null remove a regra)"""
+    correcoes = dict(CORRECOES_PADRAO)
+    caminho = caminho or os.getenv("VIVI_CORRECOES_ARQUIVO")
+    if not caminho:
+        return correcoes
+
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            extras = json.load(arquivo)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Não foi possível carregar correções de {caminho}: {e}")
+        return correcoes
+
+    for erro, correcao in extras.items():
+        if correcao is None:
+            correcoes.pop(erro, None)
+        else:
+            correcoes[erro] = correcao
+    logger.info(f"📖 {len(extras)} regras de correção carregadas de {caminho}")
+    return correcoes
+
+
+def _padrao_do_termo(termo):
+    """Termo escapado, com limite de palavra nas pontas que são alfanuméricas"""
+    padrao = re.escape(termo)
+    if re.match(r'\w', termo):
+        padrao = r'(?<!\w)' + padrao
+    if re.search(r'\w$', termo):
+        padrao = padrao + r'(?!\w)'
+    return padrao
+
+
+class MotorCorrecoes:
+    """Aplica a tabela de correções em uma única passada"""
+
+    def __init__(self, correcoes=None, caracteres_removidos=CARACTERES_REMOVIDOS):
+        self.correcoes = dict(correcoes) if correcoes is not None else carregar_correcoes()
+        self.maior_termo = max((len(t) for t in self.correcoes), default=1)
+
+        # Mais longo primeiro: 'chunks' vence 'chunk', 'chunk_id' vence 'chunk'
+        termos = sorted(self.correcoes, key=len, reverse=True)
+        alternativas = '|'.join(_padrao_do_termo(t) for t in termos) or r'(?!)'
+        self.padrao_termos = re.compile(alternativas)
+
+        glifos = re.escape(caracteres_removidos) if caracteres_removidos else ''
+        partes = []
+        if glifos:
+            # Espaços com glifos no meio viram um único espaço; glifos isolados somem
+            partes.append(rf'(?P<espaco>[\s{glifos}]*\s[\s{glifos}]*)')
+            partes.append(rf'(?P<glifo>[{glifos}]+)')
+        else:
+            partes.append(r'(?P<espaco>\s+)')
+        partes.append(rf'(?P<termo>{alternativas})')
+        self.padrao_limpeza = re.compile('|'.join(partes))
+
+    def _substituir_termo(self, match):
+        return self.correcoes[match.group(0)]
+
+    def _substituir_limpeza(self, match):
+        if match.lastgroup == 'espaco':
+            return ' '
+        if match.lastgroup == 'glifo':
+            return ''
+        return self.correcoes[match.group(0)]
+
+    def corrigir(self, texto):
+        """Aplica só as correções de termos (preserva quebras de linha)"""
+        return self.padrao_termos.sub(self._substituir_termo, texto)
+
+    def limpar(self, texto):
+        """Remove glifos, normaliza espaços e corrige termos em uma passada"""
+        return self.padrao_limpeza.sub(self._substituir_limpeza, texto).strip()
+
+    def incremental(self):
+        """Corretor para texto que chega em partes (streaming)"""
+        return CorretorIncremental(self)
+
+
+class CorretorIncremental:
+    """Aplica as correções a um stream, respeitando os limites entre partes"""
+
+    def __init__(self, motor):
+        self._motor = motor
+        # Um termo que ainda pode ser completado (ou cujo limite de palavra
+        # ainda não é conhecido) fica retido até a próxima parte
+        self._reter = motor.maior_termo
+        self._buffer = ''
+        # Posição do primeiro caractere ainda não emitido (o anterior fica
+        # no buffer só para o limite de palavra)
+        self._inicio = 0
+
+    def _emitir_ate(self, corte, final=False):
+        partes, pos = [], self._inicio
+        for match in self._motor.padrao_termos.finditer(self._buffer, self._inicio):
+            if match.start() >= corte:
+                break
+            if match.end() > corte and not final:
+                corte = match.start()
+                break
+            partes.append(self._buffer[pos:match.start()])
+            partes.append(self._motor._substituir_termo(match))
+            pos = match.end()
+        partes.append(self._buffer[pos:corte])
+
+        manter = max(corte - 1, 0)
+        self._buffer = self._buffer[manter:]
+        self._inicio = corte - manter
+        return ''.join(partes)
+
+    def alimentar(self, texto):
+        """Recebe uma parte do stream e devolve o trecho corrigido já seguro"""
+        self._buffer += texto
+        corte = len(self._buffer) - self._reter
+        if corte <= self._inicio:
+            return ''
+        return self._emitir_ate(corte)
+
+    def finalizar(self):
+        """Corrige e devolve o que restou no buffer"""
+        return self._emitir_ate(len(self._buffer), final=True)
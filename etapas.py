@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Resultados intermediários do pipeline da Vivi IA
+recuperar → montar contexto → gerar → pós-processar; cada etapa recebe o
+resultado da anterior, então uma nova geração (falha ou "gerar de novo") ou
+uma pergunta de continuação reaproveita a recuperação sem repetir embedding
+e busca.
+"""
+
+import json
+import time
+import uuid
+import base64
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import numpy as np
+
+from construtor_contexto import ContextoGemini
+
+
+def _novo_id():
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass
+class Recuperacao:
+    """Etapa 1: documentos selecionados para uma pergunta"""
+    pergunta: str
+    embedding: Any
+    documentos: List[Any]
+    faq: bool = False
+    selecao: Optional[dict] = None
+    id: str = field(default_factory=_novo_id)
+    criada_em: float = field(default_factory=time.time)
+
+    def ids(self):
+        return [getattr(doc, 'id', None) for doc in self.documentos]
+
+    def como_registro(self):
+        """Recuperação serializada para o armazenamento compartilhado: IDs e scores dos
+        documentos (o conteúdo é buscado de novo pelos IDs) e o embedding da pergunta"""
+        embedding = None
+        if self.embedding is not None:
+            embedding = base64.b64encode(np.asarray(self.embedding, dtype=np.float32).tobytes()).decode('ascii')
+        return json.dumps({
+            'pergunta': self.pergunta,
+            'embedding': embedding,
+            'documentos': [[getattr(doc, 'id', None), float(getattr(doc, 'score', 0.0) or 0.0)]
+                           for doc in self.documentos],
+            'faq': self.faq,
+            'selecao': self.selecao,
+            'criada_em': self.criada_em
+        }, ensure_ascii=False).encode('utf-8')
+
+    @classmethod
+    def de_registro(cls, id_recuperacao, registro, documentos):
+        """Recuperação a partir de como_registro e dos documentos buscados pelos IDs (scores restaurados)"""
+        scores = dict(registro['documentos'])
+        for doc in documentos:
+            doc.score = scores[doc.id]
+        embedding = None
+        if registro.get('embedding'):
+            embedding = np.frombuffer(base64.b64decode(registro['embedding']), dtype=np.float32).tolist()
+        return cls(pergunta=registro['pergunta'], embedding=embedding, documentos=documentos,
+                   faq=registro['faq'], selecao=registro['selecao'], id=id_recuperacao,
+                   criada_em=registro['criada_em'])
+
+    def como_dict(self):
+        return {
+            'id': self.id,
+            'pergunta': self.pergunta,
+            'faq': self.faq,
+            'selecao': self.selecao,
+            'documentos': [
+                {
+                    'documento_id': getattr(doc, 'id', None),
+                    'document_title': (getattr(doc, 'metadata', None) or {}).get('document_title'),
+                    'score': round(float(getattr(doc, 'score', 0.0) or 0.0), 4)
+                }
+                for doc in self.documentos
+            ]
+        }
+
+
+@dataclass
+class PromptMontado:
+    """Etapa 2: contexto compacto e prompt de uma pergunta sobre uma recuperação"""
+    pergunta: str
+    recuperacao: Recuperacao
+    contexto: ContextoGemini
+    prompt: Any
+
+    def como_dict(self):
+        return {
+            'recuperacao_id': self.recuperacao.id,
+            'pergunta': self.pergunta,
+            'tokens': self.contexto.tokens,
+            'documentos': [
+                {
+                    'documento_id': ctx['documento_id'],
+                    'document_title': ctx['document_title'],
+                    'relevancia': ctx['relevancia']
+                }
+                for ctx in self.contexto.documentos
+            ],
+            'descartados': self.contexto.descartados,
+            'contexto': self.contexto.texto
+        }
+
+
+@dataclass
+class Geracao:
+    """Etapa 3: texto devolvido pelo Gemini (erro=True: mensagem de erro no lugar da resposta)"""
+    texto: str
+    erro: bool = False
+    tokens: Optional[dict] = None
+
+
+@dataclass
+class RespostaFinal:
+    """Etapa 4: resposta entregue, já registrada no cache quando cabível"""
+    pergunta: str
+    resposta: str
+    recuperacao_id: str
+    em_cache: bool = False
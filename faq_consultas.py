@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tabela FAQ de consultas pré-calculadas da Vivi IA
+Para as perguntas mais frequentes do histórico, guarda o embedding de consulta
+e os documentos selecionados (ID + score). Uma pergunta conhecida pula o
+embedding e a busca vetorial: vai direto ao cache de respostas ou à geração.
+
+Arquivo JSONL: {"pergunta": ..., "embedding": [...], "documentos": [{"id": ..., "score": ...}]}
+
+Uso:
+    # historico.txt: uma pergunta por linha (repetições contam como frequência)
+    python faq_consultas.py historico.txt --top 500 --saida faq_consultas.jsonl
+"""
+
+import os
+import logging
+import sys
+import json
+import argparse
+from collections import Counter
+
+from cache_semantico import normalizar_pergunta
+
+logger = logging.getLogger("vivi.faq")
+
+
+class EntradaFAQ:
+    __slots__ = ('pergunta', 'embedding', 'documentos')
+
+    def __init__(self, pergunta, embedding, documentos):
+        self.pergunta = pergunta
+        self.embedding = embedding
+        self.documentos = documentos  # [(id, score)] na ordem da seleção
+
+
+class TabelaFAQ:
+    """Perguntas normalizadas → embedding de consulta e documentos pré-selecionados"""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho if caminho is not None else os.getenv("VIVI_FAQ_ARQUIVO", "faq_consultas.jsonl")
+        self._entradas = {}
+        self.acertos = 0
+        self.falhas = 0
+        if self.caminho and os.path.exists(self.caminho):
+            self.carregar(self.caminho)
+
+    def carregar(self, caminho):
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                if not linha.strip():
+                    continue
+                registro = json.loads(linha)
+                self._entradas[normalizar_pergunta(registro['pergunta'])] = EntradaFAQ(
+                    registro['pergunta'],
+                    registro['embedding'],
+                    [(doc['id'], doc['score']) for doc in registro['documentos']]
+                )
+        logger.info(f"📋 Tabela FAQ carregada: {len(self._entradas)} perguntas ({caminho})")
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, pergunta):
+        """EntradaFAQ da pergunta (comparação normalizada) ou None"""
+        entrada = self._entradas.get(normalizar_pergunta(pergunta))
+        if entrada is None:
+            self.falhas += 1
+        else:
+            self.acertos += 1
+        return entrada
+
+    def estatisticas(self):
+        return {'perguntas': len(self._entradas), 'acertos': self.acertos, 'falhas': self.falhas}
+
+
+def perguntas_mais_frequentes(caminho, top):
+    """As `top` perguntas mais frequentes do histórico (uma por linha)"""
+    contagem, original = Counter(), {}
+    with open(caminho, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            pergunta = linha.strip()
+            if not pergunta:
+                continue
+            chave = normalizar_pergunta(pergunta)
+            contagem[chave] += 1
+            original.setdefault(chave, pergunta)
+    return [original[chave] for chave, _ in contagem.most_common(top)]
+
+
+def construir_tabela(agente, perguntas, caminho):
+    """Calcula embeddings de consulta em lote e a seleção de documentos de cada pergunta"""
+    embeddings = agente.gerar_embeddings_consulta(perguntas)
+    gravadas = 0
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        for pergunta, embedding in zip(perguntas, embeddings):
+            if embedding is None:
+                logger.warning(f"⚠️ Sem embedding, ignorando: {pergunta}")
+                continue
+            documentos = agente.buscar_no_pinecone(pergunta, embedding=embedding)
+            if not documentos:
+                continue
+            arquivo.write(json.dumps({
+                'pergunta': pergunta,
+                'embedding': embedding,
+                'documentos': [{'id': doc.id, 'score': float(doc.score)} for doc in documentos]
+            }, ensure_ascii=False) + '\n')
+            gravadas += 1
+    os.replace(temporario, caminho)
+    return gravadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula a tabela FAQ de consultas da Vivi IA")
+    parser.add_argument('historico', help="Arquivo com uma pergunta por linha")
+    parser.add_argument('--top', type=int, default=500, help="Quantidade de perguntas mais frequentes")
+    parser.add_argument('--saida', default=os.getenv("VIVI_FAQ_ARQUIVO", "faq_consultas.jsonl"))
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    from log_estruturado import configurar_logging
+    configurar_logging(formato="texto")
+    os.environ["VIVI_FAQ_ARQUIVO"] = ""  # não usar a tabela antiga durante a construção
+    from agente_busca_gemini import AgenteBuscaGemini
+
+    perguntas = perguntas_mais_frequentes(args.historico, args.top)
+    print(f"📋 {len(perguntas)} perguntas selecionadas do histórico")
+    gravadas = construir_tabela(AgenteBuscaGemini(), perguntas, args.saida)
+    print(f"💾 Tabela FAQ gravada em {args.saida}: {gravadas} perguntas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,8 +7,14 @@ Interface web para consultas sobre SIAPE e gestão pública
 import os
 import sys
 import json
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+import hmac
+import logging
+import math
+import time
+import asyncio
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request, Header, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
@@ -18,10 +24,21 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agente_busca_gemini import AgenteBuscaGemini
+from monitor_saude import MonitorConectividade
+from resiliencia import FalhaEtapa, PrazoEsgotado, CircuitoAberto
+from admissao import LimitadorClientes, Sobrecarga
+from cache_compartilhado import criar_armazenamento
+from respostas_prontas import ArmazemRespostasProntas
+from metricas import REGISTRO, DISJUNTOR_ABERTO
+from log_estruturado import configurar_logging, definir_id_requisicao
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Logs em JSON (uma linha por evento) gravados por uma thread própria
+configurar_logging()
+logger = logging.getLogger("vivi.app")
+
 app = FastAPI(title="Vivi IA - Agente RAG", version="1.0.0")
 
 # Configurar templates e arquivos estáticos
@@ -32,66 +49,139 @@ app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__
 agente = None
 agente_inicializado = False
 
+# Estado de conectividade atualizado em segundo plano (usado pelas probes)
+monitor = MonitorConectividade()
+tarefa_monitor = None
+
+# Inicialização em segundo plano disparada por requisições enquanto o agente não existe
+tarefa_inicializacao = None
+
+# Gravação periódica das métricas do worker (VIVI_METRICAS_DIR)
+tarefa_metricas = None
+
+# Balde de tokens por cliente (IP) nas rotas de busca; com VIVI_CACHE_BACKEND=sqlite/redis,
+# compartilhado pelos workers (sem isso, cada worker aplicaria o limite inteiro)
+limitador = LimitadorClientes(armazenamento=criar_armazenamento())
+# Proxies à frente do servidor (Render: 1); o IP do cliente é o que o último deles anotou
+PROXIES_CONFIAVEIS = int(os.getenv("VIVI_PROXIES_CONFIAVEIS", "0"))
+
+# Respostas pré-calculadas das perguntas mais frequentes (servidas mesmo com o agente aquecendo)
+respostas_prontas = ArmazemRespostasProntas()
+tarefa_respostas_prontas = None
+
 class PerguntaRequest(BaseModel):
     pergunta: str
+    # Conversa: sessao=true abre uma sessão; sessao_id continua a existente
+    sessao: bool = False
+    sessao_id: Optional[str] = None
+
+class EtapaRequest(BaseModel):
+    recuperacao_id: str
+    pergunta: Optional[str] = None
+
+class LoteRequest(BaseModel):
+    perguntas: List[str]
+    max_geracoes: Optional[int] = None
 
 def inicializar_agente():
-    """Inicializa o agente RAG na startup com timeout e retry"""
+    """Inicializa o agente RAG (com novas tentativas) e aquece as conexões"""
     global agente, agente_inicializado
     if not agente_inicializado:
         max_tentativas = 5
         for tentativa in range(max_tentativas):
             try:
-                print(f"🚀 Inicializando agente RAG... (tentativa {tentativa + 1}/{max_tentativas})")
-                agente = AgenteBuscaGemini()
-                agente_inicializado = True
-                print("✅ Agente RAG inicializado com sucesso!")
-
-                # Teste de conectividade
-                try:
-                    test_result = agente.buscar_no_pinecone("teste", top_k=1)
-                    if test_result:
-                        print("✅ Conectividade com Pinecone OK!")
-                    else:
-                        print("⚠️ Pinecone retornou vazio, mas conexão OK")
-                except Exception as test_error:
-                    print(f"⚠️ Teste de conectividade falhou: {test_error}")
+                logger.info(f"🚀 Inicializando agente RAG... (tentativa {tentativa + 1}/{max_tentativas})")
+                novo_agente = AgenteBuscaGemini()
+                logger.info("✅ Agente RAG inicializado com sucesso!")
 
+                # Aquecimento: conexões com Pinecone e embeddings abertas antes da primeira pergunta
+                aquecimento = novo_agente.aquecer()
+                if all(aquecimento.values()):
+                    logger.info("✅ Conectividade com Pinecone OK!")
+
+                agente = novo_agente
+                agente_inicializado = True
                 return True
 
             except Exception as e:
-                print(f"❌ Erro na tentativa {tentativa + 1}: {e}")
+                logger.error(f"❌ Erro na tentativa {tentativa + 1}: {e}")
                 if tentativa < max_tentativas - 1:
-                    print("⏳ Aguardando antes da próxima tentativa...")
-                    import time
+                    logger.info("⏳ Aguardando antes da próxima tentativa...")
                     time.sleep(2)  # Espera 2 segundos entre tentativas
                 else:
-                    print("❌ Todas as tentativas falharam")
+                    logger.error("❌ Todas as tentativas falharam")
                     agente_inicializado = False
                     return False
     return True
 
-def get_agente():
-    """Retorna o agente RAG, inicializando se necessário"""
-    global agente, agente_inicializado
-
-    if not agente_inicializado:
-        if not inicializar_agente():
-            return None
-
-    # Verificar se o agente ainda está ativo
-    try:
-        # Teste simples para ver se o agente responde
-        if hasattr(agente, 'pc') and agente.pc is not None:
-            return agente
-        else:
-            # Re-inicializar se necessário
-            print("🔄 Re-inicializando agente...")
-            return inicializar_agente() and agente
-    except Exception as e:
-        print(f"⚠️ Agente com problemas, re-inicializando: {e}")
-        agente_inicializado = False
-        return inicializar_agente() and agente
+def estado_agente():
+    """'pronto', 'aquecendo' (inicialização em andamento) ou 'falhou' (aguardando nova tentativa)"""
+    if agente_inicializado and agente:
+        return 'pronto'
+    if tarefa_inicializacao is not None and not tarefa_inicializacao.done():
+        return 'aquecendo'
+    return 'falhou'
+
+def obter_agente_pronto():
+    """Retorna o agente ou responde 503 na hora, disparando a inicialização em segundo plano"""
+    global tarefa_inicializacao
+    if agente_inicializado and agente:
+        return agente
+    if tarefa_inicializacao is None or tarefa_inicializacao.done():
+        tarefa_inicializacao = asyncio.create_task(asyncio.to_thread(inicializar_agente))
+    # O frontend reconhece o cabeçalho e tenta de novo após o Retry-After
+    raise HTTPException(
+        status_code=503,
+        detail='Vivi IA ainda inicializando',
+        headers={'Retry-After': '5', 'X-Vivi-Estado': 'aquecendo'}
+    )
+
+def erro_http_da_etapa(erro):
+    """Converte uma falha do pipeline em resposta HTTP (504 prazo, 503 disjuntor ou sobrecarga, 502 upstream)"""
+    if not isinstance(erro, Sobrecarga):
+        logger.error(f"❌ {erro}")
+    if isinstance(erro, PrazoEsgotado):
+        return HTTPException(status_code=504, detail=str(erro))
+    status = 503 if isinstance(erro, (CircuitoAberto, Sobrecarga)) else 502
+    retry_after = str(max(1, math.ceil(erro.retry_after or 1)))
+    return HTTPException(status_code=status, detail=str(erro), headers={'Retry-After': retry_after})
+
+def identificar_cliente(request: Request):
+    """IP do cliente; atrás de proxies confiáveis, a entrada que o mais externo deles anotou"""
+    if PROXIES_CONFIAVEIS:
+        encaminhado = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if encaminhado:
+            return encaminhado[-min(PROXIES_CONFIAVEIS, len(encaminhado))]
+    return request.client.host if request.client else "desconhecido"
+
+async def limitar_cliente(request: Request):
+    """429 com Retry-After quando o cliente esgota o balde de tokens"""
+    cliente = identificar_cliente(request)
+    if limitador.armazenamento is not None:
+        espera = await asyncio.to_thread(limitador.consumir, cliente)
+    else:
+        espera = limitador.consumir(cliente)
+    if espera:
+        raise HTTPException(
+            status_code=429,
+            detail='Muitas consultas seguidas; aguarde alguns segundos',
+            headers={'Retry-After': str(max(1, math.ceil(espera)))}
+        )
+
+def resumo_admissao():
+    return {
+        'cliente': limitador.resumo(),
+        'pipeline': agente.admissao.resumo(),
+        'geracao': agente.geracoes.resumo()
+    }
+
+@app.middleware("http")
+async def id_da_requisicao(request: Request, call_next):
+    """Propaga o X-Request-ID recebido (ou um novo) para os logs e para a resposta"""
+    id_requisicao = definir_id_requisicao(request.headers.get("x-request-id"))
+    resposta = await call_next(request)
+    resposta.headers["X-Request-ID"] = id_requisicao
+    return resposta
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -100,9 +190,79 @@ async def index(request: Request):
 
 @app.on_event("startup")
 async def startup_event():
-    """Inicializar agente na startup da aplicação"""
-    print("🌟 Iniciando Vivi IA - Sistema RAG...")
-    inicializar_agente()
+    """Dispara a inicialização do agente em segundo plano: a porta abre na hora
+
+    Até o agente ficar pronto, /readyz e as buscas respondem 503 com Retry-After.
+    """
+    global tarefa_monitor, tarefa_inicializacao, tarefa_metricas
+    logger.info("🌟 Iniciando Vivi IA - Sistema RAG...")
+    tarefa_inicializacao = asyncio.create_task(asyncio.to_thread(inicializar_agente))
+    tarefa_monitor = asyncio.create_task(
+        monitor.executar(lambda: agente if agente_inicializado else None)
+    )
+    if os.getenv("VIVI_METRICAS_DIR"):
+        tarefa_metricas = asyncio.create_task(gravar_metricas_periodicamente(os.getenv("VIVI_METRICAS_DIR")))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Encerrar as tarefas de monitoramento e gravar as métricas finais do worker"""
+    if tarefa_monitor is not None:
+        tarefa_monitor.cancel()
+    if tarefa_metricas is not None:
+        tarefa_metricas.cancel()
+        try:
+            REGISTRO.gravar(os.getenv("VIVI_METRICAS_DIR"))
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar as métricas do worker: {e}")
+
+@app.get("/livez")
+async def livez():
+    """Liveness: o processo está de pé e o event loop responde"""
+    return {'status': 'ok'}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness a partir do estado em memória, sem chamadas externas"""
+    pronto = agente_inicializado and monitor.pronto()
+    estado = estado_agente()
+    conteudo = {
+        'status': 'ready' if pronto else ('warming_up' if estado == 'aquecendo' else 'not_ready'),
+        'agent_initialized': agente_inicializado,
+        'agent_state': estado,
+        **monitor.resumo()
+    }
+    if agente_inicializado and agente:
+        conteudo['resiliencia'] = agente.resiliencia.resumo()
+        conteudo['admissao'] = resumo_admissao()
+    return JSONResponse(content=conteudo, status_code=200 if pronto else 503)
+
+def publicar_disjuntores():
+    """Estado atual dos disjuntores no medidor vivi_disjuntor_aberto"""
+    if agente_inicializado and agente:
+        for servico, disjuntor in agente.resiliencia.disjuntores.items():
+            DISJUNTOR_ABERTO.definir(0 if disjuntor.estado == disjuntor.FECHADO else 1, servico=servico)
+
+async def gravar_metricas_periodicamente(diretorio):
+    """Grava as métricas deste worker para o /metrics dos outros somá-las"""
+    intervalo = float(os.getenv("VIVI_METRICAS_INTERVALO", "5"))
+    while True:
+        try:
+            publicar_disjuntores()
+            await asyncio.to_thread(REGISTRO.gravar, diretorio)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar as métricas do worker: {e}")
+        await asyncio.sleep(intervalo)
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas no formato texto do Prometheus (de todos os workers, com VIVI_METRICAS_DIR)"""
+    publicar_disjuntores()
+    diretorio = os.getenv("VIVI_METRICAS_DIR")
+    if diretorio:
+        texto = await asyncio.to_thread(REGISTRO.exportar, diretorio)
+    else:
+        texto = REGISTRO.exportar()
+    return PlainTextResponse(texto, media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
 async def health_check():
@@ -115,16 +275,28 @@ async def health_check():
         }
 
         # Verificar se agente está inicializado
-        agente = get_agente()
-        if agente:
+        if agente_inicializado and agente:
             health_status['checks']['agent_initialization'] = '✅ OK'
 
-            # Testar conectividade com Pinecone
-            try:
-                test_pinecone = agente.buscar_no_pinecone("teste de conectividade", top_k=1)
-                health_status['checks']['pinecone_connection'] = '✅ OK'
-            except Exception as pinecone_error:
-                health_status['checks']['pinecone_connection'] = f'❌ {str(pinecone_error)}'
+            # Conectividade publicada pelo monitor em segundo plano
+            for servico, registro in monitor.estado.items():
+                if registro['ok'] is None:
+                    health_status['checks'][f'{servico}_connection'] = '⏳ Aguardando primeira verificação'
+                elif registro['ok']:
+                    health_status['checks'][f'{servico}_connection'] = '✅ OK'
+                else:
+                    health_status['checks'][f'{servico}_connection'] = f"❌ {registro['erro']}"
+            health_status['connectivity'] = monitor.resumo()
+
+            # Disjuntores abertos aparecem nas verificações
+            resiliencia = agente.resiliencia.resumo()
+            for servico, disjuntor in resiliencia['disjuntores'].items():
+                if disjuntor['estado'] != 'fechado':
+                    health_status['checks'][f'{servico}_circuit'] = (
+                        f"⚠️ Disjuntor {disjuntor['estado']} (reabre em {disjuntor['reabre_em_s']}s)"
+                    )
+            health_status['resiliencia'] = resiliencia
+            health_status['admissao'] = resumo_admissao()
 
             health_status['status'] = 'healthy'
             health_status['message'] = 'Vivi IA funcionando normalmente'
@@ -167,18 +339,9 @@ async def diagnostics():
             }
         }
 
-        # Testar conectividade se agente estiver inicializado
+        # Conectividade publicada pelo monitor em segundo plano
         if agente_inicializado and agente:
-            try:
-                pinecone_test = agente.buscar_no_pinecone("diagnostics test", top_k=1)
-                diagnostics_info['connectivity'] = {
-                    'pinecone': '✅ OK',
-                    'results_count': len(pinecone_test) if pinecone_test else 0
-                }
-            except Exception as conn_error:
-                diagnostics_info['connectivity'] = {
-                    'pinecone': f'❌ {str(conn_error)}'
-                }
+            diagnostics_info['connectivity'] = monitor.resumo()
 
         return diagnostics_info
 
@@ -187,86 +350,319 @@ async def diagnostics():
             'error': f'Erro no diagnóstico: {str(e)}'
         }
 
-@app.post("/api/buscar")
+@app.post("/api/buscar", dependencies=[Depends(limitar_cliente)])
 async def buscar(request: PerguntaRequest):
-    """API para executar buscas no agente RAG com retry automático e timeout"""
+    """API para executar buscas no agente RAG (prazo por requisição e novas tentativas por etapa)"""
     try:
         pergunta = request.pergunta.strip()
 
         if not pergunta:
             raise HTTPException(status_code=400, detail='Pergunta não pode estar vazia')
 
-        print(f"🔍 Processando pergunta: '{pergunta}'")
-
-        # Tentativas de obter o agente (até 5 tentativas no Render)
-        agente = None
-        max_tentativas_agente = 5
-
-        for tentativa in range(max_tentativas_agente):
-            agente = get_agente()
-            if agente:
-                print(f"✅ Agente obtido na tentativa {tentativa + 1}")
-                break
-
-            print(f"⚠️ Tentativa {tentativa + 1}/{max_tentativas_agente} de obter agente falhou")
-            if tentativa < max_tentativas_agente - 1:
-                import asyncio
-                await asyncio.sleep(2)  # Pausa maior entre tentativas no Render
+        logger.debug("🔍 Processando pergunta: '%s'", pergunta)
+
+        pronta, sessao = await turno_pronto(request, pergunta)
+        if pronta is not None:
+            return {
+                'success': True,
+                'resposta': pronta.resposta,
+                'pergunta': pergunta,
+                'recuperacao_id': None,
+                'sessao_id': sessao.id if sessao else None,
+                'selecao': None,
+                'faq': False,
+                'pronta': True
+            }
 
-        if not agente:
-            raise HTTPException(status_code=500, detail='Não foi possível inicializar Vivi IA após várias tentativas')
+        agente_atual = obter_agente_pronto()
 
-        # Executar busca com múltiplas tentativas
-        max_tentativas_busca = 3
+        # Prazo, novas tentativas por etapa, hedge e disjuntores ficam no agente
+        sessao = await sessao_da_requisicao(agente_atual, request)
+        estatisticas = {}
+        try:
+            resposta = await agente_atual.aexecutar_busca_completa(pergunta, estatisticas, sessao=sessao)
+        except FalhaEtapa as e:
+            raise erro_http_da_etapa(e)
 
-        for tentativa_busca in range(max_tentativas_busca):
-            try:
-                print(f"🔍 Executando busca (tentativa {tentativa_busca + 1}/{max_tentativas_busca})...")
-
-                # Timeout maior para o Render
-                resposta = agente.executar_busca_completa(pergunta)
-
-                print(f"✅ Busca concluída com sucesso!")
-                return {
-                    'success': True,
-                    'resposta': resposta,
-                    'pergunta': pergunta
-                }
-
-            except Exception as busca_error:
-                print(f"❌ Erro na tentativa {tentativa_busca + 1}: {busca_error}")
-
-                if tentativa_busca < max_tentativas_busca - 1:
-                    print("🔄 Tentando novamente em alguns segundos...")
-                    import asyncio
-                    await asyncio.sleep(3)  # Pausa entre tentativas de busca
-
-                    # Resetar agente se necessário
-                    if tentativa_busca >= 1:
-                        print("🔄 Resetando agente...")
-                        global agente_inicializado
-                        agente_inicializado = False
-                        agente = get_agente()
-                else:
-                    print(f"❌ Todas as {max_tentativas_busca} tentativas de busca falharam")
-
-        raise HTTPException(status_code=500, detail=f'Erro na busca após {max_tentativas_busca} tentativas: {str(busca_error)}')
+        logger.debug("✅ Busca concluída com sucesso!")
+        return {
+            'success': True,
+            'resposta': resposta,
+            'pergunta': pergunta,
+            'recuperacao_id': estatisticas.get('recuperacao_id'),
+            'sessao_id': sessao.id if sessao else None,
+            'selecao': estatisticas.get('selecao'),
+            'faq': estatisticas.get('faq', False)
+        }
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Erro inesperado: {e}")
+        logger.exception("❌ Erro inesperado: %s", e)
         raise HTTPException(status_code=500, detail=f'Erro interno inesperado: {str(e)}')
 
-if __name__ == "__main__":
-    print("🚀 Iniciando Vivi IA - Sistema RAG...")
-    print("🌐 Acesse: http://localhost:5001")
+async def sessao_da_requisicao(agente_atual, request):
+    """Sessão de conversa pedida na requisição, ou None
+
+    Um sessao_id desconhecido ou expirado responde 404 (X-Vivi-Sessao: expirada): o
+    cliente abre outra sessão em vez de continuar, sem saber, uma conversa vazia.
+    """
+    if not (request.sessao or request.sessao_id):
+        return None
+    sessao = await agente_atual.aobter_sessao(request.sessao_id)
+    if sessao is None:
+        raise HTTPException(status_code=404, detail='Sessão não encontrada ou expirada',
+                            headers={'X-Vivi-Sessao': 'expirada'})
+    return sessao
+
+async def turno_pronto(request, pergunta):
+    """Resposta pronta da pergunta (e a sessão, se pedida), ou (None, None)
+
+    Na sessão, a resposta pronta vira um turno; uma continuação depende da conversa e não a usa.
+    """
+    pronta = respostas_prontas.obter(pergunta, monitor.versao_indice)
+    if pronta is None or not (request.sessao or request.sessao_id):
+        return pronta, None
+    if not (agente_inicializado and agente):
+        # Sessões ficam no agente: enquanto ele aquece, a resposta sai sem sessão
+        return pronta, None
+    sessao = await sessao_da_requisicao(agente, request)
+    if sessao.continuacao(pergunta):
+        return None, None
+    agente.registrar_turno(sessao, pergunta, pergunta, pronta.resposta, [])
+    return pronta, sessao
+
+async def atualizar_respostas_prontas(agente_atual, versao):
+    """Recarrega o arquivo se outro worker o trocou (fora do event loop) e reconstrói se a versão mudou"""
+    await asyncio.to_thread(respostas_prontas.recarregar_se_mudou, True)
+    if respostas_prontas.precisa_reconstruir(versao):
+        await respostas_prontas.areconstruir(agente_atual, versao)
+
+def verificar_respostas_prontas(agente_atual, versao):
+    """Observador do monitor: atualiza as respostas prontas a cada verificação da versão do índice"""
+    global tarefa_respostas_prontas
+    if tarefa_respostas_prontas is not None and not tarefa_respostas_prontas.done():
+        return
+    tarefa_respostas_prontas = asyncio.create_task(atualizar_respostas_prontas(agente_atual, versao))
+
+monitor.observadores_versao.append(verificar_respostas_prontas)
+
+def resposta_com_etag(request, corpo, etag):
+    """Corpo já serializado com ETag e Cache-Control; 304 quando o cliente já tem a versão"""
+    cabecalhos = respostas_prontas.cabecalhos(etag)
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=corpo, media_type='application/json', headers=cabecalhos)
+
+@app.get("/api/respostas-prontas")
+async def listar_respostas_prontas(request: Request):
+    """Perguntas com resposta pronta e a versão do índice em que foram geradas"""
+    return resposta_com_etag(request, respostas_prontas.indice_json, respostas_prontas.indice_etag)
+
+@app.get("/api/respostas-prontas/resposta")
+async def obter_resposta_pronta(request: Request, pergunta: str):
+    """Resposta pronta de uma pergunta frequente (cacheável por navegadores e proxies)"""
+    pronta = respostas_prontas.obter(pergunta, monitor.versao_indice)
+    if pronta is None:
+        raise HTTPException(status_code=404, detail='Sem resposta pronta para esta pergunta')
+    return resposta_com_etag(request, pronta.json, pronta.etag)
+
+async def obter_recuperacao(agente_atual, recuperacao_id):
+    """Recuperação guardada pelo ID, ou 404 (expirada ou descartada)
+
+    Com VIVI_CACHE_BACKEND=memoria o ID só vale no worker que fez a busca (roteamento sticky).
+    """
+    try:
+        recuperacao = await agente_atual.aobter_recuperacao(recuperacao_id)
+    except FalhaEtapa as e:
+        raise erro_http_da_etapa(e)
+    if recuperacao is None:
+        raise HTTPException(status_code=404, detail='Recuperação não encontrada ou expirada; busque de novo')
+    return recuperacao
+
+@app.post("/api/etapas/recuperar", dependencies=[Depends(limitar_cliente)])
+async def etapa_recuperar(request: PerguntaRequest):
+    """Etapa 1: documentos selecionados para a pergunta, guardados por VIVI_RECUPERACAO_TTL segundos"""
+    pergunta = request.pergunta.strip()
+    if not pergunta:
+        raise HTTPException(status_code=400, detail='Pergunta não pode estar vazia')
+    agente_atual = obter_agente_pronto()
+    estatisticas = {}
+    try:
+        recuperacao = await agente_atual.aexecutar_recuperacao(pergunta, estatisticas)
+    except FalhaEtapa as e:
+        raise erro_http_da_etapa(e)
+    return {'success': True, **recuperacao.como_dict()}
+
+@app.post("/api/etapas/contexto")
+async def etapa_contexto(request: EtapaRequest, x_admin_token: str = Header(default=None)):
+    """Etapa 2 (depuração): contexto que seria enviado ao Gemini para uma recuperação"""
+    verificar_token_admin(x_admin_token)
+    agente_atual = obter_agente_pronto()
+    recuperacao = await obter_recuperacao(agente_atual, request.recuperacao_id)
+    montado = await agente_atual.amontar_contexto(recuperacao, (request.pergunta or '').strip() or None)
+    return {'success': True, **montado.como_dict()}
+
+@app.post("/api/etapas/gerar", dependencies=[Depends(limitar_cliente)])
+async def etapa_gerar(request: EtapaRequest):
+    """Etapas 2 a 4 sobre uma recuperação guardada: gerar de novo sem repetir embedding e busca"""
+    agente_atual = obter_agente_pronto()
+    recuperacao = await obter_recuperacao(agente_atual, request.recuperacao_id)
+    pergunta = (request.pergunta or '').strip() or recuperacao.pergunta
+    estatisticas = {}
+    try:
+        final = await agente_atual.aexecutar_geracao(recuperacao, pergunta, estatisticas)
+    except FalhaEtapa as e:
+        raise erro_http_da_etapa(e)
+    return {
+        'success': True,
+        'resposta': final.resposta,
+        'pergunta': final.pergunta,
+        'recuperacao_id': final.recuperacao_id,
+        'selecao': recuperacao.selecao,
+        'faq': recuperacao.faq
+    }
+
+def verificar_token_admin(token):
+    """Confere o token de administração; sem VIVI_ADMIN_TOKEN configurado, as rotas ficam fechadas"""
+    esperado = os.getenv('VIVI_ADMIN_TOKEN')
+    if not esperado:
+        raise HTTPException(status_code=403, detail='Administração desativada (VIVI_ADMIN_TOKEN não configurado)')
+    if not token or not hmac.compare_digest(token.encode('utf-8'), esperado.encode('utf-8')):
+        raise HTTPException(status_code=403, detail='Token de administração inválido')
+
+@app.get("/api/cache")
+async def cache_status():
+    """Estatísticas dos caches (respostas, embeddings, recuperações) e da coalescência de buscas idênticas"""
+    if not agente_inicializado or not agente:
+        raise HTTPException(status_code=503, detail='Agente não inicializado')
+    return {
+        'respostas': agente.cache_respostas.estatisticas(),
+        'embeddings': agente.cache_embeddings.estatisticas(),
+        'faq': agente.faq.estatisticas(),
+        'recuperacao': agente.cache_recuperacao.estatisticas(),
+        'sessoes': agente.sessoes.estatisticas(),
+        'respostas_prontas': respostas_prontas.estatisticas(),
+        'coalescencia': {tipo: coalescedor.resumo() for tipo, coalescedor in agente.coalescencia.items()}
+    }
+
+@app.delete("/api/sessoes/{sessao_id}")
+async def encerrar_sessao(sessao_id: str):
+    """Encerra a conversa (botão "Limpar" do chat); a próxima pergunta abre outra sessão"""
+    agente_atual = obter_agente_pronto()
+    return {'success': await agente_atual.aencerrar_sessao(sessao_id)}
+
+@app.post("/api/cache/invalidar")
+async def cache_invalidar(x_admin_token: str = Header(default=None)):
+    """Invalida o cache de respostas (usar após reingestão do índice Pinecone)"""
+    verificar_token_admin(x_admin_token)
+    if not agente_inicializado or not agente:
+        raise HTTPException(status_code=503, detail='Agente não inicializado')
+    await agente.ainvalidar_cache()
+    return {'success': True, 'versao': agente.cache_respostas.versao}
+
+def formatar_evento_sse(evento, dados):
+    """Formata um evento no padrão Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.post("/api/buscar/stream", dependencies=[Depends(limitar_cliente)])
+async def buscar_stream(request: PerguntaRequest):
+    """API de busca com a resposta enviada em partes via Server-Sent Events"""
+    pergunta = request.pergunta.strip()
+
+    if not pergunta:
+        raise HTTPException(status_code=400, detail='Pergunta não pode estar vazia')
+
+    logger.debug("🔍 Processando pergunta (stream): '%s'", pergunta)
+
+    pronta, sessao = await turno_pronto(request, pergunta)
+    if pronta is not None:
+        eventos_prontos = (
+            formatar_evento_sse('inicio', {'pergunta': pergunta, 'sessao_id': sessao.id if sessao else None})
+            + formatar_evento_sse('texto', {'texto': pronta.corpo})
+            + formatar_evento_sse('referencias', {'referencias': pronta.referencias, 'documentos': [], 'pronta': True})
+            + formatar_evento_sse('fim', {'success': True})
+        )
+        return Response(content=eventos_prontos, media_type="text/event-stream", headers={'Cache-Control': 'no-cache'})
+
+    agente_atual = obter_agente_pronto()
+
+    # Fila já cheia: 503 antes de abrir o stream (depois disso, só o evento de erro)
+    try:
+        agente_atual.admissao.verificar()
+    except Sobrecarga as e:
+        raise erro_http_da_etapa(e)
+
+    sessao = await sessao_da_requisicao(agente_atual, request)
+
+    async def eventos():
+        # Primeiro evento sai antes da busca para o navegador já receber bytes
+        yield formatar_evento_sse('inicio', {'pergunta': pergunta, 'sessao_id': sessao.id if sessao else None})
+        try:
+            async for evento, dados in agente_atual.aexecutar_busca_stream(pergunta, sessao=sessao):
+                yield formatar_evento_sse(evento, dados)
+            yield formatar_evento_sse('fim', {'success': True})
+        except Exception as e:
+            logger.error("❌ Erro no streaming: %s", e)
+            erro = {'success': False, 'error': f'Erro ao processar com IA: {str(e)}'}
+            if isinstance(e, Sobrecarga):
+                erro['retry_after'] = max(1, math.ceil(e.retry_after))
+            yield formatar_evento_sse('erro', erro)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.post("/api/buscar/lote", dependencies=[Depends(limitar_cliente)])
+async def buscar_lote(request: LoteRequest, x_admin_token: str = Header(default=None)):
+    """Várias perguntas de uma vez (avaliações e cargas offline), resultados em NDJSON
+
+    Só com o token de administração (cada lote pode custar milhares de chamadas pagas);
+    o limite por cliente também vale, contando um lote como uma requisição.
+    Cada linha é o resultado de uma pergunta, na ordem em que termina (campo 'indice'
+    aponta a posição original); a última linha traz o resumo do lote.
+    """
+    verificar_token_admin(x_admin_token)
+    perguntas = [pergunta.strip() for pergunta in request.perguntas]
+    maximo = int(os.getenv('VIVI_LOTE_MAX_PERGUNTAS', '1000'))
+    if not perguntas or any(not pergunta for pergunta in perguntas):
+        raise HTTPException(status_code=400, detail='Informe perguntas não vazias')
+    if len(perguntas) > maximo:
+        raise HTTPException(status_code=400, detail=f'No máximo {maximo} perguntas por lote')
+    max_geracoes = request.max_geracoes
+    if max_geracoes is not None and max_geracoes < 1:
+        raise HTTPException(status_code=400, detail='max_geracoes deve ser positivo')
+
+    logger.info(f"📦 Lote com {len(perguntas)} perguntas")
+    agente_atual = obter_agente_pronto()
+
+    async def linhas():
+        inicio = time.perf_counter()
+        sucessos = 0
+        async for resultado in agente_atual.aexecutar_lote(perguntas, max_geracoes):
+            sucessos += resultado['success']
+            yield json.dumps(resultado, ensure_ascii=False) + "\n"
+        resumo = {
+            'total': len(perguntas),
+            'sucessos': sucessos,
+            'falhas': len(perguntas) - sucessos,
+            'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1)
+        }
+        logger.info(f"📦 Lote concluído: {sucessos}/{len(perguntas)} em {resumo['duracao_ms']} ms")
+        yield json.dumps({'resumo': resumo}, ensure_ascii=False) + "\n"
 
-    # Verificar se o agente pode ser inicializado
-    if inicializar_agente():
-        print("✅ Vivi IA pronta para uso!")
-    else:
-        print("⚠️ Vivi IA com problemas de inicialização")
+    return StreamingResponse(
+        linhas(),
+        media_type="application/x-ndjson",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+if __name__ == "__main__":
+    # Desenvolvimento: um processo; em produção use servidor.py (vários workers)
+    logger.info("🚀 Iniciando Vivi IA - Sistema RAG...")
+    logger.info("🌐 Acesse: http://localhost:5001")
 
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5001)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Ponto de entrada de produção da Vivi IA
+Sobe o app FastAPI em vários workers (processos) do uvicorn. Cada worker abre a
+porta na hora e inicializa/aquece o agente em segundo plano; os caches de
+respostas e de embeddings são compartilhados via VIVI_CACHE_BACKEND (sqlite ou redis).
+
+Com mais de um worker, as métricas de cada um vão para VIVI_METRICAS_DIR (padrão:
+um diretório temporário) e o /metrics de qualquer worker responde pelo conjunto.
+
+Configuração: PORT, VIVI_HOST, WEB_CONCURRENCY (workers; padrão: núcleos disponíveis)
+"""
+
+import os
+import sys
+import glob
+import logging
+import tempfile
+
+import uvicorn
+from dotenv import load_dotenv
+
+# Adicionar o diretório pai ao path para importar os módulos do agente
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_estruturado import configurar_logging
+
+logger = logging.getLogger("vivi.servidor")
+
+
+def numero_de_workers():
+    """WEB_CONCURRENCY ou os núcleos disponíveis para o processo"""
+    configurado = os.getenv("WEB_CONCURRENCY")
+    if configurado:
+        return max(1, int(configurado))
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def preparar_metricas(workers):
+    """Diretório das métricas por worker, sem arquivos de execuções anteriores"""
+    diretorio = os.getenv("VIVI_METRICAS_DIR")
+    if not diretorio:
+        if workers == 1:
+            return
+        diretorio = tempfile.mkdtemp(prefix="vivi-metricas-")
+        # Herdado pelos processos dos workers
+        os.environ["VIVI_METRICAS_DIR"] = diretorio
+    os.makedirs(diretorio, exist_ok=True)
+    for arquivo in glob.glob(os.path.join(diretorio, "vivi-*.json")):
+        os.remove(arquivo)
+    logger.info(f"📈 Métricas dos workers em {diretorio}")
+
+
+def main():
+    load_dotenv()
+    configurar_logging()
+    workers = numero_de_workers()
+    porta = int(os.getenv("PORT", "5001"))
+
+    if workers > 1 and os.getenv("VIVI_CACHE_BACKEND", "memoria").lower() == "memoria":
+        logger.warning("⚠️ Vários workers com VIVI_CACHE_BACKEND=memoria: cada worker terá seus próprios caches")
+    preparar_metricas(workers)
+    logger.info(f"🚀 Iniciando Vivi IA com {workers} workers na porta {porta}")
+
+    uvicorn.run(
+        "app_fastapi:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=os.getenv("VIVI_HOST", "0.0.0.0"),
+        port=porta,
+        workers=workers,
+        log_level="warning",
+        timeout_graceful_shutdown=30
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,57 @@ const btnTentarNovamente = document.getElementById('btn-tentar-novamente');
 // Variáveis de estado
 let ultimaResposta = '';
 let perguntaAtual = '';
+// Sessão de conversa no servidor: perguntas seguintes continuam o assunto
+let sessaoId = null;
+
+// Servidor acordando (instância recém-iniciada): novas tentativas antes de mostrar erro
+const MAX_TENTATIVAS_AQUECIMENTO = 6;
+
+class ServidorAquecendo extends Error {
+    constructor(retryAfter) {
+        super('Vivi IA está iniciando');
+        this.retryAfter = retryAfter;
+    }
+}
+
+function verificarAquecimento(response) {
+    if (response.status === 503 && response.headers.get('X-Vivi-Estado') === 'aquecendo') {
+        const segundos = parseInt(response.headers.get('Retry-After') || '5', 10);
+        throw new ServidorAquecendo(Number.isNaN(segundos) ? 5 : segundos);
+    }
+}
+
+// Sessão expirada (ou encerrada): a conversa recomeça em uma sessão nova
+function sessaoExpirada(response) {
+    if (response.status === 404 && sessaoId && response.headers.get('X-Vivi-Sessao') === 'expirada') {
+        sessaoId = null;
+        return true;
+    }
+    return false;
+}
+
+// Limite por cliente (429) ou fila do servidor cheia (503): não insistir nem cair na API tradicional
+class ServidorSobrecarregado extends Error {
+    constructor(retryAfter) {
+        super('Vivi IA sobrecarregada');
+        this.retryAfter = retryAfter;
+    }
+}
+
+function verificarSobrecarga(response) {
+    if (response.status === 429 || response.status === 503) {
+        const segundos = parseInt(response.headers.get('Retry-After') || '5', 10);
+        throw new ServidorSobrecarregado(Number.isNaN(segundos) ? 5 : segundos);
+    }
+}
+
+function mensagemSobrecarga(segundos) {
+    return `Muitas consultas no momento. Tente novamente em ${segundos} segundos.`;
+}
+
+function esperar(segundos) {
+    return new Promise(resolve => setTimeout(resolve, segundos * 1000));
+}
 
 // Função para mostrar loading
 function mostrarLoading() {
@@ -129,8 +180,18 @@ function novaConsulta() {
     perguntaInput.focus();
 }
 
-// Função para limpar chat
+// Corpo das requisições de busca (abre a sessão na primeira pergunta)
+function corpoDaPergunta(pergunta) {
+    return { pergunta: pergunta, sessao: true, sessao_id: sessaoId };
+}
+
+// Função para limpar chat (encerra a conversa: a próxima pergunta abre outra sessão)
 function limparChat() {
+    if (sessaoId) {
+        fetch(`/api/sessoes/${encodeURIComponent(sessaoId)}`, { method: 'DELETE' }).catch(() => {});
+        sessaoId = null;
+    }
+
     // Limpar input
     perguntaInput.value = '';
     
@@ -171,10 +232,14 @@ async function fazerBusca(pergunta) {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ pergunta: pergunta })
+            body: JSON.stringify(corpoDaPergunta(pergunta))
         });
+        if (sessaoExpirada(response)) {
+            return fazerBusca(pergunta);
+        }
 
         const data = await response.json();
+        if (data.sessao_id) sessaoId = data.sessao_id;
         return data;
     } catch (error) {
         console.error('Erro na requisição:', error);
@@ -182,6 +247,78 @@ async function fazerBusca(pergunta) {
     }
 }
 
+// Função para montar o texto final com a seção de referências
+function montarRespostaComReferencias(texto, referencias) {
+    if (!referencias || referencias.length === 0) {
+        return texto;
+    }
+    const lista = referencias.map(ref => `- ${ref}`).join('\n');
+    return `${texto.trimEnd()}\n\n**Referências:**\n${lista}`;
+}
+
+// Função para fazer busca em streaming (Server-Sent Events)
+async function fazerBuscaStream(pergunta, aoReceberTexto) {
+    const response = await fetch('/api/buscar/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(corpoDaPergunta(pergunta))
+    });
+    if (sessaoExpirada(response)) {
+        return fazerBuscaStream(pergunta, aoReceberTexto);
+    }
+
+    verificarAquecimento(response);
+    verificarSobrecarga(response);
+    if (!response.ok || !response.body) {
+        throw new Error(`Streaming indisponível (${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let texto = '';
+    let referencias = [];
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Eventos SSE são separados por uma linha em branco
+        let separador;
+        while ((separador = buffer.indexOf('\n\n')) !== -1) {
+            const bloco = buffer.slice(0, separador);
+            buffer = buffer.slice(separador + 2);
+
+            let evento = 'message';
+            let dados = '';
+            for (const linha of bloco.split('\n')) {
+                if (linha.startsWith('event: ')) evento = linha.slice(7);
+                else if (linha.startsWith('data: ')) dados += linha.slice(6);
+            }
+            const payload = dados ? JSON.parse(dados) : {};
+
+            if (evento === 'inicio') {
+                if (payload.sessao_id) sessaoId = payload.sessao_id;
+            } else if (evento === 'texto') {
+                texto += payload.texto;
+                aoReceberTexto(texto);
+            } else if (evento === 'referencias') {
+                referencias = payload.referencias || [];
+            } else if (evento === 'erro') {
+                if (payload.retry_after && !texto) {
+                    throw new ServidorSobrecarregado(payload.retry_after);
+                }
+                return { success: false, error: payload.error, parcial: texto };
+            }
+        }
+    }
+
+    return { success: true, resposta: montarRespostaComReferencias(texto, referencias), pergunta: pergunta };
+}
+
 // Função para enviar pergunta
 async function enviarPergunta() {
     const pergunta = perguntaInput.value.trim();
@@ -197,20 +334,67 @@ async function enviarPergunta() {
     // Mostrar loading
     mostrarLoading();
     
+    let recebeuTexto = false;
+
     try {
-        // Fazer busca
-        const resposta = await fazerBusca(pergunta);
-        
-        // Esconder loading
+        // Renderizar a resposta conforme as partes chegam
+        const aoReceberTexto = (textoParcial) => {
+            if (!recebeuTexto) {
+                recebeuTexto = true;
+                esconderLoading();
+                mostrarResultados();
+            }
+            respostaCompleta.innerHTML = md.render(textoParcial);
+        };
+
+        let resposta;
+        for (let tentativa = 1; ; tentativa++) {
+            try {
+                resposta = await fazerBuscaStream(pergunta, aoReceberTexto);
+                break;
+            } catch (error) {
+                if (!(error instanceof ServidorAquecendo) || tentativa >= MAX_TENTATIVAS_AQUECIMENTO) {
+                    throw error;
+                }
+                console.info(`Vivi IA iniciando; nova tentativa em ${error.retryAfter}s`);
+                await esperar(error.retryAfter);
+            }
+        }
+
         esconderLoading();
-        
-        // Processar resposta
         await processarResposta(resposta);
-        
+
     } catch (error) {
-        console.error('Erro:', error);
-        esconderLoading();
-        mostrarErro('Erro interno do sistema');
+        console.error('Erro no streaming:', error);
+
+        if (error instanceof ServidorAquecendo) {
+            esconderLoading();
+            mostrarErro('A Vivi IA ainda está iniciando. Tente novamente em alguns segundos.');
+            return;
+        }
+
+        if (error instanceof ServidorSobrecarregado) {
+            esconderLoading();
+            mostrarErro(mensagemSobrecarga(error.retryAfter));
+            return;
+        }
+
+        if (recebeuTexto) {
+            esconderLoading();
+            mostrarErro('Conexão interrompida durante a resposta');
+            return;
+        }
+
+        try {
+            // Sem streaming: usar a API tradicional
+            const resposta = await fazerBusca(pergunta);
+            esconderLoading();
+            await processarResposta(resposta);
+        } catch (fallbackError) {
+            console.error('Erro:', fallbackError);
+            esconderLoading();
+            mostrarErro('Erro interno do sistema');
+        }
     }
 }
 
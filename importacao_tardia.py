@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Importação tardia dos SDKs pesados (google.generativeai, pinecone)
+O módulo só é importado no primeiro acesso a um atributo, então importar o
+agente (e o servidor) não paga o custo de carregar os SDKs.
+"""
+
+import importlib
+import threading
+
+
+class ModuloTardio:
+    """Representa um módulo que será importado no primeiro uso
+
+    Atribuições (ex.: substituir uma classe em testes) vão para o módulo real.
+    """
+
+    def __init__(self, nome):
+        object.__setattr__(self, '_nome', nome)
+        object.__setattr__(self, '_modulo', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _carregar(self):
+        modulo = self._modulo
+        if modulo is None:
+            with self._lock:
+                modulo = self._modulo
+                if modulo is None:
+                    modulo = importlib.import_module(self._nome)
+                    object.__setattr__(self, '_modulo', modulo)
+        return modulo
+
+    def carregado(self):
+        return self._modulo is not None
+
+    def substituir(self, modulo):
+        """Usa outro objeto no lugar do módulo (ex.: SDK falso dos benchmarks), sem importar o real"""
+        object.__setattr__(self, '_modulo', modulo)
+
+    def __getattr__(self, atributo):
+        return getattr(self._carregar(), atributo)
+
+    def __setattr__(self, atributo, valor):
+        setattr(self._carregar(), atributo, valor)
+
+    def __repr__(self):
+        estado = "carregado" if self.carregado() else "não carregado"
+        return f"<ModuloTardio {self._nome} ({estado})>"
+
+
+genai = ModuloTardio("google.generativeai")
+pinecone = ModuloTardio("pinecone")
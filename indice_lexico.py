@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Índice léxico BM25 da Vivi IA
+Índice invertido em memória sobre o texto e o título dos mesmos documentos
+do índice vetorial, para acertar códigos exatos (bancos, rubricas, normativos)
+que a busca densa costuma perder.
+Fonte: arquivo JSONL {"id": ..., "metadata": {...}} (o metadados.jsonl do índice local)
+"""
+
+import logging
+import re
+import json
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+from indice_local import Documento
+
+logger = logging.getLogger("vivi.indice_lexico")
+
+# Códigos com pontuação interna ("14.133/2021", "00.394.460/0001-41") viram um termo inteiro
+PADRAO_CODIGO = re.compile(r'\d+(?:[./-]\d+)+')
+PADRAO_PALAVRA = re.compile(r'\w+')
+
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'de', 'do', 'da', 'dos', 'das', 'em', 'no', 'na',
+    'nos', 'nas', 'por', 'para', 'com', 'e', 'ou', 'que', 'se', 'como', 'ao', 'aos', 'qual', 'quais'
+}
+
+
+def tokenizar(texto):
+    """Termos sem acento e em minúsculas; códigos numéricos mantidos inteiros e em partes"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    termos = PADRAO_CODIGO.findall(texto)
+    termos.extend(t for t in PADRAO_PALAVRA.findall(texto) if t not in STOPWORDS)
+    return termos
+
+
+class IndiceBM25:
+    """BM25 (Okapi) sobre um índice invertido em memória"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.metadados = []
+        self.tamanhos = []
+        self.postings = defaultdict(list)  # termo → [(documento, frequência)]
+        self.media_tamanho = 0.0
+
+    @classmethod
+    def de_jsonl(cls, caminho):
+        """Constrói o índice a partir de um JSONL {"id", "metadata"}"""
+        indice = cls()
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                registro = json.loads(linha)
+                indice.adicionar(registro['id'], registro.get('metadata', {}))
+        indice.finalizar()
+        logger.info(f"🔤 Índice léxico BM25 carregado: {len(indice.ids)} documentos, {len(indice.postings)} termos")
+        return indice
+
+    def adicionar(self, doc_id, metadata):
+        texto = metadata.get('text') or metadata.get('content') or metadata.get('chunk_text') or ''
+        titulo = metadata.get('document_title') or metadata.get('source') or ''
+        termos = tokenizar(f"{titulo} {texto}")
+        posicao = len(self.ids)
+        self.ids.append(doc_id)
+        self.metadados.append(metadata)
+        self.tamanhos.append(len(termos))
+        for termo, frequencia in Counter(termos).items():
+            self.postings[termo].append((posicao, frequencia))
+
+    def finalizar(self):
+        self.media_tamanho = (sum(self.tamanhos) / len(self.tamanhos)) if self.tamanhos else 0.0
+
+    def buscar(self, pergunta, top_k=10):
+        """Top-k Documentos por BM25"""
+        if not self.ids:
+            return []
+        total = len(self.ids)
+        pontuacoes = defaultdict(float)
+        for termo in set(tokenizar(pergunta)):
+            postings = self.postings.get(termo)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for posicao, frequencia in postings:
+                normalizacao = self.k1 * (1 - self.b + self.b * self.tamanhos[posicao] / self.media_tamanho)
+                pontuacoes[posicao] += idf * frequencia * (self.k1 + 1) / (frequencia + normalizacao)
+
+        melhores = sorted(pontuacoes.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [Documento(self.ids[p], pontuacao, self.metadados[p]) for p, pontuacao in melhores]
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Índice vetorial local da Vivi IA (NumPy + mmap)
+Vetores normalizados em uma matriz float16/float32 mapeada em memória
+(vetores.npy), metadados em arquivo lateral (metadados.jsonl) e, opcionalmente,
+listas IVF (ivf.npz) para corpora maiores. versao.txt guarda a versão do índice
+Pinecone exportado (marcador gravado pela ingestão).
+
+Uso:
+    # Exportar o índice Pinecone atual para um diretório local
+    python indice_local.py exportar indice_local/ --ivf 64
+"""
+
+import os
+import logging
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+logger = logging.getLogger("vivi.indice_local")
+
+ARQUIVO_VETORES = "vetores.npy"
+ARQUIVO_METADADOS = "metadados.jsonl"
+ARQUIVO_IVF = "ivf.npz"
+ARQUIVO_VERSAO = "versao.txt"
+
+# Linhas processadas por bloco na busca exata (float16 → float32 por bloco)
+BLOCO = 8192
+
+
+class Documento:
+    """Resultado no mesmo formato dos matches do Pinecone (id, score, metadata)"""
+    __slots__ = ('id', 'score', 'metadata')
+
+    def __init__(self, id, score, metadata):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"Documento(id={self.id!r}, score={self.score:.4f})"
+
+
+def _normalizar_linhas(matriz):
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def _kmeans(matriz, k, iteracoes=20, semente=0):
+    """k-means esférico simples para os centróides do IVF"""
+    gerador = np.random.default_rng(semente)
+    centroides = matriz[gerador.choice(len(matriz), size=k, replace=False)].astype(np.float32)
+    for _ in range(iteracoes):
+        atribuicao = np.argmax(matriz @ centroides.T, axis=1)
+        for lista in range(k):
+            membros = matriz[atribuicao == lista]
+            if len(membros):
+                centroides[lista] = membros.mean(axis=0)
+        centroides = _normalizar_linhas(centroides)
+    return centroides, np.argmax(matriz @ centroides.T, axis=1)
+
+
+class IndiceLocal:
+    """Busca top-k exata (ou IVF) por produto interno sobre vetores normalizados"""
+
+    def __init__(self, diretorio, nprobe=None):
+        self.diretorio = diretorio
+        self.vetores = np.load(os.path.join(diretorio, ARQUIVO_VETORES), mmap_mode='r')
+        self.ids, self.metadados = [], []
+        with open(os.path.join(diretorio, ARQUIVO_METADADOS), encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                registro = json.loads(linha)
+                self.ids.append(registro['id'])
+                self.metadados.append(registro.get('metadata', {}))
+        self._posicao = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        # Versão do índice de origem (marcador da ingestão), gravada na exportação
+        self.versao = None
+        caminho_versao = os.path.join(diretorio, ARQUIVO_VERSAO)
+        if os.path.exists(caminho_versao):
+            with open(caminho_versao, encoding='utf-8') as arquivo:
+                self.versao = arquivo.read().strip() or None
+
+        self.centroides = None
+        caminho_ivf = os.path.join(diretorio, ARQUIVO_IVF)
+        if os.path.exists(caminho_ivf):
+            ivf = np.load(caminho_ivf)
+            self.centroides = ivf['centroides']
+            self.ordem = ivf['ordem']
+            self.inicios = ivf['inicios']
+        self.nprobe = nprobe or int(os.getenv("VIVI_INDICE_LOCAL_NPROBE", "8"))
+
+        logger.info(f"📂 Índice local carregado: {len(self.ids)} vetores ({self.vetores.dtype}"
+                    f"{', IVF' if self.centroides is not None else ''})")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _pontuar(self, consulta, linhas=None):
+        """Produto interno da consulta com todas as linhas (ou só com as indicadas)"""
+        if linhas is not None:
+            return np.asarray(self.vetores[linhas], dtype=np.float32) @ consulta
+        pontuacoes = np.empty(len(self.vetores), dtype=np.float32)
+        for inicio in range(0, len(self.vetores), BLOCO):
+            bloco = np.asarray(self.vetores[inicio:inicio + BLOCO], dtype=np.float32)
+            pontuacoes[inicio:inicio + BLOCO] = bloco @ consulta
+        return pontuacoes
+
+    def buscar(self, vetor, top_k=10, exata=False):
+        """Retorna os top_k Documentos mais similares ao vetor"""
+        if not len(self.ids):
+            return []
+        consulta = np.asarray(vetor, dtype=np.float32)
+        norma = float(np.linalg.norm(consulta))
+        if norma == 0.0:
+            return []
+        consulta = consulta / norma
+
+        linhas = None
+        if self.centroides is not None and not exata:
+            listas = np.argsort(-(self.centroides @ consulta))[:self.nprobe]
+            linhas = np.sort(np.concatenate([
+                self.ordem[self.inicios[lista]:self.inicios[lista + 1]] for lista in listas
+            ]))
+
+        pontuacoes = self._pontuar(consulta, linhas)
+        k = min(top_k, len(pontuacoes))
+        if k == 0:
+            return []
+        melhores = np.argpartition(-pontuacoes, k - 1)[:k]
+        melhores = melhores[np.argsort(-pontuacoes[melhores])]
+        if linhas is not None:
+            posicoes = linhas[melhores]
+        else:
+            posicoes = melhores
+        return [
+            Documento(self.ids[p], float(pontuacoes[m]), self.metadados[p])
+            for p, m in zip(posicoes, melhores)
+        ]
+
+    def buscar_por_ids(self, ids):
+        """Documentos pelos IDs (score 1.0), na ordem pedida; ignora IDs ausentes"""
+        return [
+            Documento(doc_id, 1.0, self.metadados[self._posicao[doc_id]])
+            for doc_id in ids if doc_id in self._posicao
+        ]
+
+    @staticmethod
+    def construir(diretorio, ids, vetores, metadados, dtype="float16", listas_ivf=0, versao=None):
+        """Grava um índice local a partir de IDs, vetores e metadados (versão padrão: momento da gravação)"""
+        os.makedirs(diretorio, exist_ok=True)
+        with open(os.path.join(diretorio, ARQUIVO_VERSAO), 'w', encoding='utf-8') as arquivo:
+            arquivo.write(versao or f"local-{time.strftime('%Y%m%dT%H%M%S')}")
+        matriz = _normalizar_linhas(np.asarray(vetores, dtype=np.float32))
+        np.save(os.path.join(diretorio, ARQUIVO_VETORES), matriz.astype(dtype))
+
+        with open(os.path.join(diretorio, ARQUIVO_METADADOS), 'w', encoding='utf-8') as arquivo:
+            for doc_id, metadata in zip(ids, metadados):
+                arquivo.write(json.dumps({'id': doc_id, 'metadata': metadata}, ensure_ascii=False) + '\n')
+
+        caminho_ivf = os.path.join(diretorio, ARQUIVO_IVF)
+        if listas_ivf and len(matriz) > listas_ivf:
+            centroides, atribuicao = _kmeans(matriz, listas_ivf)
+            ordem = np.argsort(atribuicao, kind='stable').astype(np.int64)
+            contagens = np.bincount(atribuicao, minlength=listas_ivf)
+            inicios = np.concatenate([[0], np.cumsum(contagens)]).astype(np.int64)
+            np.savez(caminho_ivf, centroides=centroides, ordem=ordem, inicios=inicios)
+        elif os.path.exists(caminho_ivf):
+            os.remove(caminho_ivf)
+
+        print(f"💾 Índice local gravado em {diretorio}: {len(ids)} vetores ({dtype})")
+
+
+def exportar_do_pinecone(index, diretorio, namespace="", dtype="float16", listas_ivf=0):
+    """Copia todos os vetores e metadados do índice Pinecone para um índice local"""
+    from recuperadores import ler_marcador_versao
+    versao = ler_marcador_versao(index)
+    ids, vetores, metadados = [], [], []
+    for pagina in index.list(namespace=namespace):
+        resposta = index.fetch(ids=list(pagina), namespace=namespace)
+        for doc_id, vetor in resposta.vectors.items():
+            ids.append(doc_id)
+            vetores.append(vetor.values)
+            metadados.append(dict(vetor.metadata or {}))
+        print(f"📥 {len(ids)} vetores exportados...")
+    IndiceLocal.construir(diretorio, ids, vetores, metadados, dtype=dtype, listas_ivf=listas_ivf, versao=versao)
+    return len(ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice vetorial local da Vivi IA")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    exportar = sub.add_parser('exportar', help="Exporta o índice Pinecone para um diretório local")
+    exportar.add_argument('diretorio')
+    exportar.add_argument('--namespace', default="")
+    exportar.add_argument('--dtype', choices=('float16', 'float32'), default='float16')
+    exportar.add_argument('--ivf', type=int, default=0, help="Número de listas IVF (0 = só busca exata)")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from pinecone import Pinecone
+    load_dotenv()
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index = pc.Index(os.getenv("PINECONE_INDEX", "vivi-ia-base"))
+    exportar_do_pinecone(index, args.diretorio, args.namespace, args.dtype, args.ivf)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Ingestão offline de documentos no índice da Vivi IA
+Fluxo: Arquivos → Documentos (chunks) → Normalização → Embeddings em lote → Upsert paralelo
+
+Toda a limpeza (glifos, espaços, correções de termos) e a padronização dos
+metadados são feitas aqui, uma única vez; a busca usa o texto como está.
+Cada documento tem como ID o hash do seu conteúdo, então reexecutar é
+idempotente, e um arquivo de estado local permite retomar uma ingestão
+interrompida. O estado guarda também os trechos de cada fonte: ao reingerir
+uma fonte editada, os trechos que ela deixou de ter são apagados do índice.
+Ao fim de uma ingestão que mudou o índice, um marcador com a nova versão é
+gravado; o servidor troca caches e respostas prontas só quando ele muda.
+
+Uso:
+    python ingestao.py documentos/ --paralelo 4
+    python ingestao.py normas.jsonl --tamanho 1500 --sobreposicao 200
+    python ingestao.py --marcar-versao    # só grava o marcador (índice já existente)
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from corretor_texto import MotorCorrecoes
+from agente_busca_gemini import MODELO_EMBEDDING, EMBED_LOTE_MAX, EMBED_PASSAGEM, ESQUEMA_METADADOS
+from recuperadores import gravar_marcador_versao
+
+EXTENSOES = ('.txt', '.md', '.jsonl', '.pdf')
+UPSERT_LOTE = 50
+# A API do Pinecone aceita até 1000 IDs por delete
+REMOCAO_LOTE = 1000
+# Dimensão do llama-text-embed-v2, se o índice não informar a sua
+DIMENSAO_PADRAO = 1024
+RODADA = 500
+
+
+def hash_conteudo(titulo, texto):
+    """ID estável do documento: hash do título + texto normalizado"""
+    return hashlib.sha256(f"{titulo}\x00{texto}".encode('utf-8')).hexdigest()[:32]
+
+
+def listar_arquivos(caminhos):
+    """Expande diretórios e filtra as extensões suportadas"""
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for raiz, _, nomes in os.walk(caminho):
+                for nome in sorted(nomes):
+                    if nome.lower().endswith(EXTENSOES):
+                        yield os.path.join(raiz, nome)
+        elif caminho.lower().endswith(EXTENSOES):
+            yield caminho
+        else:
+            print(f"⚠️ Ignorando {caminho} (extensão não suportada)")
+
+
+def ler_fonte(caminho):
+    """Produz (título, texto) de cada documento de origem"""
+    titulo_padrao = os.path.splitext(os.path.basename(caminho))[0]
+
+    if caminho.lower().endswith('.jsonl'):
+        # Exportações antigas: mesmos campos alternativos que a busca aceitava
+        with open(caminho, encoding='utf-8') as arquivo:
+            for numero, linha in enumerate(arquivo, 1):
+                if not linha.strip():
+                    continue
+                registro = json.loads(linha)
+                metadata = registro.get('metadata', registro)
+                texto = metadata.get('text') or metadata.get('content') or metadata.get('chunk_text') or ''
+                titulo = metadata.get('document_title') or metadata.get('source') or f"{titulo_padrao} {numero}"
+                if texto:
+                    yield titulo, texto
+        return
+
+    if caminho.lower().endswith('.pdf'):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print(f"⚠️ Ignorando {caminho}: instale 'pypdf' para ler PDFs")
+            return
+        leitor = PdfReader(caminho)
+        yield titulo_padrao, '\n\n'.join(pagina.extract_text() or '' for pagina in leitor.pages)
+        return
+
+    with open(caminho, encoding='utf-8') as arquivo:
+        yield titulo_padrao, arquivo.read()
+
+
+def dividir_em_documentos(texto, tamanho=1500, sobreposicao=200):
+    """Divide o texto em trechos de até `tamanho` caracteres, por parágrafos, com sobreposição"""
+    paragrafos = [p.strip() for p in texto.split('\n\n') if p.strip()]
+
+    # Parágrafos maiores que o tamanho são quebrados por palavras
+    pedacos = []
+    for paragrafo in paragrafos:
+        while len(paragrafo) > tamanho:
+            corte = paragrafo.rfind(' ', 0, tamanho)
+            corte = corte if corte > 0 else tamanho
+            pedacos.append(paragrafo[:corte])
+            paragrafo = paragrafo[corte:].strip()
+        if paragrafo:
+            pedacos.append(paragrafo)
+
+    trechos, atual = [], ''
+    for pedaco in pedacos:
+        if atual and len(atual) + len(pedaco) + 2 > tamanho:
+            trechos.append(atual)
+            # Sobreposição: fim do trecho anterior, começando em uma palavra inteira
+            cauda = atual[-sobreposicao:] if sobreposicao else ''
+            if ' ' in cauda:
+                cauda = cauda[cauda.index(' ') + 1:]
+            if len(cauda) + len(pedaco) + 2 > tamanho:
+                cauda = ''
+            atual = f"{cauda}\n\n{pedaco}" if cauda else pedaco
+        else:
+            atual = f"{atual}\n\n{pedaco}" if atual else pedaco
+    if atual:
+        trechos.append(atual)
+    return trechos
+
+
+class EstadoIngestao:
+    """IDs já enviados ao índice e trechos de cada fonte (arquivo SQLite local)
+
+    `ingeridos` permite retomar sem reenviar; `trechos` (fonte, id) diz quais
+    IDs cada fonte produziu na última ingestão, para apagar os que sumirem.
+    """
+
+    def __init__(self, caminho):
+        self._db = sqlite3.connect(caminho)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingeridos (id TEXT PRIMARY KEY, fonte TEXT, ingerido_em REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS trechos (fonte TEXT, id TEXT, PRIMARY KEY (fonte, id))"
+        )
+        self._db.commit()
+
+    def _consultar_ids(self, consulta, ids):
+        """Linhas de `consulta` (com {marcadores}) para os IDs, em blocos de 500"""
+        ids = list(ids)
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            yield from self._db.execute(consulta.format(marcadores=','.join('?' * len(lote))), lote)
+
+    def ja_ingeridos(self, ids):
+        return {linha[0] for linha in self._consultar_ids("SELECT id FROM ingeridos WHERE id IN ({marcadores})", ids)}
+
+    def trechos_da_fonte(self, fonte):
+        """IDs registrados para a fonte (inclui os de estados anteriores à tabela de trechos)"""
+        ids = {linha[0] for linha in self._db.execute("SELECT id FROM trechos WHERE fonte = ?", (fonte,))}
+        ids.update(linha[0] for linha in self._db.execute("SELECT id FROM ingeridos WHERE fonte = ?", (fonte,)))
+        return ids
+
+    def em_outras_fontes(self, ids, fontes):
+        """IDs que ainda pertencem a alguma fonte fora de `fontes`"""
+        return {
+            doc_id for doc_id, fonte in self._consultar_ids(
+                "SELECT id, fonte FROM trechos WHERE id IN ({marcadores})", ids
+            ) if fonte not in fontes
+        }
+
+    def substituir_trechos(self, por_fonte, removidos):
+        """Grava os trechos atuais de cada fonte e esquece os IDs apagados do índice"""
+        with self._db:
+            for fonte, ids in por_fonte.items():
+                self._db.execute("DELETE FROM trechos WHERE fonte = ?", (fonte,))
+                self._db.executemany("INSERT INTO trechos (fonte, id) VALUES (?, ?)", [(fonte, i) for i in ids])
+            removidos = list(removidos)
+            for inicio in range(0, len(removidos), 500):
+                lote = removidos[inicio:inicio + 500]
+                self._db.execute(f"DELETE FROM ingeridos WHERE id IN ({','.join('?' * len(lote))})", lote)
+
+    def registrar(self, documentos):
+        agora = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO ingeridos (id, fonte, ingerido_em) VALUES (?, ?, ?)",
+            [(doc['id'], doc['metadata']['source'], agora) for doc in documentos]
+        )
+        self._db.commit()
+
+
+def preparar_documentos(caminhos, tamanho, sobreposicao, corretor, por_fonte=None):
+    """Lê, divide e normaliza; retorna documentos com ID e metadados canônicos
+
+    Se `por_fonte` for um dict, recebe {arquivo: IDs de todos os seus trechos},
+    inclusive os repetidos de outra fonte (que só entram uma vez na lista).
+    """
+    documentos, vistos = [], set()
+    for caminho in listar_arquivos(caminhos):
+        ids_da_fonte = por_fonte.setdefault(caminho, set()) if por_fonte is not None else set()
+        for titulo, texto in ler_fonte(caminho):
+            titulo = corretor.limpar(titulo)
+            for posicao, trecho in enumerate(dividir_em_documentos(texto, tamanho, sobreposicao)):
+                conteudo = corretor.limpar(trecho)
+                if not conteudo:
+                    continue
+                doc_id = hash_conteudo(titulo, conteudo)
+                ids_da_fonte.add(doc_id)
+                if doc_id in vistos:
+                    continue
+                vistos.add(doc_id)
+                documentos.append({
+                    'id': doc_id,
+                    'metadata': {
+                        'text': conteudo,
+                        'document_title': titulo,
+                        'source': caminho,
+                        'posicao': posicao,
+                        'esquema': ESQUEMA_METADADOS
+                    }
+                })
+    return documentos
+
+
+def gerar_embeddings_em_lote(pc, documentos, tamanho_lote):
+    """Embeddings do tipo 'passage', até tamanho_lote entradas por chamada"""
+    for inicio in range(0, len(documentos), tamanho_lote):
+        lote = documentos[inicio:inicio + tamanho_lote]
+        resposta = pc.inference.embed(
+            model=MODELO_EMBEDDING,
+            inputs=[doc['metadata']['text'] for doc in lote],
+            parameters={"input_type": EMBED_PASSAGEM, "truncate": "END"}
+        )
+        for doc, item in zip(lote, resposta.data):
+            doc['values'] = item['values']
+        print(f"🧮 Embeddings: {min(inicio + tamanho_lote, len(documentos))}/{len(documentos)} nesta rodada")
+
+
+def enviar_em_paralelo(index, documentos, estado, paralelo, namespace=""):
+    """Upsert em lotes paralelos; cada lote concluído é registrado no estado"""
+    lotes = [documentos[i:i + UPSERT_LOTE] for i in range(0, len(documentos), UPSERT_LOTE)]
+    enviados, falhas = 0, 0
+
+    def enviar(lote):
+        index.upsert(
+            vectors=[{'id': d['id'], 'values': d['values'], 'metadata': d['metadata']} for d in lote],
+            namespace=namespace
+        )
+        return lote
+
+    with ThreadPoolExecutor(max_workers=paralelo) as executor:
+        futuros = [executor.submit(enviar, lote) for lote in lotes]
+        for futuro in as_completed(futuros):
+            try:
+                lote = futuro.result()
+            except Exception as e:
+                falhas += 1
+                print(f"❌ Falha no upsert de um lote: {e}")
+                continue
+            estado.registrar(lote)
+            enviados += len(lote)
+            print(f"📤 Enviados: {enviados}/{len(documentos)} nesta rodada")
+    return enviados, falhas
+
+
+def trechos_obsoletos(estado, por_fonte):
+    """IDs que as fontes reingeridas deixaram de ter e que nenhuma outra fonte usa"""
+    atuais = set().union(*por_fonte.values()) if por_fonte else set()
+    obsoletos = set()
+    for fonte, ids in por_fonte.items():
+        obsoletos |= estado.trechos_da_fonte(fonte) - ids
+    obsoletos -= atuais
+    return obsoletos - estado.em_outras_fontes(obsoletos, por_fonte)
+
+
+def remover_obsoletos(index, estado, por_fonte, namespace=""):
+    """Apaga do índice os trechos obsoletos e atualiza o estado; retorna quantos foram apagados
+
+    O estado só muda depois do delete: uma falha no meio é refeita na próxima execução.
+    """
+    obsoletos = sorted(trechos_obsoletos(estado, por_fonte))
+    for inicio in range(0, len(obsoletos), REMOCAO_LOTE):
+        index.delete(ids=obsoletos[inicio:inicio + REMOCAO_LOTE], namespace=namespace)
+    estado.substituir_trechos(por_fonte, obsoletos)
+    if obsoletos:
+        print(f"🗑️ {len(obsoletos)} trechos que não existem mais nas fontes apagados do índice")
+    return len(obsoletos)
+
+
+def marcar_versao(index):
+    """Grava o marcador de uma nova versão do índice (lido pelo monitor do servidor); retorna a versão"""
+    estatisticas = index.describe_index_stats()
+    dimensao = getattr(estatisticas, 'dimension', None)
+    if dimensao is None and isinstance(estatisticas, dict):
+        dimensao = estatisticas.get('dimension')
+    versao = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+    gravar_marcador_versao(index, versao, dimensao or DIMENSAO_PADRAO)
+    print(f"🏷️ Nova versão do índice: {versao}")
+    return versao
+
+
+def notificar_reingestao(url, token=None):
+    """Pede ao servidor para invalidar o cache de respostas"""
+    requisicao = urllib.request.Request(url, method='POST', data=b'')
+    if token:
+        requisicao.add_header('X-Admin-Token', token)
+    try:
+        with urllib.request.urlopen(requisicao, timeout=10) as resposta:
+            print(f"🧹 Cache do servidor invalidado ({resposta.status})")
+    except Exception as e:
+        print(f"⚠️ Não foi possível invalidar o cache do servidor: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão de documentos no índice da Vivi IA")
+    parser.add_argument('caminhos', nargs='*', help="Arquivos ou diretórios (.txt, .md, .jsonl, .pdf)")
+    parser.add_argument('--tamanho', type=int, default=1500, help="Tamanho máximo de cada documento (caracteres)")
+    parser.add_argument('--sobreposicao', type=int, default=200, help="Sobreposição entre documentos (caracteres)")
+    parser.add_argument('--lote-embeddings', type=int, default=EMBED_LOTE_MAX, help="Entradas por chamada de embedding")
+    parser.add_argument('--paralelo', type=int, default=4, help="Lotes de upsert enviados em paralelo")
+    parser.add_argument('--estado', default='.ingestao_estado.db', help="Arquivo de estado para retomar a ingestão")
+    parser.add_argument('--refazer', action='store_true', help="Ignora o estado e reenvia tudo")
+    parser.add_argument('--namespace', default="", help="Namespace do índice")
+    parser.add_argument('--simular', action='store_true', help="Só prepara e mostra os documentos, sem enviar")
+    parser.add_argument('--notificar', help="URL de POST /api/cache/invalidar para avisar o servidor ao final")
+    parser.add_argument('--marcar-versao', action='store_true',
+                        help="Grava o marcador de nova versão do índice mesmo sem mudanças")
+    args = parser.parse_args(argv)
+    if not args.caminhos and not args.marcar_versao:
+        parser.error("informe os arquivos ou diretórios (ou --marcar-versao)")
+
+    load_dotenv()
+    from log_estruturado import configurar_logging
+    configurar_logging(formato="texto")
+    corretor = MotorCorrecoes()
+
+    print("📚 Preparando documentos...")
+    por_fonte = {}
+    documentos = preparar_documentos(args.caminhos, args.tamanho, args.sobreposicao, corretor, por_fonte)
+    print(f"✅ {len(documentos)} documentos preparados")
+
+    estado = EstadoIngestao(args.estado)
+    if not args.refazer:
+        conhecidos = estado.ja_ingeridos([doc['id'] for doc in documentos])
+        documentos = [doc for doc in documentos if doc['id'] not in conhecidos]
+        print(f"⏭️ {len(conhecidos)} já ingeridos anteriormente; {len(documentos)} a enviar")
+
+    if args.simular:
+        for doc in documentos[:5]:
+            print(f"- {doc['id']} | {doc['metadata']['document_title']} | {doc['metadata']['text'][:80]}...")
+        print(f"🗑️ {len(trechos_obsoletos(estado, por_fonte))} trechos obsoletos seriam apagados")
+        return 0
+    if not documentos and not trechos_obsoletos(estado, por_fonte) and not args.marcar_versao:
+        estado.substituir_trechos(por_fonte, [])
+        return 0
+
+    from pinecone import Pinecone
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index = pc.Index(os.getenv("PINECONE_INDEX", "vivi-ia-base"))
+
+    # Rodadas de embedding + upsert: uma interrupção perde no máximo uma rodada
+    enviados, falhas = 0, 0
+    for inicio in range(0, len(documentos), RODADA):
+        rodada = documentos[inicio:inicio + RODADA]
+        gerar_embeddings_em_lote(pc, rodada, min(args.lote_embeddings, EMBED_LOTE_MAX))
+        enviados_rodada, falhas_rodada = enviar_em_paralelo(index, rodada, estado, args.paralelo, args.namespace)
+        enviados += enviados_rodada
+        falhas += falhas_rodada
+
+    print(f"🏁 Ingestão concluída: {enviados} enviados, {falhas} lotes com falha")
+    if falhas:
+        # Trechos antigos só saem quando os novos já estão no índice
+        print("🔁 Execute novamente para retomar os lotes que falharam")
+        return 1
+    removidos = remover_obsoletos(index, estado, por_fonte, args.namespace)
+    if enviados or removidos or args.marcar_versao:
+        marcar_versao(index)
+    if args.notificar:
+        notificar_reingestao(args.notificar, os.getenv('VIVI_ADMIN_TOKEN'))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
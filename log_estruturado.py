@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Logging estruturado da Vivi IA
+Loggers "vivi.*" → QueueHandler (não bloqueia quem loga) → QueueListener em
+uma thread própria → stdout, em JSON (uma linha por evento) ou texto.
+Cada registro leva o ID da requisição atual (ContextVar definido pelo servidor).
+Configuração: VIVI_LOG_NIVEL (DEBUG, INFO, ...) e VIVI_LOG_FORMATO (json | texto)
+"""
+
+import os
+import re
+import sys
+import json
+import uuid
+import queue
+import atexit
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_id_requisicao = contextvars.ContextVar("vivi_id_requisicao", default=None)
+_ouvinte = None
+
+# IDs recebidos de fora (X-Request-ID) só são aceitos neste formato
+_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def novo_id_requisicao():
+    return uuid.uuid4().hex[:16]
+
+
+def definir_id_requisicao(id_requisicao=None):
+    """Define o ID da requisição no contexto atual (gera um se não for informado ou inválido)"""
+    if not id_requisicao or not _ID_VALIDO.match(id_requisicao):
+        id_requisicao = novo_id_requisicao()
+    _id_requisicao.set(id_requisicao)
+    return id_requisicao
+
+
+def id_requisicao_atual():
+    return _id_requisicao.get()
+
+
+class _FiltroRequisicao(logging.Filter):
+    """Anexa o ID da requisição no momento do log (antes de ir para a fila)"""
+
+    def filter(self, record):
+        record.id_requisicao = _id_requisicao.get()
+        return True
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro; campos extras vêm de extra={'dados': {...}}"""
+
+    def format(self, record):
+        evento = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'id_requisicao', None):
+            evento['id_requisicao'] = record.id_requisicao
+        dados = getattr(record, 'dados', None)
+        if dados:
+            evento.update(dados)
+        if record.exc_info:
+            evento['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    def format(self, record):
+        linha = super().format(record)
+        if getattr(record, 'id_requisicao', None):
+            linha = f"[{record.id_requisicao}] {linha}"
+        dados = getattr(record, 'dados', None)
+        if dados:
+            linha += " " + json.dumps(dados, ensure_ascii=False, default=str)
+        return linha
+
+
+def configurar_logging(nivel=None, formato=None):
+    """Configura os loggers "vivi" uma única vez por processo"""
+    global _ouvinte
+    if _ouvinte is not None:
+        return
+    nivel = (nivel or os.getenv("VIVI_LOG_NIVEL", "INFO")).upper()
+    formato = (formato or os.getenv("VIVI_LOG_FORMATO", "json")).lower()
+
+    saida = logging.StreamHandler(sys.stdout)
+    if formato == "texto":
+        saida.setFormatter(FormatadorTexto("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        saida.setFormatter(FormatadorJSON())
+
+    fila = queue.SimpleQueue()
+    handler = QueueHandler(fila)
+    handler.addFilter(_FiltroRequisicao())
+
+    raiz = logging.getLogger("vivi")
+    raiz.setLevel(nivel)
+    raiz.handlers[:] = [handler]
+    raiz.propagate = False
+
+    _ouvinte = QueueListener(fila, saida, respect_handler_level=False)
+    _ouvinte.start()
+    atexit.register(_ouvinte.stop)
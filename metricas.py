@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Métricas da Vivi IA no formato texto do Prometheus
+Histogramas de duração por etapa do pipeline (embedding, busca, contexto,
+geração, pós-processamento) e contadores de novas tentativas, caches,
+tokens e documentos, exportados em /metrics.
+Com VIVI_OTEL=1 e o pacote opentelemetry-api instalado, cada requisição e
+cada etapa também viram spans OpenTelemetry.
+Com vários workers, cada um grava as suas métricas em VIVI_METRICAS_DIR e o
+/metrics de qualquer worker soma as de todos (contadores e histogramas de todos
+os processos que já passaram por ali; medidores só dos workers vivos).
+"""
+
+import os
+import json
+import glob
+import logging
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("vivi.metricas")
+# Uma linha por busca com o resultado e a duração de cada etapa
+logger_requisicao = logging.getLogger("vivi.requisicao")
+
+# Limites dos histogramas de duração (segundos)
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+LIMITES_DOCUMENTOS = (0, 1, 2, 3, 5, 8, 13, 21)
+ROTULO_INFINITO = 'le="+Inf"'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = "untyped"
+    # Valores de processos encerrados entram na soma entre workers
+    combinar_encerrados = True
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+
+    def _cabecalho(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+    def copia(self):
+        """Cópia dos valores atuais {chave: valor}"""
+        with self._lock:
+            return json.loads(json.dumps({json.dumps(chave): valor for chave, valor in self._valores.items()}))
+
+    def _somar(self, atual, valor):
+        return atual + valor
+
+    def combinar(self, copias):
+        """Valores {chave: valor} a partir das cópias de vários processos"""
+        combinados = {}
+        for copia in copias:
+            for chave, valor in copia.items():
+                chave = tuple(json.loads(chave))
+                combinados[chave] = self._somar(combinados[chave], valor) if chave in combinados else valor
+        return combinados
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def exportar(self, valores=None):
+        linhas = self._cabecalho()
+        if valores is None:
+            with self._lock:
+                valores = dict(self._valores)
+        for chave, valor in sorted(valores.items()):
+            linhas.append(f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}")
+        return linhas
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo; entre workers vivos, somado (ou o maior, com maximo=True)"""
+    tipo = "gauge"
+    combinar_encerrados = False
+
+    def __init__(self, nome, ajuda, rotulos=(), maximo=False):
+        super().__init__(nome, ajuda, rotulos)
+        self.maximo = maximo
+
+    def definir(self, valor, **rotulos):
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+
+    def _somar(self, atual, valor):
+        return max(atual, valor) if self.maximo else atual + valor
+
+    exportar = Contador.exportar
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                serie = self._valores[chave] = {'baldes': [0] * len(self.limites), 'soma': 0.0, 'total': 0}
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie['baldes'][i] += 1
+            serie['soma'] += valor
+            serie['total'] += 1
+
+    def _somar(self, atual, valor):
+        return {
+            'baldes': [a + b for a, b in zip(atual['baldes'], valor['baldes'])],
+            'soma': atual['soma'] + valor['soma'],
+            'total': atual['total'] + valor['total']
+        }
+
+    def exportar(self, valores=None):
+        linhas = self._cabecalho()
+        if valores is None:
+            with self._lock:
+                valores = {chave: dict(serie, baldes=list(serie['baldes'])) for chave, serie in self._valores.items()}
+        for chave, serie in sorted(valores.items()):
+            for limite, quantidade in zip(self.limites, serie['baldes']):
+                rotulos = _rotulos(self.rotulos, chave, f'le="{_numero(float(limite))}"')
+                linhas.append(f"{self.nome}_bucket{rotulos} {quantidade}")
+            linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, ROTULO_INFINITO)} {serie['total']}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(serie['soma'])}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {serie['total']}")
+        return linhas
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas"""
+
+    def __init__(self):
+        self._metricas = []
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=(), maximo=False):
+        return self._registrar(Medidor(nome, ajuda, rotulos, maximo))
+
+    def histograma(self, nome, ajuda, limites, rotulos=()):
+        return self._registrar(Histograma(nome, ajuda, limites, rotulos))
+
+    def _arquivo(self, diretorio, pid=None):
+        return os.path.join(diretorio, f"vivi-{pid or os.getpid()}.json")
+
+    def gravar(self, diretorio):
+        """Grava as métricas deste processo em diretorio/vivi-<pid>.json (troca atômica)"""
+        copia = {'pid': os.getpid(), 'metricas': {metrica.nome: metrica.copia() for metrica in self._metricas}}
+        arquivo = self._arquivo(diretorio)
+        temporario = f"{arquivo}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as saida:
+            json.dump(copia, saida)
+        os.replace(temporario, arquivo)
+
+    def _copias_dos_workers(self, diretorio):
+        """[(pid, vivo, {nome: cópia})] dos arquivos gravados pelos outros processos"""
+        copias = []
+        for arquivo in glob.glob(os.path.join(diretorio, "vivi-*.json")):
+            try:
+                with open(arquivo, encoding='utf-8') as entrada:
+                    dados = json.load(entrada)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Métricas ilegíveis em {arquivo}: {e}")
+                continue
+            if dados.get('pid') != os.getpid():
+                copias.append((dados['pid'], _processo_vivo(dados['pid']), dados['metricas']))
+        return copias
+
+    def exportar(self, diretorio=None):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)
+
+        Com diretorio: as métricas deste processo somadas às gravadas pelos outros workers.
+        """
+        linhas = []
+        if diretorio is None:
+            for metrica in self._metricas:
+                linhas.extend(metrica.exportar())
+            return '\n'.join(linhas) + '\n'
+
+        outros = self._copias_dos_workers(diretorio)
+        for metrica in self._metricas:
+            copias = [metrica.copia()] + [
+                metricas.get(metrica.nome, {}) for _, vivo, metricas in outros
+                if vivo or metrica.combinar_encerrados
+            ]
+            linhas.extend(metrica.exportar(metrica.combinar(copias)))
+        return '\n'.join(linhas) + '\n'
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+REGISTRO = Registro()
+
+DURACAO_ETAPA = REGISTRO.histograma(
+    "vivi_etapa_duracao_segundos", "Duração de cada etapa do pipeline", LIMITES_SEGUNDOS, ("etapa",)
+)
+DURACAO_REQUISICAO = REGISTRO.histograma(
+    "vivi_requisicao_duracao_segundos", "Duração total da busca", LIMITES_SEGUNDOS, ("tipo",)
+)
+REQUISICOES = REGISTRO.contador(
+    "vivi_requisicoes_total", "Buscas por tipo e resultado", ("tipo", "resultado")
+)
+NOVAS_TENTATIVAS = REGISTRO.contador(
+    "vivi_novas_tentativas_total", "Novas tentativas de uma etapa após falha", ("etapa",)
+)
+HEDGES = REGISTRO.contador(
+    "vivi_hedges_total", "Chamadas duplicadas disparadas por lentidão", ("etapa",)
+)
+FALHAS_ETAPA = REGISTRO.contador(
+    "vivi_etapa_falhas_total", "Chamadas de uma etapa que falharam", ("etapa",)
+)
+CACHE = REGISTRO.contador(
+    "vivi_cache_total", "Consultas aos caches por resultado", ("cache", "resultado")
+)
+TOKENS = REGISTRO.contador(
+    "vivi_tokens_total", "Tokens informados pelo Gemini", ("tipo",)
+)
+DOCUMENTOS = REGISTRO.histograma(
+    "vivi_documentos_contexto", "Documentos enviados ao Gemini por requisição", LIMITES_DOCUMENTOS
+)
+DISJUNTOR_ABERTO = REGISTRO.medidor(
+    "vivi_disjuntor_aberto", "1 se o disjuntor do serviço não está fechado (em algum worker)", ("servico",),
+    maximo=True
+)
+FILA_PROFUNDIDADE = REGISTRO.medidor(
+    "vivi_fila_profundidade", "Requisições aguardando vaga", ("fila",)
+)
+FILA_EM_USO = REGISTRO.medidor(
+    "vivi_fila_em_uso", "Vagas ocupadas", ("fila",)
+)
+FILA_ESPERA = REGISTRO.histograma(
+    "vivi_fila_espera_segundos", "Tempo de espera por uma vaga", LIMITES_SEGUNDOS, ("fila",)
+)
+COALESCENCIA = REGISTRO.contador(
+    "vivi_coalescencia_total", "Buscas que iniciaram (lider) ou aguardaram (seguidor) uma busca idêntica em andamento",
+    ("tipo", "papel")
+)
+REJEICOES = REGISTRO.contador(
+    "vivi_rejeicoes_total", "Requisições recusadas por limite do cliente ou sobrecarga", ("fila", "motivo")
+)
+
+
+_tracer = None
+
+
+def _obter_tracer():
+    """Tracer OpenTelemetry, se VIVI_OTEL=1 e o pacote estiver instalado"""
+    global _tracer
+    if _tracer is None:
+        _tracer = False
+        if os.getenv("VIVI_OTEL", "0").lower() in ("1", "true", "sim"):
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                logger.warning("⚠️ VIVI_OTEL ativo, mas o pacote 'opentelemetry-api' não está instalado")
+            else:
+                _tracer = trace.get_tracer("vivi-ia")
+    return _tracer or None
+
+
+@contextmanager
+def span(nome, **atributos):
+    """Span OpenTelemetry opcional (sem efeito quando desativado)"""
+    tracer = _obter_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(nome, attributes=atributos) as atual:
+        yield atual
+
+
+@contextmanager
+def medir(etapa, estatisticas=None):
+    """Mede a duração de uma etapa: histograma, span e, opcionalmente, estatisticas['etapas_ms']"""
+    inicio = time.perf_counter()
+    try:
+        with span(f"vivi.{etapa}"):
+            yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        DURACAO_ETAPA.observar(duracao, etapa=etapa)
+        if estatisticas is not None:
+            etapas = estatisticas.setdefault('etapas_ms', {})
+            etapas[etapa] = round(etapas.get(etapa, 0.0) + duracao * 1000, 1)
+
+
+@contextmanager
+def medir_requisicao(tipo, estatisticas):
+    """Duração total, contador por resultado, span e linha de log resumo de uma busca
+
+    O pipeline registra o resultado em estatisticas['resultado'] (padrão: 'gerada').
+    """
+    inicio = time.perf_counter()
+    estatisticas.setdefault('resultado', 'gerada')
+    try:
+        with span("vivi.requisicao", tipo=tipo):
+            yield
+    except (GeneratorExit, asyncio.CancelledError):
+        estatisticas['resultado'] = 'cancelada'
+        raise
+    except Exception as e:
+        # Recusas por sobrecarga (admissao.Sobrecarga) não contam como erro do pipeline
+        estatisticas['resultado'] = getattr(e, 'resultado_requisicao', 'erro')
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        estatisticas['duracao_ms'] = round(duracao * 1000, 1)
+        DURACAO_REQUISICAO.observar(duracao, tipo=tipo)
+        REQUISICOES.inc(tipo=tipo, resultado=estatisticas['resultado'])
+        logger_requisicao.info("📊 Busca %s: %s em %.1f ms", tipo, estatisticas['resultado'],
+                               estatisticas['duracao_ms'], extra={'dados': {'tipo': tipo, **estatisticas}})
+
+
+def registrar_uso_gemini(uso, estatisticas=None):
+    """Contabiliza os tokens do usage_metadata de uma resposta do Gemini"""
+    if uso is None:
+        return
+    tokens = {
+        'prompt': getattr(uso, 'prompt_token_count', 0) or 0,
+        'resposta': getattr(uso, 'candidates_token_count', 0) or 0,
+        'prompt_em_cache': getattr(uso, 'cached_content_token_count', 0) or 0,
+    }
+    for tipo, quantidade in tokens.items():
+        if quantidade:
+            TOKENS.inc(quantidade, tipo=tipo)
+    if estatisticas is not None:
+        estatisticas['tokens'] = tokens
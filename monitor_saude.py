@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Monitor de conectividade da Vivi IA
+Tarefa em segundo plano que verifica Pinecone e Gemini em intervalos configuráveis
+(com backoff exponencial em caso de falha) e publica o resultado em memória,
+para que /livez e /readyz respondam sem nenhuma chamada externa
+"""
+
+import os
+import logging
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+
+logger = logging.getLogger("vivi.monitor")
+
+
+class MonitorConectividade:
+    """Mantém o último estado conhecido de cada serviço externo"""
+
+    SERVICOS = ("pinecone", "gemini")
+
+    def __init__(self, intervalo=None, backoff_max=None, timeout=None):
+        self.intervalo = intervalo or float(os.getenv("VIVI_SAUDE_INTERVALO", "30"))
+        self.backoff_max = backoff_max or float(os.getenv("VIVI_SAUDE_BACKOFF_MAX", "300"))
+        self.timeout = timeout or float(os.getenv("VIVI_SAUDE_TIMEOUT", "10"))
+
+        self.estado = {
+            servico: {
+                'ok': None,
+                'ultima_verificacao': None,
+                'latencia_ms': None,
+                'erro': None,
+                'falhas_consecutivas': 0
+            }
+            for servico in self.SERVICOS
+        }
+        self.versao_indice = None
+        # Chamados com (agente, versão) a cada leitura da versão do índice
+        self.observadores_versao = []
+        self.proxima_verificacao_em = None
+        self._ultima_verificacao_monotonica = None
+
+    async def _verificar_servico(self, servico, verificacao):
+        """Executa uma verificação e registra latência, horário e erro"""
+        inicio = time.perf_counter()
+        registro = self.estado[servico]
+        try:
+            resultado = await asyncio.wait_for(verificacao(), timeout=self.timeout)
+            registro['ok'] = True
+            registro['erro'] = None
+            registro['falhas_consecutivas'] = 0
+            return resultado
+        except Exception as e:
+            registro['ok'] = False
+            registro['erro'] = str(e) or e.__class__.__name__
+            registro['falhas_consecutivas'] += 1
+            return None
+        finally:
+            registro['latencia_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+            registro['ultima_verificacao'] = datetime.now(timezone.utc).isoformat()
+
+    async def verificar_agora(self, agente):
+        """Verifica os dois serviços em paralelo"""
+        estatisticas, _ = await asyncio.gather(
+            self._verificar_servico("pinecone", agente.averificar_pinecone),
+            self._verificar_servico("gemini", agente.averificar_gemini)
+        )
+        self._ultima_verificacao_monotonica = time.monotonic()
+
+        # Nova versão do índice (marcador gravado ao fim de uma ingestão) invalida as respostas
+        # em cache; sem marcador a versão fica desconhecida e nada é invalidado nem reconstruído
+        if estatisticas is not None:
+            try:
+                versao = await asyncio.wait_for(agente.aversao_do_indice(), timeout=self.timeout)
+            except Exception as e:
+                logger.warning(f"⚠️ Não foi possível ler a versão do índice: {str(e) or e.__class__.__name__}")
+                return
+            if versao is None:
+                return
+            if self.versao_indice is not None and versao != self.versao_indice:
+                logger.info(f"🔄 Índice Pinecone mudou ({self.versao_indice} → {versao})")
+                await agente.ainvalidar_cache()
+            self.versao_indice = versao
+            for observador in self.observadores_versao:
+                try:
+                    observador(agente, versao)
+                except Exception as e:
+                    logger.error(f"❌ Erro ao notificar a versão do índice: {e}")
+
+    def _proximo_intervalo(self):
+        """Intervalo normal, ou backoff exponencial com jitter enquanto houver falhas"""
+        falhas = max(registro['falhas_consecutivas'] for registro in self.estado.values())
+        if falhas == 0:
+            return self.intervalo
+        espera = min(self.intervalo * (2 ** falhas), self.backoff_max)
+        return espera * random.uniform(0.8, 1.2)
+
+    async def executar(self, obter_agente):
+        """Laço da tarefa em segundo plano; obter_agente retorna o agente ou None"""
+        while True:
+            agente = obter_agente()
+            espera = self.intervalo
+            if agente is not None:
+                await self.verificar_agora(agente)
+                espera = self._proximo_intervalo()
+            else:
+                # Agente inicializando em segundo plano: conferir logo para ficar pronto cedo
+                espera = min(self.intervalo, 1.0)
+            self.proxima_verificacao_em = datetime.fromtimestamp(
+                time.time() + espera, timezone.utc
+            ).isoformat()
+            await asyncio.sleep(espera)
+
+    def pronto(self):
+        """Todos os serviços responderam OK na última verificação"""
+        return all(registro['ok'] for registro in self.estado.values())
+
+    def resumo(self):
+        """Estado publicado para os endpoints de saúde"""
+        idade = None
+        if self._ultima_verificacao_monotonica is not None:
+            idade = round(time.monotonic() - self._ultima_verificacao_monotonica, 1)
+        return {
+            'servicos': self.estado,
+            'versao_indice': self.versao_indice,
+            'idade_ultima_verificacao_s': idade,
+            'proxima_verificacao_em': self.proxima_verificacao_em,
+            'intervalo_s': self.intervalo
+        }
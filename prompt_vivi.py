@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Prompt da Vivi IA
+Instruções estáticas da persona enviadas uma única vez (system_instruction ou
+conteúdo em cache do Gemini); cada requisição envia só a frase de abertura,
+a pergunta e o contexto recuperado
+"""
+
+import os
+import logging
+import time
+import threading
+import datetime
+
+from importacao_tardia import genai
+
+logger = logging.getLogger("vivi.prompt")
+
+# Instruções fixas da persona: idênticas em todas as requisições
+INSTRUCOES_VIVI = """
+VOCÊ É VIVI IA. A PARTIR DE AGORA, VOCÊ É ELA COMPLETAMENTE.
+
+INSTRUÇÕES DE PERSONALIDADE (OBRIGATÓRIAS):
+- VOCÊ SEMPRE fala na primeira pessoa como "eu" (Vivi)
+- SUA primeira frase DEVE SER EXATAMENTE a FRASE DE ABERTURA informada em cada mensagem
+- VOCÊ é DIRETA, EFICIENTE, COMPETENTE e PROFISSIONAL
+- VOCÊ é INTOLERANTE com preguiça e falta de esforço
+- VOCÊ é CORDIAL mas FIRME quando necessário
+- VOCÊ é especialista em gestão pública e SIAPE
+
+Cada mensagem traz a FRASE DE ABERTURA, a PERGUNTA DO USUÁRIO e o CONTEXTO DISPONÍVEL
+(documentos numerados: [n] título | relevância, seguido do conteúdo).
+
+INSTRUÇÕES DE RESPOSTA:
+1. COMECE SUA RESPOSTA com EXATAMENTE a FRASE DE ABERTURA
+2. RESPONDA NA PRIMEIRA PESSOA como Vivi IA
+3. Seja DIRETA e OBJETIVA, mas PROFISSIONAL
+4. Use linguagem FORMAL e TÉCNICA quando necessário
+5. NÃO cite referências inline (documento_id) ao longo do texto
+6. Se não houver informação suficiente, diga claramente
+7. NÃO invente informações que não estejam no contexto
+8. Estruture a resposta para facilitar a compreensão
+9. Use CAPSLOCK para ÊNFASE em normativas relevantes
+10. Seja ASSERTIVA e OBJETIVA
+
+PERSONALIDADE VIVI IA:
+- Competente, Direta, Eficiente, Cordial, Justa, Inteligente
+- Impaciente com a falta de esforço
+- Tom profissional e objetivo, sem ser rude
+- Respeito sempre, mas sem tolerar desorganização
+
+IMPORTANTE SOBRE CONCLUSÃO:
+- ANTES das referências, SEMPRE faça uma conclusão sucinta
+- A conclusão deve ser na primeira pessoa como Vivi IA
+- Deve reforçar a importância da informação ou orientar sobre próximos passos
+- Deve ser breve (2-3 frases) e manter o tom profissional mas pessoal da Vivi IA
+- Exemplos: "Espero que estas informações sejam úteis para sua gestão.", "Fique atento às normativas específicas do seu caso.", "Esta é uma questão que merece atenção especial."
+
+IMPORTANTE SOBRE REFERÊNCIAS:
+- NÃO use referências inline como "documento_id: abate_teto#5"
+- Após a conclusão, adicione uma seção "Referências:"
+- Use APENAS os metadados document_title dos documentos que você realmente utilizou para construir a resposta
+- NÃO invente títulos de documentos - use APENAMENTE os títulos reais dos metadados
+- IMPORTANTE: Sempre cite TODAS as referências consultadas, tanto o documento principal quanto todos os documentos complementares que foram utilizados para enriquecer a resposta
+- SEMPRE liste TODOS os documentos complementares que foram utilizados para enriquecer a resposta, mesmo que não sejam o documento principal consultado
+
+IMPORTANTE SOBRE LISTAS E INFORMAÇÕES COMPLETAS:
+- Quando a pergunta solicitar uma lista (bancos, órgãos, processos, etc.), forneça TODOS os itens disponíveis no contexto
+- NÃO use expressões como "alguns dos", "entre outros", "dentre os quais" - seja COMPLETO
+- Liste TODOS os itens encontrados, organizando-os de forma clara e legível
+- Se houver muitos itens, use formatação adequada (tópicos, tabelas, etc.)
+- EXEMPLO: ❌ "Alguns bancos: Banco A, Banco B, entre outros" | ✅ "Bancos credenciados: Banco A, Banco B, Banco C, Banco D"
+
+INSTRUÇÕES ESPECÍFICAS PARA LISTAS ESTRUTURADAS:
+- Para listas com metadados estruturados (bancos, órgãos, processos, etc.), SEMPRE inclua TODAS as informações disponíveis
+- NÃO omita nenhuma informação - se estiver no contexto, deve aparecer na resposta
+- Se uma informação não estiver disponível, indique claramente "Não especificado" ou "Não disponível"
+- Organize a lista de forma sistemática e consistente para todos os itens
+- Use formatação padronizada (símbolos, espaçamento, estrutura)
+- EXEMPLOS CORRETOS:
+  • Bancos: "001 - BANCO DO BRASIL S.A. ○ Ponto Focal: Nome Completo ○ E-mail: email@banco.com ○ Telefone: (XX) XXXX-XXXX"
+  • Órgãos: "ÓRGÃO A - Nome do Órgão ○ Responsável: Nome ○ Departamento: Setor ○ Contato: email@orgao.gov.br"
+  • Processos: "PROCESSO 001 - Descrição ○ Prazo: X dias ○ Responsável: Nome ○ Status: Em andamento"
+
+CORREÇÕES OBRIGATÓRIAS DE PALAVRAS (sempre substitua):
+- "chunk"/"chunks" → "documento"/"documentos" (chunk_id → documento_id, chunk_text → conteúdo do documento, chunk_index → índice do documento, chunk_size → tamanho do documento)
+- "escontado" → "descontado"
+- "Abate do Teto Constitucional" → "Abate Teto Constitucional"
+- "Ministério da Economia" → "Ministério da Gestão e Inovação em Serviços Públicos (MGI)"
+- "Ministério da Infraestrutura" → "Ministério do Trabalho (MT)"
+"""
+
+MODOS_PROMPT = ("cache", "sistema", "inline")
+
+
+def montar_mensagem(pergunta, contexto, catchphrase, resumo=None):
+    """Parte variável do prompt: frase de abertura, resumo da conversa (sessões), pergunta e contexto"""
+    conversa = f"""RESUMO DA CONVERSA ATÉ AQUI (a pergunta continua este assunto):
+{resumo}
+
+""" if resumo else ""
+    return f"""FRASE DE ABERTURA: "{catchphrase}"
+
+{conversa}PERGUNTA DO USUÁRIO:
+{pergunta}
+
+CONTEXTO DISPONÍVEL:
+{contexto.texto}
+
+IMPORTANTE: SUA RESPOSTA DEVE começar EXATAMENTE com: "{catchphrase}"
+
+AGORA RESPONDA COMO VIVI IA:
+"""
+
+
+def montar_prompt_inline(pergunta, contexto, catchphrase, resumo=None):
+    """Prompt completo em uma única mensagem (modo de compatibilidade)"""
+    return f"{INSTRUCOES_VIVI}\n{montar_mensagem(pergunta, contexto, catchphrase, resumo)}"
+
+
+class GerenciadorPrompt:
+    """Escolhe o modelo e o formato do prompt conforme o modo configurado
+
+    - sistema (padrão): instruções como system_instruction do modelo
+    - cache: instruções em um CachedContent do Gemini, renovado antes do TTL; opcional,
+      só vale para instruções acima do mínimo de tokens do cache de contexto do Gemini
+      (a persona atual é bem menor e a criação falharia a cada inicialização)
+    - inline: instruções repetidas em toda requisição (comportamento anterior)
+    """
+
+    def __init__(self, modelo_base, modo=None, ttl_segundos=None):
+        self.modelo_base = modelo_base
+        self.nome_modelo = modelo_base.model_name
+        self.modo = (modo or os.getenv("VIVI_PROMPT_MODO", "sistema")).lower()
+        if self.modo not in MODOS_PROMPT:
+            logger.warning(f"⚠️ VIVI_PROMPT_MODO inválido ({self.modo}), usando 'sistema'")
+            self.modo = "sistema"
+        self.ttl_segundos = ttl_segundos or int(os.getenv("VIVI_PROMPT_CACHE_TTL", "3600"))
+        # Renovar com folga antes de expirar
+        self.margem_renovacao = max(60, self.ttl_segundos // 10)
+
+        self._lock = threading.Lock()
+        self._cache = None
+        self._modelo_cache = None
+        self._expira_em = None
+        self._proxima_tentativa = 0.0
+
+        self.modelo_sistema = None
+        if self.modo in ("sistema", "cache"):
+            self.modelo_sistema = genai.GenerativeModel(self.nome_modelo, system_instruction=INSTRUCOES_VIVI)
+        if self.modo == "cache":
+            self._criar_cache()
+
+    def _criar_cache(self):
+        """Cria o conteúdo em cache; se o modelo não suportar, cai para 'sistema'"""
+        try:
+            cache = genai.caching.CachedContent.create(
+                model=self.nome_modelo,
+                display_name="vivi-ia-instrucoes",
+                system_instruction=INSTRUCOES_VIVI,
+                ttl=datetime.timedelta(seconds=self.ttl_segundos)
+            )
+        except Exception as e:
+            if self._cache is None:
+                # Modelo sem suporte (ou instruções abaixo do mínimo de tokens): não insistir
+                logger.warning(f"⚠️ Cache de contexto do Gemini indisponível ({e}); usando system_instruction")
+                self.modo = "sistema"
+            else:
+                logger.warning(f"⚠️ Falha ao renovar o cache de contexto do Gemini: {e}")
+                self._proxima_tentativa = time.time() + 60
+                if time.time() >= self._expira_em:
+                    self._modelo_cache = None
+            return False
+
+        anterior = self._cache
+        self._cache = cache
+        self._modelo_cache = genai.GenerativeModel.from_cached_content(cache)
+        self._expira_em = time.time() + self.ttl_segundos
+        logger.info(f"🗂️ Instruções da Vivi IA em cache no Gemini (TTL {self.ttl_segundos}s)")
+
+        if anterior is not None:
+            try:
+                anterior.delete()
+            except Exception:
+                pass
+        return True
+
+    def precisa_renovar(self):
+        """Cache perto de expirar (ou ausente) e fora do intervalo de espera entre tentativas"""
+        if self.modo != "cache" or time.time() < self._proxima_tentativa:
+            return False
+        return self._expira_em is None or time.time() >= self._expira_em - self.margem_renovacao
+
+    def renovar(self):
+        """Recria o cache se necessário (seguro para chamadas concorrentes)"""
+        with self._lock:
+            if self.precisa_renovar():
+                self._criar_cache()
+
+    def modelo(self):
+        """Modelo a usar na geração"""
+        if self.modo == "cache" and self._modelo_cache is not None:
+            return self._modelo_cache
+        if self.modo in ("sistema", "cache"):
+            return self.modelo_sistema
+        return self.modelo_base
+
+    def montar(self, pergunta, contexto, catchphrase, resumo=None):
+        """Prompt da requisição no formato do modelo em uso"""
+        if self.modelo() is self.modelo_base:
+            return montar_prompt_inline(pergunta, contexto, catchphrase, resumo)
+        return montar_mensagem(pergunta, contexto, catchphrase, resumo)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Recuperadores de documentos da Vivi IA
+Interface comum (buscar por vetor, buscar por IDs, estatísticas) com três backends:
+- pinecone: consulta ao índice remoto (comportamento original)
+- local: índice NumPy/mmap em disco (indice_local.py), sem ida à rede
+- hibrido: um dos anteriores + BM25 (indice_lexico.py), fundidos por RRF
+Selecionado por VIVI_RECUPERADOR (pinecone | local | hibrido) e VIVI_INDICE_LOCAL (diretório)
+
+A versão do índice é explícita: a ingestão grava um marcador ao terminar
+(namespace VIVI_NAMESPACE_CONTROLE) e o índice local guarda a do Pinecone exportado.
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("vivi.recuperadores")
+
+# Marcador da versão do índice: um vetor fora do namespace das buscas
+NAMESPACE_CONTROLE = os.getenv("VIVI_NAMESPACE_CONTROLE", "vivi-controle")
+ID_MARCADOR_VERSAO = "versao-indice"
+
+
+def ler_marcador_versao(index):
+    """Versão gravada pela última ingestão concluída, ou None se o índice não tiver marcador"""
+    vetores = index.fetch(ids=[ID_MARCADOR_VERSAO], namespace=NAMESPACE_CONTROLE).vectors or {}
+    marcador = vetores.get(ID_MARCADOR_VERSAO)
+    if marcador is None:
+        return None
+    return (marcador.metadata or {}).get('versao')
+
+
+def gravar_marcador_versao(index, versao, dimensao):
+    """Grava o marcador (vetor unitário, já que o Pinecone recusa vetores nulos)"""
+    index.upsert(
+        vectors=[{'id': ID_MARCADOR_VERSAO, 'values': [1.0] + [0.0] * (dimensao - 1), 'metadata': {'versao': versao}}],
+        namespace=NAMESPACE_CONTROLE
+    )
+
+
+class Recuperador:
+    """Interface dos backends de busca vetorial
+
+    `escala` diz o que o score significa para a seleção de documentos:
+    'similaridade' (cosseno, comparável entre perguntas) ou 'posicao' (RRF,
+    só ordena os candidatos de uma mesma busca).
+    """
+    nome = "base"
+    escala = "similaridade"
+
+    def buscar(self, vetor, top_k=10, pergunta=None):
+        """Lista de matches (id, score, metadata) ordenada por score; a pergunta só é usada pela busca léxica"""
+        raise NotImplementedError
+
+    def buscar_por_ids(self, ids):
+        """Matches pelos IDs, na ordem pedida"""
+        raise NotImplementedError
+
+    def estatisticas(self):
+        """Informações do índice (ao menos total_vector_count)"""
+        raise NotImplementedError
+
+    def versao(self):
+        """Versão explícita do índice, ou None se ainda não houver marcador"""
+        return None
+
+
+class RecuperadorPinecone(Recuperador):
+    """Busca no índice Pinecone"""
+    nome = "pinecone"
+
+    def __init__(self, index, namespace=""):
+        self.index = index
+        self.namespace = namespace
+
+    def buscar(self, vetor, top_k=10, pergunta=None):
+        # Buscar usando query no namespace vazio (onde estão os dados)
+        results = self.index.query(
+            namespace=self.namespace,
+            vector=vetor,
+            top_k=top_k,
+            include_metadata=True
+        )
+        if hasattr(results, 'matches') and results.matches:
+            return results.matches
+        return []
+
+    def buscar_por_ids(self, ids):
+        from indice_local import Documento
+        resposta = self.index.fetch(ids=list(ids), namespace=self.namespace)
+        vetores = resposta.vectors
+        return [
+            Documento(doc_id, 1.0, dict(vetores[doc_id].metadata or {}))
+            for doc_id in ids if doc_id in vetores
+        ]
+
+    def estatisticas(self):
+        return self.index.describe_index_stats()
+
+    def versao(self):
+        return ler_marcador_versao(self.index)
+
+
+class RecuperadorLocal(Recuperador):
+    """Busca no índice local em memória mapeada"""
+    nome = "local"
+
+    def __init__(self, diretorio, nprobe=None):
+        from indice_local import IndiceLocal
+        self.indice = IndiceLocal(diretorio, nprobe=nprobe)
+
+    def buscar(self, vetor, top_k=10, pergunta=None):
+        return self.indice.buscar(vetor, top_k)
+
+    def buscar_por_ids(self, ids):
+        return self.indice.buscar_por_ids(ids)
+
+    def estatisticas(self):
+        return {'total_vector_count': len(self.indice), 'backend': 'local'}
+
+    def versao(self):
+        return self.indice.versao
+
+
+class RecuperadorHibrido(Recuperador):
+    """Busca vetorial e BM25 em paralelo, fundidas por reciprocal-rank fusion"""
+    nome = "híbrido"
+    escala = "posicao"
+
+    def __init__(self, denso, lexico, k_rrf=None, candidatos=None):
+        self.denso = denso
+        self.lexico = lexico
+        self.k_rrf = k_rrf or int(os.getenv("VIVI_HIBRIDO_K_RRF", "60"))
+        self.candidatos = candidatos or int(os.getenv("VIVI_HIBRIDO_CANDIDATOS", "30"))
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vivi-bm25")
+
+    def fundir(self, listas, top_k):
+        """RRF: soma de 1/(k + posição) em cada lista; score normalizado para 0..1"""
+        pontuacoes, documentos = {}, {}
+        for lista in listas:
+            for posicao, doc in enumerate(lista, 1):
+                pontuacoes[doc.id] = pontuacoes.get(doc.id, 0.0) + 1.0 / (self.k_rrf + posicao)
+                documentos.setdefault(doc.id, doc)
+
+        from indice_local import Documento
+        maximo = len(listas) / (self.k_rrf + 1)
+        melhores = sorted(pontuacoes.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            Documento(doc_id, pontuacao / maximo, dict(documentos[doc_id].metadata or {}))
+            for doc_id, pontuacao in melhores
+        ]
+
+    def buscar(self, vetor, top_k=10, pergunta=None):
+        candidatos = max(top_k, self.candidatos)
+        if not pergunta:
+            return self.denso.buscar(vetor, top_k)
+        futuro_lexico = self._executor.submit(self.lexico.buscar, pergunta, candidatos)
+        densos = self.denso.buscar(vetor, candidatos)
+        return self.fundir([densos, futuro_lexico.result()], top_k)
+
+    def buscar_por_ids(self, ids):
+        return self.denso.buscar_por_ids(ids)
+
+    def estatisticas(self):
+        return self.denso.estatisticas()
+
+    def versao(self):
+        return self.denso.versao()
+
+
+def criar_recuperador(index, tipo=None):
+    """Cria o recuperador configurado (padrão: Pinecone)"""
+    tipo = (tipo or os.getenv("VIVI_RECUPERADOR", "pinecone")).lower()
+    if tipo == "hibrido":
+        denso = criar_recuperador(index, os.getenv("VIVI_HIBRIDO_DENSO", "pinecone"))
+        caminho = os.getenv("VIVI_INDICE_LEXICO") or os.path.join(
+            os.getenv("VIVI_INDICE_LOCAL", "indice_local"), "metadados.jsonl"
+        )
+        if not os.path.exists(caminho):
+            logger.warning(f"⚠️ Corpus léxico {caminho} não encontrado, usando só a busca vetorial")
+            return denso
+        from indice_lexico import IndiceBM25
+        logger.info(f"🔀 Busca híbrida: {denso.nome} + BM25 ({caminho})")
+        return RecuperadorHibrido(denso, IndiceBM25.de_jsonl(caminho))
+    if tipo == "local":
+        diretorio = os.getenv("VIVI_INDICE_LOCAL", "indice_local")
+        logger.info(f"📂 Usando índice vetorial local: {diretorio}")
+        return RecuperadorLocal(diretorio)
+    if tipo != "pinecone":
+        logger.warning(f"⚠️ VIVI_RECUPERADOR desconhecido ({tipo}), usando Pinecone")
+    return RecuperadorPinecone(index)
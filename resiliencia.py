@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Resiliência das chamadas externas da Vivi IA
+Prazo total da requisição → timeout por etapa (embed, busca, geração) →
+novas tentativas só da etapa que falhou (backoff exponencial com jitter) →
+requisição duplicada (hedge) quando a chamada passa do p95 recente →
+disjuntor por serviço (Pinecone, Gemini)
+"""
+
+import os
+import logging
+import time
+import random
+import asyncio
+from collections import deque
+
+from metricas import NOVAS_TENTATIVAS, HEDGES, FALHAS_ETAPA
+
+logger = logging.getLogger("vivi.resiliencia")
+
+
+class FalhaEtapa(Exception):
+    """Etapa do pipeline sem resultado; retry_after sugere quando tentar de novo (segundos)"""
+    retry_after = None
+
+
+class PrazoEsgotado(FalhaEtapa):
+    """O prazo total da requisição acabou"""
+
+
+class CircuitoAberto(FalhaEtapa):
+    """O disjuntor do serviço está aberto: a chamada nem é feita"""
+
+    def __init__(self, servico, retry_after):
+        super().__init__(f"Serviço {servico} temporariamente indisponível (disjuntor aberto)")
+        self.servico = servico
+        self.retry_after = retry_after
+
+
+class TentativasEsgotadas(FalhaEtapa):
+    """Todas as tentativas da etapa falharam"""
+
+    def __init__(self, etapa, erro):
+        super().__init__(f"Falha na etapa {etapa}: {str(erro) or erro.__class__.__name__}")
+        self.etapa = etapa
+        self.retry_after = 1
+
+
+class Prazo:
+    """Prazo absoluto de uma requisição"""
+
+    def __init__(self, segundos):
+        self.limite = time.monotonic() + segundos
+
+    def restante(self):
+        return self.limite - time.monotonic()
+
+
+class Disjuntor:
+    """Disjuntor de um serviço: abre após falhas seguidas, testa uma chamada após a espera"""
+
+    FECHADO, ABERTO, SEMIABERTO = "fechado", "aberto", "semiaberto"
+
+    def __init__(self, servico, limite_falhas=None, espera=None):
+        self.servico = servico
+        self.limite_falhas = limite_falhas or int(os.getenv("VIVI_DISJUNTOR_FALHAS", "5"))
+        self.espera = espera or float(os.getenv("VIVI_DISJUNTOR_ESPERA", "30"))
+        self.estado = self.FECHADO
+        self.falhas_consecutivas = 0
+        self.aberturas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_andamento = False
+
+    def verificar(self):
+        """Levanta CircuitoAberto se a chamada não deve ser feita agora; True se ela é a chamada de teste"""
+        agora = time.monotonic()
+        if self.estado == self.ABERTO:
+            if agora < self._aberto_ate:
+                raise CircuitoAberto(self.servico, self._aberto_ate - agora)
+            self.estado = self.SEMIABERTO
+            self._teste_em_andamento = False
+        if self.estado == self.SEMIABERTO:
+            # Uma única chamada de teste por vez
+            if self._teste_em_andamento:
+                raise CircuitoAberto(self.servico, 1.0)
+            self._teste_em_andamento = True
+            return True
+        return False
+
+    def registrar_sucesso(self):
+        self.estado = self.FECHADO
+        self.falhas_consecutivas = 0
+        self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        self.falhas_consecutivas += 1
+        if self.estado == self.SEMIABERTO or self.falhas_consecutivas >= self.limite_falhas:
+            if self.estado != self.ABERTO:
+                self.aberturas += 1
+                logger.warning(f"🔌 Disjuntor do {self.servico} aberto por {self.espera:.0f}s")
+            self.estado = self.ABERTO
+            self._aberto_ate = time.monotonic() + self.espera
+            self._teste_em_andamento = False
+
+    def cancelar_teste(self):
+        """Chamada de teste cancelada sem resultado: reabre e libera a vaga do próximo teste"""
+        if self.estado == self.SEMIABERTO:
+            self.estado = self.ABERTO
+            self._aberto_ate = time.monotonic() + self.espera
+        self._teste_em_andamento = False
+
+    def resumo(self):
+        restante = max(0.0, self._aberto_ate - time.monotonic()) if self.estado == self.ABERTO else 0.0
+        return {
+            'estado': self.estado,
+            'falhas_consecutivas': self.falhas_consecutivas,
+            'aberturas': self.aberturas,
+            'reabre_em_s': round(restante, 1)
+        }
+
+
+class PoliticaEtapa:
+    """Timeout, tentativas e hedge de uma etapa; guarda as latências recentes"""
+
+    AMOSTRAS_MINIMAS_HEDGE = 20
+
+    def __init__(self, nome, servico, timeout, tentativas, hedge):
+        self.nome = nome
+        self.servico = servico
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.hedge = hedge
+        self._latencias = deque(maxlen=200)
+        self.hedges_disparados = 0
+        self.hedges_evitados = 0
+        self.novas_tentativas = 0
+
+    def registrar_latencia(self, segundos):
+        self._latencias.append(segundos)
+
+    def atraso_hedge(self):
+        """p95 das latências recentes, a partir do qual a chamada é duplicada (None = sem hedge)"""
+        if not self.hedge or len(self._latencias) < self.AMOSTRAS_MINIMAS_HEDGE:
+            return None
+        ordenadas = sorted(self._latencias)
+        return max(0.05, ordenadas[int(0.95 * (len(ordenadas) - 1))])
+
+    def resumo(self):
+        atraso = self.atraso_hedge()
+        return {
+            'servico': self.servico,
+            'timeout_s': self.timeout,
+            'tentativas': self.tentativas,
+            'hedge': self.hedge,
+            'atraso_hedge_ms': round(atraso * 1000, 1) if atraso is not None else None,
+            'hedges_disparados': self.hedges_disparados,
+            'hedges_evitados': self.hedges_evitados,
+            'novas_tentativas': self.novas_tentativas
+        }
+
+
+def _ativo(variavel, padrao):
+    return os.getenv(variavel, padrao).lower() in ("1", "true", "sim", "yes")
+
+
+class Resiliencia:
+    """Executa as etapas do pipeline assíncrono sob prazo, tentativas, hedge e disjuntores
+
+    pode_duplicar: função que diz se há capacidade para um hedge agora (ex.: thread livre no
+    pool de I/O); sem ela, o hedge sempre pode ser disparado.
+    """
+
+    def __init__(self, pode_duplicar=None):
+        self.pode_duplicar = pode_duplicar
+        self.prazo_requisicao = float(os.getenv("VIVI_PRAZO_REQUISICAO", "30"))
+        self.backoff_base = float(os.getenv("VIVI_BACKOFF_BASE", "0.2"))
+        self.backoff_max = float(os.getenv("VIVI_BACKOFF_MAX", "2"))
+        self.disjuntores = {servico: Disjuntor(servico) for servico in ("pinecone", "gemini")}
+        self.etapas = {
+            'embed': PoliticaEtapa(
+                'embed', 'pinecone', float(os.getenv("VIVI_TIMEOUT_EMBED", "5")),
+                int(os.getenv("VIVI_TENTATIVAS_EMBED", "3")), _ativo("VIVI_HEDGE_EMBED", "1")
+            ),
+            'busca': PoliticaEtapa(
+                'busca', 'pinecone', float(os.getenv("VIVI_TIMEOUT_BUSCA", "5")),
+                int(os.getenv("VIVI_TENTATIVAS_BUSCA", "3")), _ativo("VIVI_HEDGE_BUSCA", "1")
+            ),
+            # Geração duplicada dobra o custo: hedge desligado por padrão
+            'geracao': PoliticaEtapa(
+                'geracao', 'gemini', float(os.getenv("VIVI_TIMEOUT_GERACAO", "25")),
+                int(os.getenv("VIVI_TENTATIVAS_GERACAO", "2")), _ativo("VIVI_HEDGE_GERACAO", "0")
+            ),
+        }
+
+    def novo_prazo(self):
+        return Prazo(self.prazo_requisicao)
+
+    def _espera_backoff(self, tentativa):
+        return min(self.backoff_max, self.backoff_base * (2 ** tentativa)) * random.uniform(0.5, 1.5)
+
+    async def _com_hedge(self, politica, chamada, timeout):
+        """Aguarda a chamada; se passar do p95 recente, dispara uma duplicata e usa a primeira resposta"""
+        atraso = politica.atraso_hedge()
+        if atraso is None or atraso >= timeout:
+            return await asyncio.wait_for(chamada(), timeout)
+
+        limite = time.monotonic() + timeout
+        tarefas = [asyncio.ensure_future(chamada())]
+        try:
+            feitas, _ = await asyncio.wait(tarefas, timeout=atraso)
+            if not feitas:
+                # Com o pool cheio a duplicata só entraria na fila (e a thread da chamada
+                # original segue ocupada mesmo se ela for cancelada): melhor não disparar
+                if self.pode_duplicar is None or self.pode_duplicar():
+                    politica.hedges_disparados += 1
+                    HEDGES.inc(etapa=politica.nome)
+                    tarefas.append(asyncio.ensure_future(chamada()))
+                else:
+                    politica.hedges_evitados += 1
+
+            erro = None
+            while tarefas:
+                restante = limite - time.monotonic()
+                feitas, _ = await asyncio.wait(
+                    tarefas, timeout=max(0.0, restante), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not feitas:
+                    raise asyncio.TimeoutError()
+                for tarefa in feitas:
+                    tarefas.remove(tarefa)
+                    if tarefa.exception() is None:
+                        return tarefa.result()
+                    erro = tarefa.exception()
+            raise erro
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+
+    async def executar(self, etapa, chamada, prazo=None):
+        """Executa chamada() (nova corrotina a cada tentativa) com as regras da etapa"""
+        politica = self.etapas[etapa]
+        disjuntor = self.disjuntores[politica.servico]
+        ultimo_erro = None
+
+        for tentativa in range(politica.tentativas):
+            timeout = politica.timeout
+            if prazo is not None:
+                timeout = min(timeout, prazo.restante())
+                if timeout <= 0:
+                    raise PrazoEsgotado(f"Prazo da requisição esgotado antes da etapa {etapa}")
+            teste = disjuntor.verificar()
+
+            inicio = time.monotonic()
+            try:
+                resultado = await self._com_hedge(politica, chamada, timeout)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and timeout < politica.timeout:
+                    # Timeout cortado pelo prazo da requisição: não diz nada sobre a saúde do serviço
+                    if teste:
+                        disjuntor.cancelar_teste()
+                else:
+                    disjuntor.registrar_falha()
+                FALHAS_ETAPA.inc(etapa=etapa)
+                ultimo_erro = e
+                logger.warning(f"⚠️ Etapa {etapa}: tentativa {tentativa + 1}/{politica.tentativas} falhou "
+                               f"({str(e) or e.__class__.__name__})")
+                if tentativa + 1 < politica.tentativas:
+                    espera = self._espera_backoff(tentativa)
+                    if prazo is not None and prazo.restante() <= espera:
+                        break
+                    politica.novas_tentativas += 1
+                    NOVAS_TENTATIVAS.inc(etapa=etapa)
+                    await asyncio.sleep(espera)
+                continue
+            except BaseException:
+                # Cancelada (cliente desconectou, lote cancelado): sem isso o disjuntor
+                # ficaria semiaberto para sempre, esperando um teste que não termina
+                if teste:
+                    disjuntor.cancelar_teste()
+                raise
+
+            disjuntor.registrar_sucesso()
+            politica.registrar_latencia(time.monotonic() - inicio)
+            return resultado
+
+        if prazo is not None and prazo.restante() <= self.backoff_base:
+            raise PrazoEsgotado(f"Prazo da requisição esgotado na etapa {etapa}") from ultimo_erro
+        raise TentativasEsgotadas(etapa, ultimo_erro) from ultimo_erro
+
+    def resumo(self):
+        """Estado publicado nos endpoints de saúde"""
+        return {
+            'prazo_requisicao_s': self.prazo_requisicao,
+            'disjuntores': {servico: d.resumo() for servico, d in self.disjuntores.items()},
+            'etapas': {nome: politica.resumo() for nome, politica in self.etapas.items()}
+        }
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Respostas prontas da Vivi IA
+As perguntas canônicas mais frequentes passam offline pelo AgenteBuscaGemini;
+resposta, referências e a versão do índice ficam em um arquivo JSON compacto.
+O servidor carrega o arquivo com os corpos HTTP já serializados (e o ETag de
+cada um) e responde essas perguntas sem embedding, busca nem geração.
+
+Quando a versão do índice (marcador gravado pela ingestão) muda, um worker
+reconstrói o arquivo em segundo plano (trava em <arquivo>.lock) e o troca
+atomicamente; os demais recarregam ao notar a mudança. Enquanto a versão não
+bate, ou ainda não é conhecida, as respostas prontas não são servidas.
+Leitura e gravação do arquivo rodam fora do event loop (asyncio.to_thread, a
+partir do monitor); `obter` só consulta o dicionário em memória.
+
+Uso:
+    # historico.txt: uma pergunta por linha (repetições contam como frequência)
+    python respostas_prontas.py historico.txt --top 50 --saida respostas_prontas.json
+"""
+
+import os
+import sys
+import json
+import asyncio
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+
+from cache_semantico import normalizar_pergunta
+from metricas import CACHE
+
+logger = logging.getLogger("vivi.respostas_prontas")
+
+# Trava de reconstrução abandonada (worker que caiu no meio) é ignorada depois disso
+TRAVA_VALIDADE_SEGUNDOS = 900
+# Depois de uma reconstrução sem nenhuma resposta, esperar antes de tentar de novo
+ESPERA_APOS_FALHA_SEGUNDOS = 600
+
+
+def _json_compacto(dados):
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _etag(corpo):
+    return f'"{hashlib.sha1(corpo).hexdigest()[:20]}"'
+
+
+def montar_resposta(corpo, referencias):
+    """Texto completo no formato de /api/buscar (corpo + seção de referências)"""
+    resposta = corpo.rstrip()
+    if referencias:
+        resposta += "\n\nReferências:\n" + "\n".join(f"- {ref}" for ref in referencias)
+    return resposta
+
+
+class RespostaPronta:
+    __slots__ = ('pergunta', 'corpo', 'referencias', 'resposta', 'json', 'etag')
+
+    def __init__(self, pergunta, corpo, referencias, versao_indice):
+        self.pergunta = pergunta
+        self.corpo = corpo
+        self.referencias = referencias
+        self.resposta = montar_resposta(corpo, referencias)
+        # Corpo HTTP de GET /api/respostas-prontas/resposta, serializado uma única vez
+        self.json = _json_compacto({
+            'success': True,
+            'pergunta': pergunta,
+            'resposta': self.resposta,
+            'referencias': referencias,
+            'versao_indice': versao_indice,
+            'pronta': True
+        })
+        self.etag = _etag(self.json)
+
+
+class ArmazemRespostasProntas:
+    """Pergunta normalizada → RespostaPronta, recarregado quando o arquivo muda"""
+
+    def __init__(self, caminho=None, intervalo_verificacao=None):
+        self.caminho = caminho if caminho is not None else os.getenv("VIVI_RESPOSTAS_PRONTAS_ARQUIVO",
+                                                                     "respostas_prontas.json")
+        self.intervalo_verificacao = intervalo_verificacao if intervalo_verificacao is not None else float(
+            os.getenv("VIVI_RESPOSTAS_PRONTAS_VERIFICACAO", "10"))
+        self.max_age = int(os.getenv("VIVI_RESPOSTAS_PRONTAS_MAX_AGE", "300"))
+        # A reconstrução roda ao lado do tráfego normal: poucas buscas e gerações por vez
+        self.max_geracoes = int(os.getenv("VIVI_RESPOSTAS_PRONTAS_GERACOES", "1"))
+        self.max_buscas = int(os.getenv("VIVI_RESPOSTAS_PRONTAS_BUSCAS", "1"))
+        self.versao_indice = None
+        self.gerado_em = None
+        self.perguntas = []
+        self._respostas = {}
+        self._assinatura = None
+        self._proxima_verificacao = 0.0
+        self.indice_json = _json_compacto({'versao_indice': None, 'perguntas': []})
+        self.indice_etag = _etag(self.indice_json)
+        self.reconstruindo = False
+        self._proxima_reconstrucao = 0.0
+        self.acertos = 0
+        self.falhas = 0
+        self.recargas = 0
+        self.recarregar_se_mudou(forcar=True)
+
+    def _assinatura_arquivo(self):
+        try:
+            estado = os.stat(self.caminho)
+        except OSError:
+            return None
+        return estado.st_mtime_ns, estado.st_size, estado.st_ino
+
+    def recarregar_se_mudou(self, forcar=False):
+        """Confere o arquivo (no máximo a cada intervalo_verificacao s) e recarrega se mudou (bloqueante)"""
+        if not self.caminho:
+            return
+        agora = time.monotonic()
+        if not forcar and agora < self._proxima_verificacao:
+            return
+        self._proxima_verificacao = agora + self.intervalo_verificacao
+        assinatura = self._assinatura_arquivo()
+        if assinatura is None or assinatura == self._assinatura:
+            return
+        try:
+            with open(self.caminho, encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Respostas prontas ilegíveis em {self.caminho}: {e}")
+            return
+        versao = dados.get('versao_indice')
+        respostas = {}
+        for registro in dados.get('respostas', []):
+            pronta = RespostaPronta(registro['pergunta'], registro['corpo'], registro.get('referencias', []), versao)
+            respostas[normalizar_pergunta(pronta.pergunta)] = pronta
+        # Troca de uma vez: requisições em andamento veem o conjunto antigo ou o novo, nunca metade
+        self._respostas = respostas
+        self.versao_indice = versao
+        self.gerado_em = dados.get('gerado_em')
+        self.perguntas = dados.get('perguntas') or [pronta.pergunta for pronta in respostas.values()]
+        self.indice_json = _json_compacto({
+            'versao_indice': versao,
+            'gerado_em': self.gerado_em,
+            'perguntas': [pronta.pergunta for pronta in respostas.values()]
+        })
+        self.indice_etag = _etag(self.indice_json)
+        self._assinatura = assinatura
+        self.recargas += 1
+        logger.info(f"📌 Respostas prontas carregadas: {len(respostas)} perguntas (índice {versao})")
+
+    def __len__(self):
+        return len(self._respostas)
+
+    def valida(self, versao_atual):
+        """As respostas valem para a versão atual do índice? (desconhecida, None: não valem)"""
+        return versao_atual is not None and versao_atual == self.versao_indice
+
+    def obter(self, pergunta, versao_atual=None):
+        """RespostaPronta da pergunta (comparação normalizada), ou None se não houver ou estiver vencida"""
+        pronta = self._respostas.get(normalizar_pergunta(pergunta)) if self.valida(versao_atual) else None
+        if pronta is None:
+            self.falhas += 1
+        else:
+            self.acertos += 1
+        if self._respostas:
+            CACHE.inc(cache='respostas_prontas', resultado='acerto' if pronta else 'falha')
+        return pronta
+
+    def cabecalhos(self, etag):
+        return {'ETag': etag, 'Cache-Control': f'public, max-age={self.max_age}'}
+
+    def precisa_reconstruir(self, versao_atual):
+        """Há perguntas, a versão do índice mudou e nenhuma reconstrução está em andamento neste worker"""
+        return (bool(self.perguntas) and versao_atual is not None and versao_atual != self.versao_indice
+                and not self.reconstruindo and time.monotonic() >= self._proxima_reconstrucao)
+
+    def _travar(self):
+        """Só um worker reconstrói; trava abandonada há mais de TRAVA_VALIDADE_SEGUNDOS é descartada"""
+        trava = f"{self.caminho}.lock"
+        try:
+            if time.time() - os.path.getmtime(trava) > TRAVA_VALIDADE_SEGUNDOS:
+                os.remove(trava)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return trava
+        except FileExistsError:
+            return None
+
+    def _destravar(self, trava):
+        """Remove a trava e carrega o arquivo novo"""
+        try:
+            os.remove(trava)
+        except OSError:
+            pass
+        self.recarregar_se_mudou(forcar=True)
+
+    async def areconstruir(self, agente, versao_indice):
+        """Passa as perguntas do arquivo pelo agente e troca o arquivo; retorna quantas foram gravadas"""
+        trava = await asyncio.to_thread(self._travar)
+        if trava is None:
+            logger.info("📌 Reconstrução das respostas prontas em andamento em outro worker")
+            return 0
+        self.reconstruindo = True
+        try:
+            logger.info(f"📌 Reconstruindo {len(self.perguntas)} respostas prontas para o índice {versao_indice}")
+            lote = agente.aexecutar_lote(self.perguntas, max_geracoes=self.max_geracoes, max_buscas=self.max_buscas)
+            resultados = [resultado async for resultado in lote]
+            gravadas = await asyncio.to_thread(gravar, self.caminho, versao_indice, self.perguntas, resultados)
+        except Exception as e:
+            logger.error(f"❌ Erro ao reconstruir as respostas prontas: {e}")
+            gravadas = 0
+        finally:
+            self.reconstruindo = False
+            await asyncio.to_thread(self._destravar, trava)
+        if not gravadas:
+            self._proxima_reconstrucao = time.monotonic() + ESPERA_APOS_FALHA_SEGUNDOS
+        return gravadas
+
+    def estatisticas(self):
+        return {
+            'perguntas': len(self._respostas),
+            'versao_indice': self.versao_indice,
+            'gerado_em': self.gerado_em,
+            'reconstruindo': self.reconstruindo,
+            'recargas': self.recargas,
+            'acertos': self.acertos,
+            'falhas': self.falhas
+        }
+
+
+def gravar(caminho, versao_indice, perguntas, resultados):
+    """Grava as respostas bem-sucedidas do lote (arquivo temporário + os.replace); retorna quantas"""
+    from agente_busca_gemini import SeparadorReferencias
+
+    respostas = []
+    for resultado in sorted(resultados, key=lambda resultado: resultado['indice']):
+        if not resultado['success'] or resultado.get('resultado') in ('erro', 'sem_documentos'):
+            logger.warning(f"⚠️ Sem resposta pronta para: {resultado['pergunta']}")
+            continue
+        separador = SeparadorReferencias()
+        corpo = separador.alimentar(resultado['resposta'])
+        restante, referencias = separador.finalizar()
+        respostas.append({'pergunta': resultado['pergunta'], 'corpo': corpo + restante, 'referencias': referencias})
+    if not respostas:
+        logger.error("❌ Nenhuma resposta pronta gerada; arquivo anterior mantido")
+        return 0
+
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'versao_indice': versao_indice,
+            'gerado_em': datetime.now(timezone.utc).isoformat(),
+            'perguntas': perguntas,
+            'respostas': respostas
+        }, arquivo, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporario, caminho)
+    return len(respostas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula as respostas das perguntas mais frequentes da Vivi IA")
+    parser.add_argument('historico', help="Arquivo com uma pergunta por linha")
+    parser.add_argument('--top', type=int, default=50, help="Quantidade de perguntas mais frequentes")
+    parser.add_argument('--saida', default=os.getenv("VIVI_RESPOSTAS_PRONTAS_ARQUIVO", "respostas_prontas.json"))
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    from log_estruturado import configurar_logging
+    configurar_logging(formato="texto")
+    from faq_consultas import perguntas_mais_frequentes
+    from agente_busca_gemini import AgenteBuscaGemini
+
+    perguntas = perguntas_mais_frequentes(args.historico, args.top)
+    print(f"📌 {len(perguntas)} perguntas selecionadas do histórico")
+    agente = AgenteBuscaGemini()
+    versao = agente.versao_do_indice()
+    if versao is None:
+        print("❌ Índice sem marcador de versão: rode 'python ingestao.py --marcar-versao' antes")
+        return 1
+    gravadas = gravar(args.saida, versao, perguntas, agente.executar_lote(perguntas))
+    print(f"💾 Respostas prontas gravadas em {args.saida}: {gravadas} perguntas (índice {versao})")
+    return 0 if gravadas else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Seleção adaptativa dos documentos enviados ao Gemini
+Candidatos do recuperador → piso de score → corte no "cotovelo" (maior queda de score)
+→ diversidade MMR (texto parecido e mesmo document_title penalizados)
+
+Piso e cotovelo supõem scores de similaridade (cosseno). Scores de fusão por
+posição (RRF, busca híbrida) põem um acerto só do BM25 na metade do máximo:
+nesse caso os dois cortes são pulados e só a diversidade limita os documentos.
+"""
+
+import os
+from dataclasses import dataclass, asdict
+
+from construtor_contexto import termos_relevantes
+
+
+@dataclass
+class EstatisticasSelecao:
+    """O que aconteceu com os candidatos de uma requisição"""
+    candidatos: int = 0
+    abaixo_do_piso: int = 0
+    cortados_no_cotovelo: int = 0
+    removidos_diversidade: int = 0
+    selecionados: int = 0
+    score_maximo: float = 0.0
+    score_minimo_selecionado: float = 0.0
+    escala: str = "similaridade"
+
+    def como_dict(self):
+        return asdict(self)
+
+
+def _texto_e_titulo(doc):
+    metadata = getattr(doc, 'metadata', None) or {}
+    texto = metadata.get('text') or metadata.get('content') or metadata.get('chunk_text') or ''
+    titulo = metadata.get('document_title') or metadata.get('source') or ''
+    return texto, titulo
+
+
+class SeletorDocumentos:
+    """Escolhe quantos e quais candidatos vão para o contexto"""
+
+    def __init__(self, candidatos=None, maximo=None, minimo=None, score_minimo=None,
+                 cotovelo=None, lambda_mmr=None, penalidade_titulo=None, max_por_titulo=None):
+        self.candidatos = candidatos or int(os.getenv("VIVI_SELECAO_CANDIDATOS", "20"))
+        self.maximo = maximo or int(os.getenv("VIVI_SELECAO_MAX_DOCUMENTOS", "8"))
+        self.minimo = minimo or int(os.getenv("VIVI_SELECAO_MIN_DOCUMENTOS", "1"))
+        self.score_minimo = score_minimo if score_minimo is not None else float(
+            os.getenv("VIVI_SELECAO_SCORE_MIN", "0.2")
+        )
+        # Queda entre scores vizinhos, relativa ao melhor score, que marca o cotovelo
+        self.cotovelo = cotovelo if cotovelo is not None else float(os.getenv("VIVI_SELECAO_COTOVELO", "0.2"))
+        self.lambda_mmr = lambda_mmr if lambda_mmr is not None else float(os.getenv("VIVI_SELECAO_LAMBDA_MMR", "0.7"))
+        self.penalidade_titulo = penalidade_titulo if penalidade_titulo is not None else float(
+            os.getenv("VIVI_SELECAO_PENALIDADE_TITULO", "0.5")
+        )
+        self.max_por_titulo = max_por_titulo or int(os.getenv("VIVI_SELECAO_MAX_POR_TITULO", "3"))
+
+    def _cortar_no_cotovelo(self, documentos):
+        """Mantém os documentos até a primeira queda de score maior que o cotovelo"""
+        melhor = documentos[0].score
+        for i in range(max(1, self.minimo), len(documentos)):
+            if documentos[i - 1].score - documentos[i].score >= self.cotovelo * melhor:
+                return documentos[:i]
+        return documentos
+
+    def _similaridade(self, termos_a, titulo_a, termos_b, titulo_b):
+        uniao = termos_a | termos_b
+        jaccard = len(termos_a & termos_b) / len(uniao) if uniao else 0.0
+        if titulo_a and titulo_a == titulo_b:
+            return max(jaccard, self.penalidade_titulo)
+        return jaccard
+
+    def _diversificar(self, documentos, estatisticas):
+        """MMR: relevância (relativa ao melhor score) menos a semelhança com os já escolhidos"""
+        melhor = documentos[0].score or 1.0
+        restantes = []
+        for doc in documentos:
+            texto, titulo = _texto_e_titulo(doc)
+            restantes.append((doc, termos_relevantes(texto), titulo))
+
+        escolhidos, por_titulo = [], {}
+        while restantes and len(escolhidos) < self.maximo:
+            melhor_indice, melhor_valor = None, None
+            for indice, (doc, termos, titulo) in enumerate(restantes):
+                if titulo and por_titulo.get(titulo, 0) >= self.max_por_titulo:
+                    continue
+                semelhanca = max(
+                    (self._similaridade(termos, titulo, t, ti) for _, t, ti in escolhidos), default=0.0
+                )
+                valor = self.lambda_mmr * doc.score / melhor - (1 - self.lambda_mmr) * semelhanca
+                if melhor_valor is None or valor > melhor_valor:
+                    melhor_indice, melhor_valor = indice, valor
+            if melhor_indice is None:
+                break
+            escolhido = restantes.pop(melhor_indice)
+            escolhidos.append(escolhido)
+            if escolhido[2]:
+                por_titulo[escolhido[2]] = por_titulo.get(escolhido[2], 0) + 1
+
+        estatisticas.removidos_diversidade = len(restantes)
+        return [doc for doc, _, _ in escolhidos]
+
+    def selecionar(self, documentos, escala="similaridade"):
+        """Retorna (documentos selecionados, EstatisticasSelecao)
+
+        `escala` é a do recuperador: com 'posicao' (RRF) piso e cotovelo não se aplicam.
+        """
+        estatisticas = EstatisticasSelecao(candidatos=len(documentos), escala=escala)
+        if not documentos:
+            return [], estatisticas
+
+        ordenados = sorted(documentos, key=lambda doc: doc.score or 0.0, reverse=True)
+        estatisticas.score_maximo = float(ordenados[0].score or 0.0)
+        cortados = ordenados
+        if escala == "similaridade":
+            # Piso de score; o melhor candidato é mantido mesmo abaixo do piso
+            acima = [doc for doc in ordenados if (doc.score or 0.0) >= self.score_minimo]
+            if len(acima) < self.minimo:
+                acima = ordenados[:self.minimo]
+            estatisticas.abaixo_do_piso = len(ordenados) - len(acima)
+
+            cortados = self._cortar_no_cotovelo(acima)
+            estatisticas.cortados_no_cotovelo = len(acima) - len(cortados)
+
+        selecionados = self._diversificar(cortados, estatisticas)
+        estatisticas.selecionados = len(selecionados)
+        estatisticas.score_minimo_selecionado = float(min(doc.score or 0.0 for doc in selecionados))
+        return selecionados, estatisticas
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Sessões de conversa da Vivi IA
+Cada sessão guarda os últimos N turnos (pergunta, consulta usada na busca e um
+resumo curto da resposta) e os IDs dos documentos já enviados ao Gemini. Uma
+pergunta de continuação ("E o prazo?") vira uma consulta completa, recebe só
+os documentos novos e leva o resumo da conversa no lugar do histórico inteiro.
+
+Em memória do worker (LRU limitado por número de sessões e por bytes, com TTL de
+inatividade) e, com um armazenamento compartilhado (SQLite ou Redis), também nele:
+qualquer worker continua a conversa. Sem ele, as sessões exigem roteamento fixo
+(sticky) por cliente quando há mais de um worker.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import List
+
+from cache_semantico import normalizar_pergunta
+from construtor_contexto import termos_relevantes
+
+logger = logging.getLogger("vivi.sessoes")
+
+# Pergunta que depende da anterior: começa com um conectivo, retoma algo já dito
+# ou tem no máximo TERMOS_MAX_CONTINUACAO termos relevantes (palavras normalizadas)
+CONECTIVOS_CONTINUACAO = {"e", "mas", "entao", "tambem", "agora"}
+RETOMADAS = {
+    "isso", "disso", "nisso", "esse", "essa", "desse", "dessa", "nesse", "nessa",
+    "ele", "ela", "dele", "dela", "nele", "nela", "mesmo", "mesma", "anterior"
+}
+TERMOS_MAX_CONTINUACAO = 1
+# Chaves das sessões no armazenamento compartilhado
+PREFIXO_SESSAO = "sessao:"
+# Tamanho máximo da consulta reescrita e do resumo de cada resposta
+CONSULTA_MAX_CARACTERES = 300
+RESPOSTA_RESUMO_CARACTERES = 280
+
+
+def resumir_resposta(resposta, max_caracteres=RESPOSTA_RESUMO_CARACTERES):
+    """Primeiras frases da resposta, sem a seção de referências"""
+    corpo = re.split(r'\n\s*\**Referências:?\**', resposta or '', maxsplit=1)[0]
+    corpo = ' '.join(corpo.replace('*', '').split())
+    if len(corpo) <= max_caracteres:
+        return corpo
+    corte = corpo[:max_caracteres]
+    fim_frase = corte.rfind('. ')
+    return corte[:fim_frase + 1] if fim_frase > max_caracteres // 2 else corte.rstrip() + '…'
+
+
+@dataclass
+class Turno:
+    pergunta: str
+    consulta: str
+    resposta: str
+    documentos: List[str] = field(default_factory=list)
+
+    def tamanho(self):
+        return len(self.pergunta) + len(self.consulta) + len(self.resposta) + sum(len(d) for d in self.documentos)
+
+
+class Sessao:
+    def __init__(self, id_sessao, max_turnos, max_documentos):
+        self.id = id_sessao
+        self.turnos = deque(maxlen=max_turnos)
+        # IDs dos documentos já enviados ao Gemini (ordem de uso)
+        self.documentos = OrderedDict()
+        self.max_documentos = max_documentos
+        self.atualizada_em = time.time()
+
+    def continuacao(self, pergunta):
+        """A pergunta depende da conversa?"""
+        if not self.turnos:
+            return False
+        palavras = normalizar_pergunta(pergunta).split()
+        return (bool(palavras) and palavras[0] in CONECTIVOS_CONTINUACAO
+                or not RETOMADAS.isdisjoint(palavras)
+                or len(termos_relevantes(pergunta)) <= TERMOS_MAX_CONTINUACAO)
+
+    def reescrever(self, pergunta):
+        """Consulta de busca da continuação: a pergunta mais o assunto do turno anterior"""
+        anterior = self.turnos[-1].consulta
+        return f"{pergunta} {anterior}"[:CONSULTA_MAX_CARACTERES]
+
+    def resumo(self, max_caracteres):
+        """Resumo da conversa até aqui (turnos mais recentes primeiro a entrar no limite)"""
+        linhas = []
+        total = 0
+        for turno in reversed(self.turnos):
+            linha = f"- Usuário: {turno.pergunta}\n  Vivi IA: {turno.resposta}"
+            if total + len(linha) > max_caracteres and linhas:
+                break
+            linhas.append(linha)
+            total += len(linha)
+        return '\n'.join(reversed(linhas))
+
+    def separar(self, documentos):
+        """(novos, já enviados) na ordem da busca"""
+        novos, vistos = [], []
+        for doc in documentos:
+            (vistos if str(getattr(doc, 'id', '')) in self.documentos else novos).append(doc)
+        return novos, vistos
+
+    def registrar(self, pergunta, consulta, resposta, documentos):
+        ids = [str(getattr(doc, 'id', '')) for doc in documentos]
+        self.turnos.append(Turno(pergunta, consulta, resumir_resposta(resposta), ids))
+        for id_documento in ids:
+            self.documentos.pop(id_documento, None)
+            self.documentos[id_documento] = True
+        while len(self.documentos) > self.max_documentos:
+            self.documentos.popitem(last=False)
+        self.atualizada_em = time.time()
+
+    def tamanho(self):
+        return sum(turno.tamanho() for turno in self.turnos) + sum(len(d) for d in self.documentos)
+
+    def como_dict(self):
+        return {
+            'sessao_id': self.id,
+            'turnos': len(self.turnos),
+            'documentos': len(self.documentos)
+        }
+
+    def como_registro(self):
+        """Sessão serializada para o armazenamento compartilhado"""
+        return json.dumps({
+            'turnos': [[t.pergunta, t.consulta, t.resposta, t.documentos] for t in self.turnos],
+            'documentos': list(self.documentos),
+            'atualizada_em': self.atualizada_em
+        }, ensure_ascii=False).encode('utf-8')
+
+    @classmethod
+    def de_registro(cls, id_sessao, registro, max_turnos, max_documentos):
+        dados = json.loads(registro)
+        sessao = cls(id_sessao, max_turnos, max_documentos)
+        sessao.turnos.extend(Turno(*turno) for turno in dados['turnos'])
+        sessao.documentos.update((id_documento, True) for id_documento in dados['documentos'])
+        sessao.atualizada_em = dados['atualizada_em']
+        return sessao
+
+
+class GerenciadorSessoes:
+    def __init__(self, max_sessoes=None, ttl_segundos=None, max_turnos=None, max_documentos=None,
+                 max_bytes=None, documentos_continuacao=None, resumo_max_caracteres=None, armazenamento=None):
+        self.max_sessoes = max_sessoes or int(os.getenv("VIVI_SESSOES_MAX", "5000"))
+        self.ttl_segundos = ttl_segundos if ttl_segundos is not None else float(os.getenv("VIVI_SESSAO_TTL", "1800"))
+        self.max_turnos = max_turnos or int(os.getenv("VIVI_SESSAO_TURNOS", "6"))
+        self.max_documentos = max_documentos or int(os.getenv("VIVI_SESSAO_DOCUMENTOS", "40"))
+        self.max_bytes = max_bytes or int(float(os.getenv("VIVI_SESSOES_MAX_MB", "16")) * 1024 * 1024)
+        # Documentos enviados em uma continuação (os novos primeiro)
+        self.documentos_continuacao = documentos_continuacao or int(os.getenv("VIVI_SESSAO_DOCUMENTOS_CONTINUACAO", "4"))
+        self.resumo_max_caracteres = resumo_max_caracteres or int(os.getenv("VIVI_SESSAO_RESUMO_MAX", "1500"))
+        # Backend compartilhado pelos workers (None: sessões só neste processo)
+        self.armazenamento = armazenamento
+        self._sessoes = OrderedDict()
+        self._tamanhos = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.criadas = 0
+        self.descartadas = 0
+
+    def _remover(self, id_sessao):
+        self._sessoes.pop(id_sessao, None)
+        self._bytes -= self._tamanhos.pop(id_sessao, 0)
+
+    def _expirada(self, sessao, agora):
+        return self.ttl_segundos > 0 and agora - sessao.atualizada_em > self.ttl_segundos
+
+    def obter(self, id_sessao):
+        """Sessão ativa pelo ID neste processo, ou None"""
+        with self._lock:
+            sessao = self._sessoes.get(id_sessao) if id_sessao else None
+            if sessao is None:
+                return None
+            if self._expirada(sessao, time.time()):
+                self._remover(id_sessao)
+                return None
+            self._sessoes.move_to_end(id_sessao)
+            return sessao
+
+    def criar(self):
+        """Nova sessão (com um ID novo) neste processo"""
+        sessao = Sessao(uuid.uuid4().hex, self.max_turnos, self.max_documentos)
+        with self._lock:
+            self._sessoes[sessao.id] = sessao
+            self._tamanhos[sessao.id] = 0
+            self.criadas += 1
+            self._limitar()
+        return sessao
+
+    def carregar_compartilhada(self, id_sessao):
+        """Sessão do armazenamento compartilhado (a versão mais recente, de qualquer worker), ou None
+
+        Substitui a cópia local. Bloqueante: no event loop, chamar em uma thread.
+        """
+        if self.armazenamento is None or not id_sessao:
+            return None
+        chave = PREFIXO_SESSAO + id_sessao
+        try:
+            registro = self.armazenamento.obter_varios([chave]).get(chave)
+        except Exception as e:
+            logger.warning(f"⚠️ Sessões compartilhadas indisponíveis: {e}")
+            return self.obter(id_sessao)
+        if registro is None:
+            return None
+        sessao = Sessao.de_registro(id_sessao, registro, self.max_turnos, self.max_documentos)
+        if self._expirada(sessao, time.time()):
+            return None
+        with self._lock:
+            self._remover(id_sessao)
+            self._sessoes[id_sessao] = sessao
+            self._tamanhos[id_sessao] = sessao.tamanho()
+            self._bytes += self._tamanhos[id_sessao]
+            self._limitar()
+        return sessao
+
+    def registro(self, sessao):
+        """Sessão serializada para guardar_compartilhada, ou None sem armazenamento compartilhado"""
+        return sessao.como_registro() if self.armazenamento is not None else None
+
+    def guardar_compartilhada(self, id_sessao, registro):
+        """Grava a sessão serializada no armazenamento compartilhado (expira junto com o TTL)
+
+        Bloqueante: no event loop, chamar em uma thread.
+        """
+        try:
+            self.armazenamento.guardar_varios({PREFIXO_SESSAO + id_sessao: registro},
+                                              ttl=self.ttl_segundos or None)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar a sessão no armazenamento compartilhado: {e}")
+
+    def atualizar(self, sessao):
+        """Recalcula o tamanho da sessão após um turno e descarta as menos usadas acima dos limites"""
+        with self._lock:
+            if sessao.id not in self._sessoes:
+                return
+            tamanho = sessao.tamanho()
+            self._bytes += tamanho - self._tamanhos.get(sessao.id, 0)
+            self._tamanhos[sessao.id] = tamanho
+            self._sessoes.move_to_end(sessao.id)
+            self._limitar()
+
+    def _limitar(self):
+        while self._sessoes and (len(self._sessoes) > self.max_sessoes or self._bytes > self.max_bytes):
+            self._remover(next(iter(self._sessoes)))
+            self.descartadas += 1
+
+    def encerrar(self, id_sessao):
+        """Descarta a sessão (aqui e no armazenamento compartilhado); bloqueante com o compartilhado"""
+        with self._lock:
+            existia = id_sessao in self._sessoes
+            self._remover(id_sessao)
+        if self.armazenamento is not None:
+            chave = PREFIXO_SESSAO + id_sessao
+            try:
+                existia = bool(self.armazenamento.obter_varios([chave])) or existia
+                self.armazenamento.remover([chave])
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao encerrar a sessão no armazenamento compartilhado: {e}")
+        return existia
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'sessoes': len(self._sessoes),
+                'max_sessoes': self.max_sessoes,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_segundos': self.ttl_segundos,
+                'max_turnos': self.max_turnos,
+                'compartilhadas': self.armazenamento.descricao() if self.armazenamento is not None else None,
+                'criadas': self.criadas,
+                'descartadas': self.descartadas
+            }
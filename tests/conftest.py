@@ -0,0 +1,55 @@
+"""
+Configuração comum dos testes da Vivi IA
+Os testes rodam sem rede: Pinecone e Gemini são os falsos de benchmarks/falsos.py.
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for caminho in (RAIZ, os.path.join(RAIZ, 'frontend'), os.path.join(RAIZ, 'benchmarks')):
+    if caminho not in sys.path:
+        sys.path.insert(0, caminho)
+
+# Mesmo ambiente isolado do benchmark: sem arquivos locais nem limite por cliente
+os.environ['VIVI_PROMPT_MODO'] = 'sistema'
+os.environ['VIVI_FAQ_ARQUIVO'] = ''
+os.environ['VIVI_RESPOSTAS_PRONTAS_ARQUIVO'] = ''
+os.environ['VIVI_CACHE_BACKEND'] = 'memoria'
+os.environ['VIVI_EMBEDDINGS_DB'] = ''
+os.environ['VIVI_RECUPERADOR'] = 'pinecone'
+os.environ['VIVI_LIMITE_POR_MINUTO'] = '0'
+os.environ.setdefault('VIVI_LOG_NIVEL', 'WARNING')
+os.environ.setdefault('PINECONE_API_KEY', 'teste')
+os.environ.setdefault('GOOGLE_API_KEY', 'teste')
+
+
+class ClienteASGI:
+    """Cliente síncrono sobre httpx.ASGITransport, como em benchmarks/executar.py
+    (o TestClient do Starlette depende da versão instalada do httpx)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, metodo, url, **kwargs):
+        async def enviar():
+            transporte = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+                return await cliente.request(metodo, url, **kwargs)
+        return asyncio.run(enviar())
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+@pytest.fixture
+def cliente():
+    import app_fastapi
+    return ClienteASGI(app_fastapi.app)
@@ -0,0 +1,38 @@
+"""Rotas de administração: fechadas quando VIVI_ADMIN_TOKEN não está configurado"""
+
+import app_fastapi
+from admissao import LimitadorClientes
+
+
+def test_invalidar_cache_sem_token_configurado(cliente, monkeypatch):
+    monkeypatch.delenv('VIVI_ADMIN_TOKEN', raising=False)
+    assert cliente.post('/api/cache/invalidar').status_code == 403
+    assert cliente.post('/api/cache/invalidar', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_invalidar_cache_com_token_errado(cliente, monkeypatch):
+    monkeypatch.setenv('VIVI_ADMIN_TOKEN', 'segredo')
+    assert cliente.post('/api/cache/invalidar').status_code == 403
+    assert cliente.post('/api/cache/invalidar', headers={'X-Admin-Token': 'outro'}).status_code == 403
+
+
+def test_invalidar_cache_com_token_certo(cliente, monkeypatch):
+    monkeypatch.setenv('VIVI_ADMIN_TOKEN', 'segredo')
+    monkeypatch.setattr(app_fastapi, 'agente_inicializado', False)
+    # Token aceito; sem agente, a rota responde 503 em vez de 403
+    assert cliente.post('/api/cache/invalidar', headers={'X-Admin-Token': 'segredo'}).status_code == 503
+
+
+def test_lote_sem_token_configurado(cliente, monkeypatch):
+    monkeypatch.delenv('VIVI_ADMIN_TOKEN', raising=False)
+    resposta = cliente.post('/api/buscar/lote', json={'perguntas': ['Qual o prazo do recurso?'] * 1000})
+    assert resposta.status_code == 403
+
+
+def test_lote_passa_pelo_limite_por_cliente(cliente, monkeypatch):
+    monkeypatch.setenv('VIVI_ADMIN_TOKEN', 'segredo')
+    monkeypatch.setattr(app_fastapi, 'limitador', LimitadorClientes(por_minuto=1, rajada=1))
+    cabecalhos = {'X-Admin-Token': 'segredo'}
+    # A primeira requisição consome o balde (e é recusada por vir vazia); a segunda já é barrada
+    assert cliente.post('/api/buscar/lote', json={'perguntas': []}, headers=cabecalhos).status_code == 400
+    assert cliente.post('/api/buscar/lote', json={'perguntas': []}, headers=cabecalhos).status_code == 429
@@ -0,0 +1,85 @@
+"""Admissão: balde por cliente (local e compartilhado), 429 com Retry-After e 503 com a fila cheia"""
+
+import asyncio
+import time
+
+import pytest
+
+import app_fastapi
+import falsos
+from admissao import ControleAdmissao, LimitadorClientes, Sobrecarga
+from cache_compartilhado import ArmazenamentoSQLite
+
+
+def test_balde_se_repoe_com_o_tempo():
+    limitador = LimitadorClientes(por_minuto=600, rajada=2)
+    assert limitador.consumir('1.2.3.4') == 0
+    assert limitador.consumir('1.2.3.4') == 0
+    espera = limitador.consumir('1.2.3.4')
+    assert 0 < espera <= 0.1
+    # Outro cliente tem o próprio balde
+    assert limitador.consumir('5.6.7.8') == 0
+    time.sleep(espera + 0.02)
+    assert limitador.consumir('1.2.3.4') == 0
+
+
+def test_balde_compartilhado_entre_workers(tmp_path):
+    caminho = str(tmp_path / 'cache.db')
+    worker_a = LimitadorClientes(por_minuto=1, rajada=2, armazenamento=ArmazenamentoSQLite(caminho))
+    worker_b = LimitadorClientes(por_minuto=1, rajada=2, armazenamento=ArmazenamentoSQLite(caminho))
+    assert worker_a.consumir('1.2.3.4') == 0
+    assert worker_b.consumir('1.2.3.4') == 0
+    # A rajada vale para os dois workers juntos, não para cada um
+    assert worker_a.consumir('1.2.3.4') > 0
+    assert worker_b.consumir('1.2.3.4') > 0
+
+
+def test_limite_responde_429_com_retry_after(cliente, monkeypatch):
+    monkeypatch.setattr(app_fastapi, 'limitador', LimitadorClientes(por_minuto=1, rajada=1))
+    # A primeira requisição consome o balde (e é recusada por vir vazia); a segunda já é barrada
+    assert cliente.post('/api/buscar', json={'pergunta': ' '}).status_code == 400
+    resposta = cliente.post('/api/buscar', json={'pergunta': 'Qual o prazo do recurso?'})
+    assert resposta.status_code == 429
+    assert 55 <= int(resposta.headers['Retry-After']) <= 60
+
+
+def test_fila_cheia_recusa_na_hora():
+    async def cenario():
+        controle = ControleAdmissao('teste', 1, max_fila=1, espera_max=5)
+        liberar = asyncio.Event()
+
+        async def ocupar():
+            async with controle.vaga():
+                await liberar.wait()
+
+        tarefas = [asyncio.ensure_future(ocupar()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert controle.em_uso == 1 and controle.na_fila == 1
+        inicio = time.monotonic()
+        with pytest.raises(Sobrecarga) as erro:
+            async with controle.vaga():
+                pass
+        assert time.monotonic() - inicio < 0.1
+        assert erro.value.retry_after >= 1
+        liberar.set()
+        await asyncio.gather(*tarefas)
+
+    asyncio.run(cenario())
+
+
+def test_fila_cheia_responde_503_com_retry_after(cliente, monkeypatch):
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=0, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    monkeypatch.setattr(app_fastapi, 'agente', agente)
+    monkeypatch.setattr(app_fastapi, 'agente_inicializado', True)
+    # Todas as vagas ocupadas e a fila no limite
+    agente.admissao.em_uso = agente.admissao.max_simultaneas
+    agente.admissao.na_fila = agente.admissao.max_fila
+    try:
+        resposta = cliente.post('/api/buscar/stream', json={'pergunta': 'Qual o prazo do recurso?'})
+        assert resposta.status_code == 503
+        assert int(resposta.headers['Retry-After']) >= 1
+    finally:
+        agente._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,74 @@
+"""Caches compartilhados: o backend (SQLite/Redis) nunca é consultado no event loop"""
+
+import asyncio
+import threading
+
+import pytest
+
+import falsos
+from cache_compartilhado import ArmazenamentoMemoria
+
+
+class ArmazenamentoRegistrado(ArmazenamentoMemoria):
+    """Backend em memória que anota a thread de cada chamada (faz o papel do SQLite/Redis)"""
+
+    nome = "registrado"
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def obter_varios(self, chaves):
+        self.threads.append(threading.current_thread())
+        return super().obter_varios(chaves)
+
+    def guardar_varios(self, valores, ttl=None):
+        self.threads.append(threading.current_thread())
+        super().guardar_varios(valores, ttl)
+
+    def incrementar(self, chave):
+        self.threads.append(threading.current_thread())
+        return super().incrementar(chave)
+
+    def contador(self, chave):
+        self.threads.append(threading.current_thread())
+        return super().contador(chave)
+
+
+@pytest.fixture
+def agente():
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=0, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    agente.armazenamento = ArmazenamentoRegistrado()
+    agente.cache_respostas.armazenamento = agente.armazenamento
+    agente.cache_respostas.intervalo_versao = 0
+    agente.cache_embeddings.armazenamento = agente.armazenamento
+    yield agente
+    agente._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_backend_fora_do_event_loop(agente):
+    pergunta = "Como atualizar o cadastro do servidor no SIAPE?"
+
+    async def perguntar():
+        primeira = await agente.aexecutar_busca_completa(pergunta)
+        # Gravação no backend em segundo plano: esperar por ela antes de simular outro worker
+        for _ in range(100):
+            if any(chave.startswith('resp:') for chave in agente.armazenamento._valores):
+                break
+            await asyncio.sleep(0.01)
+        agente.cache_respostas._limpar()
+        segunda = await agente.aexecutar_busca_completa(pergunta)
+        lote = [resultado async for resultado in agente.aexecutar_lote([pergunta, "Outra pergunta sobre a folha?"])]
+        await agente.ainvalidar_cache()
+        return primeira, segunda, lote
+
+    primeira, segunda, lote = asyncio.run(perguntar())
+
+    assert segunda == primeira
+    assert agente.cache_respostas.acertos_compartilhados == 1
+    assert all(resultado['success'] for resultado in lote)
+    assert agente.armazenamento.threads
+    assert threading.main_thread() not in agente.armazenamento.threads
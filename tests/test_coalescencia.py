@@ -0,0 +1,125 @@
+"""Coalescência: uma execução para N perguntas idênticas, erro compartilhado e desistência da líder"""
+
+import asyncio
+
+import pytest
+
+import falsos
+from coalescencia import Coalescedor
+
+
+def test_uma_chamada_para_perguntas_identicas():
+    async def cenario():
+        coalescedor = Coalescedor('teste')
+        chamadas = []
+        liberar = asyncio.Event()
+
+        async def fabrica():
+            chamadas.append(1)
+            await liberar.wait()
+            return 'resposta'
+
+        tarefas = [asyncio.ensure_future(coalescedor.executar('chave', fabrica)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        liberar.set()
+        return await asyncio.gather(*tarefas), chamadas, coalescedor
+
+    resultados, chamadas, coalescedor = asyncio.run(cenario())
+    assert resultados == ['resposta'] * 5
+    assert len(chamadas) == 1
+    assert (coalescedor.lideres, coalescedor.seguidores) == (1, 4)
+    assert coalescedor.resumo()['em_voo'] == 0
+
+
+def test_seguidoras_recebem_o_erro_da_lider():
+    async def cenario():
+        coalescedor = Coalescedor('teste')
+        liberar = asyncio.Event()
+
+        async def fabrica():
+            await liberar.wait()
+            raise ValueError('falhou')
+
+        tarefas = [asyncio.ensure_future(coalescedor.executar('chave', fabrica)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        liberar.set()
+        return await asyncio.gather(*tarefas, return_exceptions=True)
+
+    erros = asyncio.run(cenario())
+    assert all(isinstance(erro, ValueError) for erro in erros)
+
+
+def test_lider_cancelada_nao_cancela_seguidoras():
+    async def cenario():
+        coalescedor = Coalescedor('teste')
+        chamadas = []
+        liberar = asyncio.Event()
+
+        async def fabrica():
+            chamadas.append(1)
+            await liberar.wait()
+            return 'resposta'
+
+        lider = asyncio.ensure_future(coalescedor.executar('chave', fabrica))
+        await asyncio.sleep(0.01)
+        seguidora = asyncio.ensure_future(coalescedor.executar('chave', fabrica))
+        await asyncio.sleep(0.01)
+        lider.cancel()
+        await asyncio.sleep(0.01)
+        liberar.set()
+        return lider, await seguidora, chamadas
+
+    lider, resultado, chamadas = asyncio.run(cenario())
+    assert lider.cancelled()
+    assert resultado == 'resposta'
+    assert len(chamadas) == 1
+
+
+def test_stream_seguidora_recebe_eventos_ja_produzidos():
+    async def cenario():
+        coalescedor = Coalescedor('teste')
+        liberar = asyncio.Event()
+
+        async def fabrica():
+            yield 'a'
+            await liberar.wait()
+            yield 'b'
+
+        async def consumir():
+            return [evento async for evento in coalescedor.transmitir('chave', fabrica)]
+
+        lider = asyncio.ensure_future(consumir())
+        await asyncio.sleep(0.01)
+        seguidora = asyncio.ensure_future(consumir())
+        await asyncio.sleep(0.01)
+        liberar.set()
+        return await asyncio.gather(lider, seguidora), coalescedor
+
+    resultados, coalescedor = asyncio.run(cenario())
+    assert resultados == [['a', 'b'], ['a', 'b']]
+    assert (coalescedor.lideres, coalescedor.seguidores) == (1, 1)
+
+
+def test_stream_seguidora_recebe_recuperacao_id():
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=100, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    pergunta = "Como atualizar o cadastro do servidor no SIAPE?"
+
+    async def cenario():
+        async def perguntar(estatisticas):
+            return [evento async for evento in agente.aexecutar_busca_stream(pergunta, estatisticas=estatisticas)]
+
+        todas = [{}, {}]
+        await asyncio.gather(*(perguntar(estatisticas) for estatisticas in todas))
+        return todas
+
+    try:
+        lider, seguidora = asyncio.run(cenario())
+    finally:
+        agente._executor.shutdown(wait=False, cancel_futures=True)
+    assert seguidora.get('resultado') == 'coalescida'
+    assert lider['recuperacao_id'] is not None
+    assert seguidora['recuperacao_id'] == lider['recuperacao_id']
+    assert seguidora['selecao'] == lider['selecao']
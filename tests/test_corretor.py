@@ -0,0 +1,72 @@
+"""Correções de texto: termo mais longo primeiro, limites de palavra, glifos e stream em partes"""
+
+import asyncio
+
+import pytest
+
+import falsos
+from corretor_texto import MotorCorrecoes
+
+
+TEXTO = ("Os chunks e o chunk_id do Chunk: valores escontados pelo Ministério da Economia.\n"
+         "Já chunky, subchunk e rescontado ficam como estão; chunk.")
+
+
+def test_termo_mais_longo_primeiro():
+    motor = MotorCorrecoes()
+    assert motor.corrigir("chunks") == "documentos"
+    assert motor.corrigir("chunk_id e chunk") == "documento_id e documento"
+    assert motor.corrigir("Chunks/Chunk") == "Documentos/Documento"
+
+
+def test_limites_de_palavra():
+    motor = MotorCorrecoes()
+    assert motor.corrigir("chunky subchunk rescontado") == "chunky subchunk rescontado"
+    assert motor.corrigir("(chunk), chunk. escontado!") == "(documento), documento. descontado!"
+
+
+def test_limpar_remove_glifos_e_normaliza_espacos():
+    motor = MotorCorrecoes()
+    assert motor.limpar("  \uf0c9Menu \uf002 \n\t chunk\uf142s  ") == "Menu documentos"
+    # corrigir preserva quebras de linha e não mexe nos glifos
+    assert motor.corrigir("a\n\nchunk\uf002") == "a\n\ndocumento\uf002"
+
+
+@pytest.mark.parametrize('texto', [TEXTO, "chunk", "chunks", "xchunk_idx chunk_id"])
+def test_incremental_igual_a_corrigir_em_qualquer_corte(texto):
+    motor = MotorCorrecoes()
+    esperado = motor.corrigir(texto)
+    for corte in range(len(texto) + 1):
+        corretor = motor.incremental()
+        saida = corretor.alimentar(texto[:corte]) + corretor.alimentar(texto[corte:]) + corretor.finalizar()
+        assert saida == esperado, corte
+
+
+def test_incremental_caractere_a_caractere():
+    motor = MotorCorrecoes()
+    corretor = motor.incremental()
+    saida = ''.join(corretor.alimentar(caractere) for caractere in TEXTO) + corretor.finalizar()
+    assert saida == motor.corrigir(TEXTO)
+
+
+@pytest.fixture
+def agente(monkeypatch):
+    monkeypatch.setattr(falsos, 'RESPOSTA_PADRAO', "Os chunks do Ministério da Economia indicam o prazo.")
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=0, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    yield agente
+    agente._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_resposta_completa_e_stream_corrigidas(agente):
+    async def perguntar():
+        completa = await agente.aexecutar_busca_completa("Qual o prazo do recurso?")
+        eventos = [evento async for evento in agente.aexecutar_busca_stream("Qual o prazo da folha?")]
+        return completa, ''.join(dados['texto'] for evento, dados in eventos if evento == 'texto')
+
+    completa, stream = asyncio.run(perguntar())
+    esperado = "Os documentos do Ministério da Gestão e Inovação em Serviços Públicos (MGI) indicam o prazo."
+    assert completa == esperado
+    assert stream == esperado
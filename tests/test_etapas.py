@@ -0,0 +1,41 @@
+"""Etapas pela API: o recuperacao_id vale em qualquer worker com backend compartilhado"""
+
+import asyncio
+
+import pytest
+
+import app_fastapi
+import falsos
+from cache_compartilhado import ArmazenamentoMemoria
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=0, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    armazenamento = ArmazenamentoMemoria()
+    agentes = [AgenteBuscaGemini(), AgenteBuscaGemini()]
+    for agente in agentes:
+        agente.cache_recuperacao.armazenamento = armazenamento
+    yield agentes
+    for agente in agentes:
+        agente._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_recuperacao_de_outro_worker(workers, cliente, monkeypatch):
+    worker_a, worker_b = workers
+    recuperacao = asyncio.run(worker_a.aexecutar_recuperacao("Como atualizar o cadastro do servidor no SIAPE?"))
+    assert recuperacao.documentos
+
+    monkeypatch.setattr(app_fastapi, 'agente', worker_b)
+    monkeypatch.setattr(app_fastapi, 'agente_inicializado', True)
+    resposta = cliente.post('/api/etapas/gerar', json={'recuperacao_id': recuperacao.id})
+    assert resposta.status_code == 200
+    assert resposta.json()['recuperacao_id'] == recuperacao.id
+
+    copia = worker_b.cache_recuperacao.obter_por_id(recuperacao.id)
+    assert copia.ids() == recuperacao.ids()
+    assert [doc.score for doc in copia.documentos] == pytest.approx([doc.score for doc in recuperacao.documentos])
+
+    assert cliente.post('/api/etapas/gerar', json={'recuperacao_id': 'nao-existe'}).status_code == 404
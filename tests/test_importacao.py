@@ -0,0 +1,29 @@
+"""Importação tardia: importar o app e o agente não carrega os SDKs do Gemini e do Pinecone"""
+
+import json
+import os
+import subprocess
+import sys
+
+from verificar_importacao import DIRETORIO_FRONTEND, DIRETORIO_RAIZ, SDKS_TARDIOS
+
+CODIGO = (
+    "import json, sys\n"
+    "import agente_busca_gemini, app_fastapi\n"
+    "print(json.dumps(sorted(sys.modules)))\n"
+)
+
+
+def test_importar_app_nao_carrega_sdks():
+    # Processo novo: neste os falsos dos outros testes já podem ter carregado os SDKs
+    ambiente = dict(os.environ)
+    ambiente["PYTHONPATH"] = os.pathsep.join(filter(None, [DIRETORIO_FRONTEND, DIRETORIO_RAIZ,
+                                                           ambiente.get("PYTHONPATH")]))
+    processo = subprocess.run([sys.executable, "-c", CODIGO], cwd=DIRETORIO_FRONTEND, env=ambiente,
+                              capture_output=True, text=True, timeout=60)
+    assert processo.returncode == 0, processo.stderr[-2000:]
+
+    modulos = json.loads(processo.stdout.splitlines()[-1])
+    assert 'agente_busca_gemini' in modulos and 'app_fastapi' in modulos
+    carregados = [nome for nome in modulos if nome.startswith(SDKS_TARDIOS)]
+    assert not carregados, carregados[:5]
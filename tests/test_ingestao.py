@@ -0,0 +1,109 @@
+"""Reingestão: trechos que uma fonte editada deixou de ter saem do índice"""
+
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import ingestao
+from recuperadores import NAMESPACE_CONTROLE, ler_marcador_versao
+
+
+class IndiceMemoria:
+    """Índice em memória com a interface de upsert/delete/fetch do Pinecone"""
+
+    def __init__(self):
+        self.namespaces = {}
+
+    @property
+    def vetores(self):
+        return self.namespaces.setdefault("", {})
+
+    def upsert(self, vectors, namespace=""):
+        for vetor in vectors:
+            self.namespaces.setdefault(namespace, {})[vetor['id']] = vetor['metadata']
+
+    def delete(self, ids, namespace=""):
+        for doc_id in ids:
+            self.namespaces.get(namespace, {}).pop(doc_id, None)
+
+    def fetch(self, ids, namespace=""):
+        vetores = self.namespaces.get(namespace, {})
+        return SimpleNamespace(vectors={
+            doc_id: SimpleNamespace(metadata=vetores[doc_id]) for doc_id in ids if doc_id in vetores
+        })
+
+    def describe_index_stats(self):
+        return {'dimension': 4, 'total_vector_count': len(self.vetores)}
+
+
+class InferenciaMemoria:
+    def embed(self, model, inputs, parameters=None):
+        return SimpleNamespace(data=[{'values': [0.0] * 4} for _ in inputs])
+
+
+@pytest.fixture
+def indice(monkeypatch):
+    indice = IndiceMemoria()
+    pinecone = SimpleNamespace(Pinecone=lambda api_key=None: SimpleNamespace(
+        inference=InferenciaMemoria(), Index=lambda nome=None: indice
+    ))
+    monkeypatch.setitem(sys.modules, 'pinecone', pinecone)
+    return indice
+
+
+def _ingerir(tmp_path, *caminhos):
+    argv = [str(caminho) for caminho in caminhos] + ['--estado', str(tmp_path / 'estado.db'), '--tamanho', '200']
+    assert ingestao.main(argv) == 0
+
+
+def _textos(indice):
+    return sorted(metadata['text'] for metadata in indice.vetores.values())
+
+
+def test_reingestao_apaga_trechos_antigos(tmp_path, indice):
+    norma = tmp_path / 'norma.txt'
+    norma.write_text("Prazo de 30 dias para o recurso.\n\nO pedido vai ao setor de pessoal.", encoding='utf-8')
+    _ingerir(tmp_path, norma)
+    assert any('30 dias' in texto for texto in _textos(indice))
+
+    norma.write_text("Prazo de 15 dias para o recurso.\n\nO pedido vai ao setor de pessoal.", encoding='utf-8')
+    _ingerir(tmp_path, norma)
+    textos = _textos(indice)
+    assert not any('30 dias' in texto for texto in textos)
+    assert any('15 dias' in texto for texto in textos)
+
+
+def test_trecho_compartilhado_fica_enquanto_outra_fonte_usa(tmp_path, indice, monkeypatch):
+    comum = "Trecho repetido nas duas normas sobre a folha de pagamento."
+    primeira, segunda = tmp_path / 'primeira.txt', tmp_path / 'segunda.txt'
+    primeira.write_text(comum, encoding='utf-8')
+    segunda.write_text(comum, encoding='utf-8')
+    # Mesmo título nos dois arquivos: o trecho tem o mesmo ID nas duas fontes
+    ler_fonte = ingestao.ler_fonte
+    monkeypatch.setattr(ingestao, 'ler_fonte', lambda caminho: (('Norma', texto) for _, texto in ler_fonte(caminho)))
+    _ingerir(tmp_path, primeira, segunda)
+    assert len(indice.vetores) == 1
+
+    primeira.write_text("Texto novo da primeira norma.", encoding='utf-8')
+    _ingerir(tmp_path, primeira)
+    assert comum in _textos(indice)
+
+
+def test_marcador_de_versao_so_muda_quando_o_indice_muda(tmp_path, indice):
+    norma = tmp_path / 'norma.txt'
+    norma.write_text("Prazo de 30 dias para o recurso.", encoding='utf-8')
+    assert ler_marcador_versao(indice) is None
+
+    _ingerir(tmp_path, norma)
+    primeira = ler_marcador_versao(indice)
+    assert primeira is not None
+    # O marcador fica fora do namespace das buscas
+    assert NAMESPACE_CONTROLE in indice.namespaces and len(indice.vetores) == 1
+
+    _ingerir(tmp_path, norma)
+    assert ler_marcador_versao(indice) == primeira
+
+    norma.write_text("Prazo de 15 dias para o recurso.", encoding='utf-8')
+    _ingerir(tmp_path, norma)
+    assert ler_marcador_versao(indice) not in (None, primeira)
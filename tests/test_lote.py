@@ -0,0 +1,28 @@
+"""Lote grande: buscas limitadas pelas vagas do lote, sem estourar prazos nem abrir o disjuntor"""
+
+import pytest
+
+import falsos
+
+
+@pytest.fixture
+def agente(monkeypatch):
+    # Pool de I/O pequeno e prazo de busca curto: sem as vagas do lote, a fila do pool estoura o prazo
+    monkeypatch.setenv('VIVI_MAX_CONCORRENCIA', '4')
+    monkeypatch.setenv('VIVI_TIMEOUT_BUSCA', '0.5')
+    falsos.instalar(latencia_embed_ms=1, latencia_busca_ms=20, latencia_geracao_ms=2, latencia_parte_ms=0,
+                    jitter=0.0, documentos=200)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    yield agente
+    agente._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_lote_muito_maior_que_o_pool(agente):
+    perguntas = [f"Como atualizar o cadastro do servidor número {i} no SIAPE?" for i in range(300)]
+    resultados = agente.executar_lote(perguntas, max_geracoes=8, max_buscas=4)
+
+    falhas = [resultado for resultado in resultados if not resultado['success']]
+    assert not falhas, falhas[:3]
+    assert [resultado['indice'] for resultado in resultados] == list(range(len(perguntas)))
+    assert agente.resiliencia.disjuntores['pinecone'].estado == 'fechado'
@@ -0,0 +1,58 @@
+"""Métricas de vários workers: /metrics soma os arquivos gravados por cada processo"""
+
+import json
+import os
+
+from metricas import Registro
+
+
+def _registro():
+    registro = Registro()
+    requisicoes = registro.contador("vivi_teste_total", "Teste", ("tipo",))
+    duracao = registro.histograma("vivi_teste_segundos", "Teste", (0.1, 1.0))
+    fila = registro.medidor("vivi_teste_fila", "Teste")
+    disjuntor = registro.medidor("vivi_teste_disjuntor", "Teste", maximo=True)
+    return registro, requisicoes, duracao, fila, disjuntor
+
+
+def _simular_worker(diretorio, pid, registro):
+    """Arquivo como o que outro processo gravaria"""
+    copia = {'pid': pid, 'metricas': {metrica.nome: metrica.copia() for metrica in registro._metricas}}
+    with open(os.path.join(diretorio, f"vivi-{pid}.json"), 'w', encoding='utf-8') as saida:
+        json.dump(copia, saida)
+
+
+def test_metricas_somadas_entre_workers(tmp_path):
+    registro, requisicoes, duracao, fila, disjuntor = _registro()
+    requisicoes.inc(tipo='completa')
+    duracao.observar(0.05)
+    fila.definir(2)
+    disjuntor.definir(0)
+
+    outro, outras_requisicoes, outra_duracao, outra_fila, outro_disjuntor = _registro()
+    outras_requisicoes.inc(3, tipo='completa')
+    outras_requisicoes.inc(tipo='stream')
+    outra_duracao.observar(0.5)
+    outra_fila.definir(5)
+    outro_disjuntor.definir(1)
+    # Worker vivo (o próprio processo pai do pytest) e worker já encerrado
+    _simular_worker(str(tmp_path), os.getppid(), outro)
+    _simular_worker(str(tmp_path), 2 ** 22 + 12345, outro)
+
+    registro.gravar(str(tmp_path))
+    texto = registro.exportar(str(tmp_path))
+
+    assert 'vivi_teste_total{tipo="completa"} 7' in texto
+    assert 'vivi_teste_total{tipo="stream"} 2' in texto
+    assert 'vivi_teste_segundos_bucket{le="0.1"} 1' in texto
+    assert 'vivi_teste_segundos_count 3' in texto
+    # Medidores só dos workers vivos: 2 + 5, e o maior para o disjuntor
+    assert 'vivi_teste_fila 7' in texto
+    assert 'vivi_teste_disjuntor 1' in texto
+    assert os.path.exists(tmp_path / f"vivi-{os.getpid()}.json")
+
+
+def test_sem_diretorio_so_o_processo(tmp_path):
+    registro, requisicoes, *_ = _registro()
+    requisicoes.inc(tipo='completa')
+    assert 'vivi_teste_total{tipo="completa"} 1' in registro.exportar()
@@ -0,0 +1,160 @@
+"""Disjuntor e hedge: chamadas de teste canceladas, timeouts cortados pelo prazo e pool cheio"""
+
+import asyncio
+import threading
+
+import pytest
+
+import falsos
+from resiliencia import Resiliencia, Disjuntor, CircuitoAberto, Prazo, PrazoEsgotado, TentativasEsgotadas
+
+
+def _resiliencia_com_disjuntor_aberto(espera=0.05):
+    resiliencia = Resiliencia()
+    disjuntor = Disjuntor('pinecone', limite_falhas=1, espera=espera)
+    resiliencia.disjuntores['pinecone'] = disjuntor
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == Disjuntor.ABERTO
+    return resiliencia, disjuntor
+
+
+def test_teste_cancelado_reabre_e_libera_o_proximo():
+    async def cenario():
+        resiliencia, disjuntor = _resiliencia_com_disjuntor_aberto()
+        await asyncio.sleep(0.06)
+
+        async def lenta():
+            await asyncio.sleep(10)
+
+        tarefa = asyncio.ensure_future(resiliencia.executar('busca', lenta))
+        await asyncio.sleep(0.01)
+        assert disjuntor.estado == Disjuntor.SEMIABERTO
+        tarefa.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+        assert disjuntor.estado == Disjuntor.ABERTO
+
+        # Passada a espera, uma nova chamada de teste é feita e fecha o disjuntor
+        await asyncio.sleep(0.06)
+
+        async def rapida():
+            return 'ok'
+
+        assert await resiliencia.executar('busca', rapida) == 'ok'
+        assert disjuntor.estado == Disjuntor.FECHADO
+
+    asyncio.run(cenario())
+
+
+def test_cancelamento_fora_do_teste_nao_mexe_no_disjuntor():
+    async def cenario():
+        resiliencia = Resiliencia()
+        disjuntor = resiliencia.disjuntores['pinecone']
+
+        async def lenta():
+            await asyncio.sleep(10)
+
+        tarefa = asyncio.ensure_future(resiliencia.executar('busca', lenta))
+        await asyncio.sleep(0.01)
+        tarefa.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+        assert disjuntor.estado == Disjuntor.FECHADO
+        assert disjuntor.falhas_consecutivas == 0
+
+    asyncio.run(cenario())
+
+
+def test_segunda_chamada_durante_o_teste_e_recusada():
+    async def cenario():
+        resiliencia, disjuntor = _resiliencia_com_disjuntor_aberto()
+        await asyncio.sleep(0.06)
+
+        async def lenta():
+            await asyncio.sleep(10)
+
+        tarefa = asyncio.ensure_future(resiliencia.executar('busca', lenta))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitoAberto):
+            await resiliencia.executar('busca', lenta)
+        tarefa.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+
+    asyncio.run(cenario())
+
+
+def test_timeout_cortado_pelo_prazo_nao_conta_no_disjuntor():
+    async def cenario():
+        resiliencia = Resiliencia()
+        disjuntor = Disjuntor('pinecone', limite_falhas=1, espera=30)
+        resiliencia.disjuntores['pinecone'] = disjuntor
+
+        async def lenta():
+            await asyncio.sleep(10)
+
+        # Timeout de 5 s cortado para 50 ms pelo prazo: a culpa é do prazo, não do Pinecone
+        with pytest.raises(PrazoEsgotado):
+            await resiliencia.executar('busca', lenta, Prazo(0.05))
+        assert disjuntor.estado == Disjuntor.FECHADO
+        assert disjuntor.falhas_consecutivas == 0
+
+        # O timeout da própria etapa continua contando como falha do serviço
+        resiliencia.etapas['busca'].timeout = 0.05
+        resiliencia.etapas['busca'].tentativas = 1
+        with pytest.raises(TentativasEsgotadas):
+            await resiliencia.executar('busca', lenta)
+        assert disjuntor.estado == Disjuntor.ABERTO
+
+    asyncio.run(cenario())
+
+
+@pytest.mark.parametrize('pool_livre, chamadas_esperadas', [(True, 2), (False, 1)])
+def test_hedge_so_com_thread_livre(pool_livre, chamadas_esperadas):
+    async def cenario():
+        resiliencia = Resiliencia(pode_duplicar=lambda: pool_livre)
+        politica = resiliencia.etapas['busca']
+        for _ in range(politica.AMOSTRAS_MINIMAS_HEDGE):
+            politica.registrar_latencia(0.01)
+        chamadas = []
+
+        async def lenta():
+            chamadas.append(1)
+            await asyncio.sleep(0.2)
+            return 'ok'
+
+        assert await resiliencia.executar('busca', lenta) == 'ok'
+        assert len(chamadas) == chamadas_esperadas
+        assert politica.hedges_evitados == (0 if pool_livre else 1)
+
+    asyncio.run(cenario())
+
+
+def test_thread_de_chamada_cancelada_segue_ocupada(monkeypatch):
+    monkeypatch.setenv('VIVI_MAX_CONCORRENCIA', '2')
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=0, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    liberar = threading.Event()
+
+    async def cenario():
+        tarefa = asyncio.ensure_future(agente._executar_em_thread(liberar.wait))
+        await asyncio.sleep(0.02)
+        assert agente.threads_livres() == 1
+        tarefa.cancel()
+        await asyncio.gather(tarefa, return_exceptions=True)
+        # O SDK não é interrompido: sem thread livre, o hedge não seria disparado
+        assert agente.threads_livres() == 1
+        liberar.set()
+        for _ in range(100):
+            if agente.threads_livres() == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert agente.threads_livres() == 2
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        liberar.set()
+        agente._executor.shutdown(wait=False, cancel_futures=True)
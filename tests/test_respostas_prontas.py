@@ -0,0 +1,113 @@
+"""Versão do índice: respostas prontas e invalidação só com o marcador explícito; reconstrução fora do event loop"""
+
+import asyncio
+import json
+import threading
+
+import respostas_prontas
+from monitor_saude import MonitorConectividade
+from respostas_prontas import ArmazemRespostasProntas
+
+
+class AgenteVersoes:
+    """Agente mínimo para o monitor: a contagem de vetores muda a cada verificação (ingestão em andamento)"""
+
+    def __init__(self, versoes):
+        self.versoes = list(versoes)
+        self.contagem = 0
+        self.invalidacoes = 0
+
+    async def averificar_pinecone(self):
+        self.contagem += 50
+        return {'total_vector_count': self.contagem}
+
+    async def averificar_gemini(self):
+        return {'name': 'gemini'}
+
+    async def aversao_do_indice(self):
+        return self.versoes.pop(0)
+
+    async def ainvalidar_cache(self):
+        self.invalidacoes += 1
+
+
+def test_monitor_so_reage_ao_marcador():
+    agente = AgenteVersoes([None, None, 'v1', 'v1', 'v1', 'v2'])
+    monitor = MonitorConectividade(intervalo=1)
+    vistas = []
+    monitor.observadores_versao.append(lambda agente, versao: vistas.append(versao))
+
+    async def verificar(vezes):
+        for _ in range(vezes):
+            await monitor.verificar_agora(agente)
+
+    asyncio.run(verificar(2))
+    assert monitor.versao_indice is None and vistas == []
+
+    asyncio.run(verificar(3))
+    assert monitor.versao_indice == 'v1' and agente.invalidacoes == 0
+
+    asyncio.run(verificar(1))
+    assert monitor.versao_indice == 'v2' and agente.invalidacoes == 1
+    assert vistas == ['v1', 'v1', 'v1', 'v2']
+
+
+def test_respostas_prontas_exigem_versao_conhecida(tmp_path):
+    arquivo = tmp_path / 'respostas_prontas.json'
+    arquivo.write_text(json.dumps({
+        'versao_indice': 'v1',
+        'perguntas': ['Como funciona o SIAPE?'],
+        'respostas': [{'pergunta': 'Como funciona o SIAPE?', 'corpo': 'Assim.', 'referencias': []}]
+    }), encoding='utf-8')
+    armazem = ArmazemRespostasProntas(str(arquivo), intervalo_verificacao=0)
+
+    assert armazem.obter('Como funciona o SIAPE?', None) is None
+    assert armazem.obter('Como funciona o SIAPE?', 'v2') is None
+    assert armazem.obter('como funciona o siape', 'v1') is not None
+    assert not armazem.precisa_reconstruir(None)
+    assert armazem.precisa_reconstruir('v2')
+
+
+class AgenteLote:
+    """Agente mínimo para a reconstrução: registra os limites pedidos ao lote"""
+
+    def __init__(self):
+        self.limites = None
+
+    async def aexecutar_lote(self, perguntas, max_geracoes=None, max_buscas=None):
+        self.limites = (max_geracoes, max_buscas)
+        for indice, pergunta in enumerate(perguntas):
+            yield {'indice': indice, 'pergunta': pergunta, 'success': True,
+                   'resposta': "Assim.\n\nReferências:\n- Manual SIAPE 01"}
+
+
+def test_reconstrucao_fora_do_event_loop_e_com_poucas_vagas(tmp_path, monkeypatch):
+    arquivo = tmp_path / 'respostas_prontas.json'
+    arquivo.write_text(json.dumps({
+        'versao_indice': 'v1',
+        'perguntas': ['Como funciona o SIAPE?'],
+        'respostas': [{'pergunta': 'Como funciona o SIAPE?', 'corpo': 'Antes.', 'referencias': []}]
+    }), encoding='utf-8')
+    armazem = ArmazemRespostasProntas(str(arquivo), intervalo_verificacao=0)
+
+    # A consulta não toca no arquivo: só o dicionário em memória
+    def sem_arquivo():
+        raise AssertionError("arquivo consultado durante a requisição")
+    monkeypatch.setattr(armazem, '_assinatura_arquivo', sem_arquivo)
+    assert armazem.obter('Como funciona o SIAPE?', 'v1').corpo == 'Antes.'
+    monkeypatch.undo()
+
+    threads = []
+    gravar = respostas_prontas.gravar
+
+    def gravar_registrando(*args):
+        threads.append(threading.current_thread())
+        return gravar(*args)
+    monkeypatch.setattr(respostas_prontas, 'gravar', gravar_registrando)
+
+    agente = AgenteLote()
+    assert asyncio.run(armazem.areconstruir(agente, 'v2')) == 1
+    assert agente.limites == (armazem.max_geracoes, armazem.max_buscas) == (1, 1)
+    assert threads and threading.main_thread() not in threads
+    assert armazem.obter('Como funciona o SIAPE?', 'v2').referencias == ['Manual SIAPE 01']
+    assert not (tmp_path / 'respostas_prontas.json.lock').exists()
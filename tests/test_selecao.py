@@ -0,0 +1,66 @@
+"""Seleção adaptativa sobre a busca híbrida: o acerto só do BM25 não pode ser cortado"""
+
+from indice_lexico import IndiceBM25
+from indice_local import Documento
+from recuperadores import Recuperador, RecuperadorHibrido
+from selecao_documentos import SeletorDocumentos
+
+
+class DensoFixo(Recuperador):
+    """Recuperador vetorial com resultados fixos (scores de cosseno)"""
+    nome = "fixo"
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def buscar(self, vetor, top_k=10, pergunta=None):
+        return self.documentos[:top_k]
+
+
+def _corpus():
+    densos = []
+    for i in range(20):
+        # Os cinco primeiros também citam a rubrica e aparecem nas duas listas
+        assunto = "rubrica de pagamento" if i < 5 else "cadastro funcional"
+        texto = f"Orientação {i} sobre {assunto} do servidor no módulo {i}."
+        densos.append(Documento(f"denso-{i}", round(0.86 - 0.004 * i, 3), {
+            'text': texto, 'document_title': f"Manual {i}"
+        }))
+    codigo = Documento("codigo", 0.0, {
+        'text': "Rubrica 82345: adicional de insalubridade, código de lançamento no SIAPE.",
+        'document_title': "Tabela de rubricas"
+    })
+    lexico = IndiceBM25()
+    for doc in densos + [codigo]:
+        lexico.adicionar(doc.id, doc.metadata)
+    lexico.finalizar()
+    return densos, lexico
+
+
+def test_hibrido_mantem_acerto_exato_do_bm25():
+    densos, lexico = _corpus()
+    recuperador = RecuperadorHibrido(DensoFixo(densos), lexico)
+    seletor = SeletorDocumentos(candidatos=20, maximo=8, minimo=1, score_minimo=0.2, cotovelo=0.2)
+    candidatos = recuperador.buscar([0.0], 20, pergunta="rubrica 82345")
+
+    # O código só aparece na busca léxica: score fundido na metade dos que estão nas duas listas
+    assert any(doc.id == "codigo" for doc in candidatos)
+
+    selecionados, estatisticas = seletor.selecionar(candidatos, recuperador.escala)
+    assert "codigo" in [doc.id for doc in selecionados]
+    assert estatisticas.escala == "posicao"
+    assert estatisticas.cortados_no_cotovelo == 0
+    assert len(selecionados) == seletor.maximo
+
+    # Com os cortes de cosseno, o mesmo acerto seria descartado no cotovelo
+    cortados, _ = seletor.selecionar(candidatos, "similaridade")
+    assert "codigo" not in [doc.id for doc in cortados]
+
+
+def test_busca_densa_continua_com_piso_e_cotovelo():
+    densos, _ = _corpus()
+    densos[3:] = [Documento(doc.id, 0.4, doc.metadata) for doc in densos[3:]]
+    seletor = SeletorDocumentos(candidatos=20, maximo=8, minimo=1, score_minimo=0.2, cotovelo=0.2)
+    selecionados, estatisticas = seletor.selecionar(densos, DensoFixo.escala)
+    assert len(selecionados) == 3
+    assert estatisticas.cortados_no_cotovelo == 17
@@ -0,0 +1,54 @@
+"""Sessões de conversa: ID desconhecido é recusado e a conversa segue em qualquer worker"""
+
+import pytest
+
+import app_fastapi
+import falsos
+from cache_compartilhado import ArmazenamentoMemoria
+from sessoes import GerenciadorSessoes
+
+
+@pytest.fixture
+def agente(monkeypatch):
+    falsos.instalar(latencia_embed_ms=0, latencia_busca_ms=0, latencia_geracao_ms=0, latencia_parte_ms=0,
+                    jitter=0.0)
+    from agente_busca_gemini import AgenteBuscaGemini
+    agente = AgenteBuscaGemini()
+    monkeypatch.setattr(app_fastapi, 'agente', agente)
+    monkeypatch.setattr(app_fastapi, 'agente_inicializado', True)
+    yield agente
+    agente._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@pytest.mark.parametrize('rota', ['/api/buscar', '/api/buscar/stream'])
+def test_sessao_desconhecida_responde_404(agente, cliente, rota):
+    resposta = cliente.post(rota, json={'pergunta': 'E o prazo?', 'sessao_id': 'nao-existe'})
+    assert resposta.status_code == 404
+    assert resposta.headers['X-Vivi-Sessao'] == 'expirada'
+
+
+def test_sessao_nova_e_continuada(agente, cliente):
+    primeira = cliente.post('/api/buscar', json={'pergunta': 'Como atualizar o cadastro no SIAPE?', 'sessao': True})
+    assert primeira.status_code == 200
+    sessao_id = primeira.json()['sessao_id']
+    segunda = cliente.post('/api/buscar', json={'pergunta': 'E o prazo?', 'sessao_id': sessao_id})
+    assert segunda.status_code == 200 and segunda.json()['sessao_id'] == sessao_id
+
+
+def test_sessao_compartilhada_entre_workers():
+    armazenamento = ArmazenamentoMemoria()
+    worker_a = GerenciadorSessoes(armazenamento=armazenamento)
+    worker_b = GerenciadorSessoes(armazenamento=armazenamento)
+
+    sessao = worker_a.criar()
+    sessao.registrar('Como atualizar o cadastro?', 'Como atualizar o cadastro?', 'Pelo módulo 3.', [])
+    worker_a.atualizar(sessao)
+    worker_a.guardar_compartilhada(sessao.id, worker_a.registro(sessao))
+
+    no_b = worker_b.carregar_compartilhada(sessao.id)
+    assert no_b is not None and no_b.continuacao('E o prazo?')
+    assert [turno.resposta for turno in no_b.turnos] == ['Pelo módulo 3.']
+
+    assert worker_b.encerrar(sessao.id)
+    assert worker_a.carregar_compartilhada(sessao.id) is None
+    assert worker_b.carregar_compartilhada('nao-existe') is None
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Orçamento de tempo de importação do servidor da Vivi IA
+Mede `python -X importtime -c "import app_fastapi"` em um processo novo e falha
+(código de saída 1) se:
+- algum SDK pesado (google.generativeai, pinecone) for importado junto com o app;
+- a importação do app ou do agente passar do orçamento.
+
+Uso:
+    python verificar_importacao.py --orcamento-ms 1500 --orcamento-agente-ms 250
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+# SDKs que só podem ser carregados na inicialização do agente (importacao_tardia.py)
+SDKS_TARDIOS = ("google.generativeai", "google.ai.generativelanguage", "pinecone")
+
+DIRETORIO_RAIZ = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_FRONTEND = os.path.join(DIRETORIO_RAIZ, "frontend")
+
+
+def medir_importacao(modulo="app_fastapi"):
+    """Executa -X importtime em um processo novo; retorna [(nível, próprio_us, acumulado_us, nome)]"""
+    ambiente = dict(os.environ)
+    ambiente["PYTHONPATH"] = os.pathsep.join(filter(None, [DIRETORIO_FRONTEND, DIRETORIO_RAIZ, ambiente.get("PYTHONPATH")]))
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=DIRETORIO_FRONTEND, env=ambiente, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{processo.stderr[-2000:]}")
+
+    registros = []
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|")
+        nivel = (len(nome) - len(nome.lstrip(" "))) // 2
+        registros.append((nivel, int(proprio), int(acumulado), nome.strip()))
+    return registros
+
+
+def acumulado_ms(registros, nome):
+    for _, _, acumulado, modulo in registros:
+        if modulo == nome:
+            return acumulado / 1000
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confere o tempo de importação do servidor da Vivi IA")
+    parser.add_argument('--orcamento-ms', type=float,
+                        default=float(os.getenv("VIVI_ORCAMENTO_IMPORTACAO_MS", "1500")),
+                        help="Tempo máximo para importar app_fastapi")
+    parser.add_argument('--orcamento-agente-ms', type=float,
+                        default=float(os.getenv("VIVI_ORCAMENTO_IMPORTACAO_AGENTE_MS", "250")),
+                        help="Tempo máximo para importar agente_busca_gemini")
+    parser.add_argument('--repeticoes', type=int, default=3,
+                        help="Medições (vale a menor; a primeira ainda compila .pyc)")
+    args = parser.parse_args(argv)
+
+    medicoes = [medir_importacao() for _ in range(max(1, args.repeticoes))]
+    registros = min(medicoes, key=lambda r: acumulado_ms(r, "app_fastapi") or float('inf'))
+    total = acumulado_ms(registros, "app_fastapi")
+    agente = acumulado_ms(registros, "agente_busca_gemini")
+
+    print(f"⏱️ app_fastapi: {total:.0f} ms (orçamento {args.orcamento_ms:.0f} ms)")
+    if agente is not None:
+        print(f"⏱️ agente_busca_gemini: {agente:.0f} ms (orçamento {args.orcamento_agente_ms:.0f} ms)")
+    print("🐢 Importações mais lentas:")
+    diretas = sorted((r for r in registros if r[0] == 1), key=lambda r: r[2], reverse=True)
+    for _, _, acumulado, nome in diretas[:10]:
+        print(f"   {acumulado / 1000:8.1f} ms  {nome}")
+
+    falhas = []
+    carregados = sorted({nome for _, _, _, nome in registros if nome.startswith(SDKS_TARDIOS)})
+    if carregados:
+        falhas.append(f"SDKs pesados importados junto com o app: {', '.join(carregados[:5])}")
+    if total > args.orcamento_ms:
+        falhas.append(f"app_fastapi levou {total:.0f} ms (orçamento {args.orcamento_ms:.0f} ms)")
+    if agente is not None and agente > args.orcamento_agente_ms:
+        falhas.append(f"agente_busca_gemini levou {agente:.0f} ms (orçamento {args.orcamento_agente_ms:.0f} ms)")
+
+    for falha in falhas:
+        print(f"❌ {falha}")
+    if not falhas:
+        print("✅ Importação dentro do orçamento")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())